@@ -8,11 +8,136 @@ Created on Thu Feb 23 21:08:14 2023
 
 import requests
 import mysql.connector
-from json import load, dump, JSONDecodeError
-from unidecode import unidecode
+import re
+from math import inf, ceil
+from time import perf_counter
+from urllib.parse import unquote
+from json import load, JSONDecodeError
+from threading import Lock
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor
+from crawl_queue import CrawlQueue
+from checkpoint import Checkpoint
+from response_store import ResponseStore, StoredResponse
+from normalization import normalize_search
+from search_stream import SearchPage
+from id_index import load_ids
+from author_ids import AuthorIds
+from scheduler import (Quota, Frontier, keyword_estimate, plan, PAGE_SIZE,
+                       RESERVE)
 
+SEARCH_API = 'http://api.elsevier.com/content/search/scopus'
+CITING_API = SEARCH_API + '?query=refeid({eid})&cursor={cursor}&view=COMPLETE&sort=citedby-count'
+# {keyword} is the search terms of a query, see keyword_query.
+KEYWORD_API = SEARCH_API + '?query=TITLE-ABS({keyword})&cursor=*&view=COMPLETE'
+QUERY_LENGTH = 1000  # Characters of the search terms of one keyword query
+# Fields of a search result read by add_record and values_to_insert.
+RECORD_FIELDS = ('eid', 'dc:title', 'dc:description', 'authkeywords',
+                 'prism:publicationName', 'prism:issn', 'prism:volume',
+                 'prism:issueIdentifier', 'prism:coverDate', 'prism:doi',
+                 'prism:url', 'citedby-count', 'subtypeDescription',
+                 'source-id', 'author-count', 'affiliation', 'author')
+# Parameters of the search requests, added to the urls. 'complete' returns
+# every field of view=COMPLETE; 'keyword' only the fields that are stored;
+# 'citing' also leaves out the abstracts, so new citing publications are
+# labelled by their titles only. PAGE_SIZE is the largest count of
+# view=COMPLETE. Responses are gzipped, as requests asks for it by default.
+PROFILES = {
+    'complete': '',
+    'keyword': f'&count={PAGE_SIZE}&field={",".join(RECORD_FIELDS)}',
+    'citing': f'&count={PAGE_SIZE}&field='
+              + ','.join(f for f in RECORD_FIELDS if f != 'dc:description'),
+    }
+KEYWORD_PROFILE = 'keyword'
+CITING_PROFILE = 'keyword'
+# Positions of the columns in the rows returned by values_to_insert.
+PUBLICATION_COLUMNS = {'field': 17}
+# Number of labels changed by one UPDATE statement.
+LABEL_CHUNK = 500
+SQL = {'a': ('INSERT INTO authors (id, authname, surname, given_name,'
+             ' initials, afids, url) VALUES (%s, %s, %s, %s, %s, %s, %s)'),
+       'v': ('INSERT INTO affiliations (id, name, city, country, url)'
+             ' VALUES (%s,%s, %s, %s, %s)'),
+       'p': ('INSERT INTO publications (eid, title, source, issn, volume,'
+             ' issue, date, doi, abstract, citedby, affiliation, type,'
+             ' author_count, authors, author_keywords, source_id, url,'
+             ' field, cites) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s,'
+             ' %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'),
+       'c': ('INSERT IGNORE INTO citations (citing_id, cited_id, source)'
+             ' VALUES (%s, %s, %s)')}
 
-def get_keywords():
+
+class RateLimit:
+    """
+    Shared budget of API calls driven by the 'X-RateLimit-Remaining' header.
+
+    Every request takes one call from the budget before it is sent and the
+    budget is corrected from the response headers once it arrives. Requests
+    are refused once the budget drops to the floor or the crawl is halted.
+
+    Parameters
+    ----------
+    remaining : int
+        Number of API calls left, as saved in save.json.
+    floor : int, optional
+        Number of calls to keep in reserve. The default is 10.
+
+    """
+
+    def __init__(self, remaining, floor=10):
+        self.remaining = remaining
+        self.floor = floor
+        self.reset = None
+        self.limit = None
+        self.halted = False
+        self._lock = Lock()
+
+    def acquire(self):
+        """Take one call from the budget; return False if none are left."""
+        with self._lock:
+            if self.halted or self.remaining <= self.floor:
+                return False
+            self.remaining -= 1
+            return True
+
+    def release(self):
+        """Give back a call that was not spent, e.g. served from the store."""
+        with self._lock:
+            self.remaining += 1
+
+    def update(self, response):
+        """Correct the budget from the headers of the response."""
+        with self._lock:
+            try:
+                self.reset = float(response.headers['X-RateLimit-Reset'])
+            except (KeyError, ValueError):
+                pass
+            try:
+                self.limit = int(response.headers['X-RateLimit-Limit'])
+            except (KeyError, ValueError):
+                pass
+            try:
+                limit = int(response.headers['X-RateLimit-Remaining'])
+            except KeyError:
+                return
+            # Responses may arrive out of order, so keep the lowest value.
+            self.remaining = min(self.remaining, limit)
+
+    def settle(self, quota):
+        """Store the calls left and the reset read so far in the Quota."""
+        quota.remaining = self.remaining
+        if self.reset is not None:
+            quota.reset = self.reset
+        if self.limit is not None:
+            quota.limit = self.limit
+
+    def halt(self):
+        """Refuse all further requests."""
+        with self._lock:
+            self.halted = True
+
+
+def get_keywords(file_name='list-of-labels.txt'):
     """
     Read keywords and their abbreviations from the text file.
 
@@ -21,6 +146,11 @@ def get_keywords():
         'particle swarm optimization : PSO ' in the text file corresponds to
     the pair {'particle swarm optimization': 'PSO'} in the dictionary.
 
+    Parameters
+    ----------
+    file_name : string, optional
+        Name of the file. The default is 'list-of-labels.txt'.
+
     Returns
     -------
     keyword_to_abbr : dict
@@ -28,63 +158,243 @@ def get_keywords():
 
     """
     keyword_to_abbr = dict()
-    f = open('list-of-labels.txt', 'r')
+    f = open(file_name, 'r')
     line = f.readline()
     while line != '':
         ln = line.split(':')
-        keyword_to_abbr[ln[0][:-1]] = ln[1][1:-1]
+        if len(ln) == 2:  # Skip empty lines
+            keyword_to_abbr[ln[0].strip()] = ln[1].strip()
         line = f.readline()
     f.close()
     return keyword_to_abbr
 
 
-def normalize(text):
+def keyword_query(keywords):
+    """Return the search terms matching any of the keywords."""
+    return ' OR '.join(f'"{keyword}"' for keyword in keywords)
+
+
+def keyword_groups(keywords_abbr, limit=QUERY_LENGTH, started=None):
+    """
+    Combine the keywords of every abbreviation into boolean OR queries.
+
+    Keywords with the same abbreviation mostly find the same publications,
+    so crawling them one by one downloads those again for every keyword.
+    One query per abbreviation gets each of them once. Groups whose terms
+    are longer than limit are split into several queries.
+
+    Parameters
+    ----------
+    keywords_abbr : dict
+        Dictionary of keywords to their abbreviations.
+    limit : int, optional
+        Maximum length of the search terms of a query. The default is
+        QUERY_LENGTH.
+    started : string, optional
+        Keyword whose crawl was started on its own, see started_keyword;
+        it keeps a query of its own. The default is None.
+
+    Returns
+    -------
+    groups : dict
+        Abbreviation and list of keywords per query (search terms), in the
+        order of list-of-labels.txt.
+
+    """
+    by_abbr = dict()
+    groups = dict()
+    for keyword, abbr in keywords_abbr.items():
+        if keyword == started:
+            groups[keyword_query([keyword])] = (abbr, [keyword])
+        else:
+            by_abbr.setdefault(abbr, []).append(keyword)
+    for abbr, keywords in by_abbr.items():
+        chunk = []
+        for keyword in keywords:
+            if len(chunk) > 0 and len(keyword_query(chunk + [keyword])) > limit:
+                groups[keyword_query(chunk)] = (abbr, chunk)
+                chunk = []
+            chunk.append(keyword)
+        groups[keyword_query(chunk)] = (abbr, chunk)
+    return groups
+
+
+def started_keyword(keywords_abbr, data):
+    """
+    Return the keyword crawled on its own before queries were combined.
+
+    save.json['api'] holds the next page of the query in progress and
+    save.json['query'] its search terms. A save.json without 'query' gets
+    it from the url: the terms inside TITLE-ABS(), or the keyword of a
+    url of the old form, which is continued as a query of its own. A url
+    whose query cannot be found is dropped, like an unformatted url of
+    the old form, as no page of it is known.
+    """
+    api = unquote(data['api'])
+    if api == '':
+        return None
+    if '{keyword}' in api:
+        data['api'] = ''
+        return None
+    if 'TITLE-ABS(' in api:
+        if 'query' not in data:
+            match = re.search(r'TITLE-ABS\((.+?)\)(?=&|$)', api)
+            data['query'] = match.group(1) if match is not None else ''
+        return None
+    match = re.search(r'TITLE\("(.+?)"\)', api)
+    if match is None or match.group(1) not in keywords_abbr:
+        data['api'] = ''
+        return None
+    data['query'] = keyword_query([match.group(1)])
+    return match.group(1)
+
+
+def trie_pattern(node):
+    """Return a regular expression matching every keyword in the trie."""
+    branches = [re.escape(char) + trie_pattern(child)
+                for char, child in sorted(node.items()) if char != '']
+    if len(branches) == 0:
+        return ''
+    if len(branches) == 1:
+        pattern = branches[0]
+    else:
+        pattern = '(?:' + '|'.join(branches) + ')'
+    if '' in node:  # A keyword ends here; longer keywords are optional.
+        pattern = f'(?:{pattern})?'
+    return pattern
+
+
+def build_matcher(keyword_to_abbr):
+    """
+    Compile a matcher that finds all keywords in one scan of the text.
+
+    The keywords are put in a trie which is compiled into one regular
+    expression, so at every position of the text only the keywords sharing
+    the prefix read so far are tried. The expression is wrapped in a
+    lookahead so overlapping keywords are found as well.
+
+    Parameters
+    ----------
+    keyword_to_abbr : dict
+        Dictionary of keywords to their abbreviations.
+
+    Returns
+    -------
+    matcher : dict
+        Compiled expression ('pattern') and, for every keyword, the
+        abbreviations of the keyword and of all keywords it starts with
+        ('labels').
+
+    """
+    keywords = dict()
+    for keyword, abbr in keyword_to_abbr.items():
+        keywords.setdefault(normalize_search(keyword), set()).add(abbr)
+    trie = dict()
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, dict())
+        node[''] = dict()
+    labels = dict()
+    for keyword in keywords:
+        labels[keyword] = set()
+        for prefix in keywords:
+            if keyword.startswith(prefix):
+                labels[keyword] |= keywords[prefix]
+    return {'pattern': re.compile(f'(?=({trie_pattern(trie)}))'),
+            'labels': labels}
+
+
+def match_labels(matcher, text):
+    """Return the set of abbreviations of all keywords found in the text."""
+    labels = set()
+    for match in matcher['pattern'].finditer(text):
+        labels |= matcher['labels'][match.group(1)]
+    return labels
+
+
+def keyword_hits(matcher, ele):
+    """
+    Return the number of keywords of a query found in the publication.
+
+    It stands for the number of single-keyword queries that would have
+    returned the publication; at least one, as SCOPUS also matches other
+    word forms.
+
+    Parameters
+    ----------
+    matcher : dict
+        Matcher of the keywords of the query, each its own label, see
+        build_matcher.
+    ele : dict
+        Dictionary with info about the publication.
+
+    Returns
+    -------
+    hits : int
+        Number of keywords found.
+
     """
-    Generalize the text by removing any non-standard letters or signs.
+    text = (f"{normalize_search(ele.get('dc:title', ''))}|"
+            f"{normalize_search(ele.get('dc:description', ''))}")
+    return max(len(match_labels(matcher, text)), 1)
+
+
+def overlap_report(queries):
+    """
+    Print the calls of every combined query and of its keywords apart.
+
+    The calls of separate queries are estimated from the keywords found in
+    the results (see keyword_hits), plus the last call of every query.
 
     Parameters
     ----------
-    text : string
-        Text to generalize.
+    queries : dict
+        Counters per query, see save.json['queries'].
 
     Returns
     -------
-    norm : string
-        Generalized text.
+    saved : int
+        Estimated calls saved by combining the keywords.
 
     """
-    norm = text.casefold()
-    norm = unidecode(norm, 'ignore')
-    norm = norm.replace('optimis', 'optimiz')
-    norm = norm.replace('-', ' ')
-    return norm
+    saved = 0
+    for query, stats in queries.items():
+        separate = ceil(stats['hits'] / PAGE_SIZE) + stats['keywords']
+        saved += separate - stats['calls']
+        print(f"{stats['label']} ({stats['keywords']} keywords): "
+              f"{stats['calls']} calls, {stats['records']} results, "
+              f"{stats['known']} already in the database; about {separate} "
+              "calls as separate queries")
+    print(f'About {saved} calls saved by combined queries')
+    return saved
 
 
-def field(ele, data, keyword, kw):
+def field(ele, batch, matcher, kw):
     """
-    Assign a subfield to the given publication.
+    Assign subfields to the given publication.
 
-    We assign the keyword as the label of the publication
-    if the keyword is contained in the title or abstract.
+    We assign every keyword contained in the title or abstract as a label
+    of the publication, with kw first if it is one of them.
     Else, set the label to 'OTHER'.
-    Return the label and updated data about the process.
+    Publications with a label are queued for crawling their citations.
 
     Parameters
     ----------
     ele : dict
         Dictionary with info about the publication.
-    data : dict
-        Dictionary containing information about current state of the project.
-    keyword : string
-        Keyword string.
+    batch : dict
+        Pending writes, see new_batch.
+    matcher : dict
+        Matcher of all keywords, see build_matcher.
     kw : string
-        Abbreviation of the keyword.
+        Abbreviation of the keyword being crawled.
 
     Returns
     -------
     label : string
-        Keyword corresponding to the element.
-    data : dict
+        Comma-separated labels corresponding to the element.
+    batch : dict
         Updated dictionary.
 
     """
@@ -96,20 +406,15 @@ def field(ele, data, keyword, kw):
         title = ele['dc:title']
     except KeyError:
         title = ''
-    normalized_title = normalize(title)
-    if normalized_title.find(keyword) != -1:
-        label = kw
-        if ele['eid'] not in data['eids']:
-            data['eids'].append(ele['eid'])
-    else:
-        normalized_abstract = normalize(abstract)
-        if normalized_abstract.find(keyword) != -1:
-            label = kw
-            if ele['eid'] not in data['eids']:
-                data['eids'].append(ele['eid'])
-        else:
-            label = 'OTHER'
-    return label, data
+    # '|' is never part of a keyword, so no match spans both texts.
+    labels = match_labels(matcher, f'{normalize_search(title)}|{normalize_search(abstract)}')
+    if len(labels) == 0:
+        return 'OTHER', batch
+    batch['eids'][ele['eid']] = None
+    if kw in labels:
+        labels.discard(kw)
+        return ','.join([kw] + sorted(labels)), batch
+    return ','.join(sorted(labels)), batch
 
 
 def values_to_insert(ele, label, authors, affiliations, cites=''):
@@ -183,26 +488,136 @@ def values_to_insert(ele, label, authors, affiliations, cites=''):
     return val
 
 
-def add_record(mydb, mycursor, all_ids, data, ele, sql, keyword, kw, eid=''):
+def new_batch():
     """
-    Insert a row into the database with the required info.
+    Create an empty batch of pending writes.
+
+    Returns
+    -------
+    batch : dict
+        Rows to insert into affiliations ('v'), authors ('a') and
+        publications ('p', by eid), citation edges ('c'), new values of the
+        'field' column of publications already in the database (by eid),
+        ids to delete from the additional table ('others'), eids to add to
+        the crawl queue ('eids', ordered) and the number of records added to
+        the batch ('size').
+
+    """
+    return {'v': [], 'a': [], 'p': dict(), 'c': [], 'field': dict(),
+            'others': [], 'eids': dict(), 'size': 0}
+
+
+def set_value(batch, eid, column, value):
+    """Set the 'field' value of a publication in the batch."""
+    if eid in batch['p']:
+        batch['p'][eid][PUBLICATION_COLUMNS[column]] = value
+    else:
+        batch[column][eid] = value
+
+
+def flush_batch(mydb, mycursor, batch, sql, queue, data=None):
+    """
+    Write all pending rows and updates of the batch in one transaction.
+
+    Newly labelled eids are committed to the crawl queue first, so that
+    they cannot be lost once their rows are in the database.
+
+    With the label update ('f') of several writers, publications are
+    inserted one by one. One that another writer has inserted since the
+    ids were read is skipped by INSERT IGNORE; its labels are then added to
+    the stored row, and it is counted as known rather than new.
 
     Parameters
     ----------
     mydb : database
         Connection to the database.
+    mycursor : cursor
+        Cursor connected to the database.
+    batch : dict
+        Pending writes; emptied once they are committed.
+    sql : dict
+        Dictionary of strings for inserting rows into the database, and
+        optionally ('f') for adding a label to a publication.
+    queue : CrawlQueue or WorkLedger
+        Queue of publications whose citing articles need crawling.
+    data : dict, optional
+        Counters of the records ('newlyadded', 'indatabase'), corrected
+        for the skipped publications. The default is None.
+
+    Returns
+    -------
+    size : int
+        Number of records written.
+
+    """
+    for eid in batch['eids']:
+        queue.push(eid)
+    queue.commit(staged=False)
+    if len(batch['v']) > 0:
+        mycursor.executemany(sql['v'], batch['v'])
+    if len(batch['a']) > 0:
+        mycursor.executemany(sql['a'], batch['a'])
+    skipped = dict()  # eid: labels of the rows inserted by another writer
+    if len(batch['p']) > 0 and 'f' in sql:
+        for eid, row in batch['p'].items():
+            mycursor.execute(sql['p'], tuple(row))
+            if mycursor.rowcount == 0:
+                skipped[eid] = row[PUBLICATION_COLUMNS['field']]
+    elif len(batch['p']) > 0:
+        mycursor.executemany(sql['p'], [tuple(r) for r in batch['p'].values()])
+    if len(batch['c']) > 0:
+        mycursor.executemany(sql['c'], batch['c'])
+    labels = list(batch['field'].items())
+    if 'f' in sql:
+        # Other writers may have labelled the publication since it was read,
+        # so only add the new label (the last one) to the stored labels.
+        params = [(kw, kw, eid, kw) for eid, kw in
+                  ((eid, label.rsplit(',', 1)[-1]) for eid, label in labels)]
+        params += [(kw, kw, eid, kw) for eid, label in skipped.items()
+                   for kw in label.split(',') if kw != 'OTHER']
+        if len(params) > 0:
+            mycursor.executemany(sql['f'], params)
+        labels = []
+    if data is not None:
+        data['newlyadded'] -= len(skipped)
+        data['indatabase'] += len(skipped)
+    for i in range(0, len(labels), LABEL_CHUNK):
+        # One statement for every chunk of changed labels.
+        chunk = labels[i:i + LABEL_CHUNK]
+        cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+        ids = ', '.join(['%s'] * len(chunk))
+        params = [x for pair in chunk for x in pair] + [eid for eid, _ in chunk]
+        mycursor.execute(
+            f'UPDATE publications SET field = CASE eid {cases} END'
+            f' WHERE eid IN ({ids})', params)
+    if len(batch['others']) > 0:
+        mycursor.executemany('DELETE FROM additional WHERE id=%s',
+                             [(i,) for i in batch['others']])
+    mydb.commit()
+    size = batch['size']
+    batch.update(new_batch())
+    return size
+
+
+def add_record(mycursor, all_ids, data, batch, ele, matcher, kw, eid=''):
+    """
+    Add a row with the required info to the batch of pending writes.
+
+    Parameters
+    ----------
     mycursor : cursor
         Cursor connected to the database.
     all_ids : dict
-        Dictionary of lists of publications, authors, and affiliations.
+        Dictionary of lists of publications, authors, and affiliations, and
+        of the labels of every publication ('labels', eid to list).
     data : dict
         Dictionary containing information about current state of the project.
+    batch : dict
+        Pending writes, see new_batch.
     ele : dict
         Dictionary with info about the publication.
-    sql : dict
-        Dictionary of strings for inserting rows into the database.
-    keyword : string
-        Keyword string.
+    matcher : dict
+        Matcher of all keywords, see build_matcher.
     kw : string
         Abbreviation of the keyword.
     eid : string, optional
@@ -217,98 +632,550 @@ def add_record(mydb, mycursor, all_ids, data, ele, sql, keyword, kw, eid=''):
 
     """
     ele_eid = int(ele['eid'][7:])
-    if (ele_eid,) not in all_ids['publications']:  # Add new record to table.
+    batch['size'] += 1
+    if ele_eid not in all_ids['publications']:  # Add new record to table.
         data['newlyadded'] += 1
-        all_ids['publications'].add((int(ele['eid'][7:]),))
-        affiliations, val, authors = [], [], []
+        affiliations, authors = [], []
         try:
             for affiliation in ele['affiliation']:
                 afid = affiliation['afid']
                 affiliations.append(afid)
-                if (int(afid),) not in all_ids['affiliations']:
-                    all_ids['affiliations'].add((int(afid),))
-                    val.append((afid, affiliation['affilname'],
-                                affiliation['affiliation-city'],
-                                affiliation['affiliation-country'],
-                                affiliation['affiliation-url']))
-            if len(val) > 0:
-                mycursor.executemany(sql['v'], val)
-                mydb.commit()
+                if int(afid) not in all_ids['affiliations']:
+                    all_ids['affiliations'].add(int(afid))
+                    batch['v'].append((afid, affiliation['affilname'],
+                                       affiliation['affiliation-city'],
+                                       affiliation['affiliation-country'],
+                                       affiliation['affiliation-url']))
         except KeyError:
             pass  # No info on affiliations.
-        val = []
         try:
             for author in ele['author']:
                 authid = author['authid']
                 if authid == '':
-                    authid = data['auth_my']
-                    data['auth_my'] += 1
+                    authid = str(next(all_ids['next_author']))
                 authors.append(authid)
-                if (int(authid),) not in all_ids['authors']:
-                    all_ids['a'].add((int(authid),))
+                if int(authid) not in all_ids['authors']:
+                    all_ids['authors'].add(int(authid))
                     try:
                         afids = ','.join([e['$'] for e in author['afid']])
                     except KeyError:
                         afids = ''  # No affiliation ids given
-                    val.append((authid, author['authname'], author['surname'],
-                                author['given-name'], author['initials'],
-                                afids, author['author-url']))
-            if len(val) > 0:
-                mycursor.executemany(sql['a'], val)
-                mydb.commit()
+                    batch['a'].append((authid, author['authname'],
+                                       author['surname'], author['given-name'],
+                                       author['initials'], afids,
+                                       author['author-url']))
         except KeyError:
             pass  # No info on authors
-        label, data = field(ele, data, keyword, kw)
-        if eid == '':  # Insert document from field of interest
-            mycursor.execute(sql['p'], values_to_insert(
-                ele, label, authors, affiliations))
-        else:  # Insert document that cites a publication in the field
-            mycursor.execute(sql['p'], values_to_insert(
-                ele, label, authors, affiliations, cites=str(int(eid[7:]))))
-        mydb.commit()
-        # If true, remove from additional table
-        if (ele_eid,) in all_ids['others']:
-            # Get publications that cite the given article
-            mycursor.execute(
-                f'SELECT referenced_by FROM additional WHERE id={ele_eid}')
-            refs = str(mycursor.fetchall()[0][0])
-            for ref in refs.split(','):
-                mycursor.execute(
-                    f'SELECT cites FROM publications WHERE eid={ref}')
-                referenced_articles = str(mycursor.fetchall()[0][0])
-                if str(ele_eid) in referenced_articles.split(','):
-                    continue
-                elif referenced_articles != '':
-                    referenced_articles = f'{referenced_articles},{ele_eid}'
-                else:
-                    referenced_articles = str(ele_eid)
-                mycursor.execute(
-                    f'UPDATE publications SET cites="{referenced_articles}" WHERE eid={ref}')
-            # Remove from additional table
-            all_ids['others'].discard((ele_eid,))
-            mycursor.execute(
-                f'DELETE FROM additional WHERE id={ele_eid}')
-            mydb.commit()
+        label, batch = field(ele, batch, matcher, kw)
+        all_ids['publications'][ele_eid] = label
+        batch['p'][ele_eid] = list(values_to_insert(
+            ele, label, authors, affiliations))
+        if eid != '':  # Document cites a publication in the field
+            batch['c'].append((ele_eid, int(eid[7:]), 'search'))
+        # If true, remove from additional table. The edges from the articles
+        # citing it stay in the citations table under the same id.
+        if ele_eid in all_ids['others']:
+            all_ids['others'].discard(ele_eid)
+            batch['others'].append(ele_eid)
     elif eid == '':  # Update label for article that's already in the table
         data['indatabase'] += 1
-        mycursor.execute(
-            f'SELECT field FROM publications WHERE eid={ele_eid}')
-        label = str(mycursor.fetchall()[0][0])
-        if kw in label.split(','):
+        labels = all_ids['publications'][ele_eid].split(',')
+        if kw in labels:
             return all_ids, data
-        if label == 'OTHER':
-            label = kw
-            if str(ele['eid']) not in data['eids']:
-                data['eids'].append(str(ele['eid']))
+        if labels == ['OTHER']:
+            labels = [kw]
+            batch['eids'][str(ele['eid'])] = None
         else:
-            label = f'{label},{kw}'
-        mycursor.execute(
-            f'UPDATE publications SET field="{label}" WHERE eid={ele_eid}')
-        mydb.commit()
+            labels = labels + [kw]
+        label = ','.join(labels)
+        all_ids['publications'][ele_eid] = label
+        # Written to the database with the rest of the batch.
+        set_value(batch, ele_eid, 'field', label)
+    return all_ids, data
+
+
+def add_citing_record(mycursor, all_ids, data, batch, ele, matcher, kw, eid):
+    """
+    Record that the publication cites the given queued publication.
+
+    If the citing publication is already in the database, only the citation
+    edge is added. Otherwise the publication is added via add_record.
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+    all_ids : dict
+        Dictionary of lists of publications, authors, and affiliations.
+    data : dict
+        Dictionary containing information about current state of the project.
+    batch : dict
+        Pending writes, see new_batch.
+    ele : dict
+        Dictionary with info about the citing publication.
+    matcher : dict
+        Matcher of all keywords, see build_matcher.
+    kw : string
+        Abbreviation of the keyword.
+    eid : string
+        Id of the cited publication.
+
+    Returns
+    -------
+    all_ids : dict
+        Updated dictionary.
+    data : dict
+        Updated dictionary.
+
+    """
+    ele_eid = int(ele['eid'][7:])
+    if ele_eid not in all_ids['publications']:
+        return add_record(
+            mycursor, all_ids, data, batch, ele, matcher, kw, eid=eid)
+    data['indatabase'] += 1
+    batch['size'] += 1
+    batch['c'].append((ele_eid, int(eid[7:]), 'search'))
     return all_ids, data
 
 
-def main():
+def fetch_citing_pages(eid, cursor, headers, budget, results, get=requests.get,
+                       stopped=(), profile=CITING_PROFILE):
+    """
+    Fetch the pages of articles citing one publication, in cursor order.
+
+    Runs in a worker thread. Every parsed page is put on the results queue
+    as ('page', eid, next_cursor, entries). The last message for the eid is
+    ('done', eid, cursor, None) once the results are exhausted,
+    ('paused', eid, cursor, None) if the budget ran out first or
+    ('stopped', eid, cursor, None) once the eid is in stopped.
+
+    Parameters
+    ----------
+    eid : string
+        Id of the cited publication.
+    cursor : string
+        Cursor to resume from; '*' for the first page.
+    headers : dict
+        Request headers with the api key.
+    budget : RateLimit
+        Budget of API calls shared between the workers.
+    results : Queue
+        Queue read by the writer.
+    get : function, optional
+        Function fetching a url, e.g. ResponseStore.get. The default is
+        requests.get.
+    stopped : set, optional
+        Eids whose crawl the writer stopped early. The default is ().
+    profile : string, optional
+        Request profile, see PROFILES. The default is CITING_PROFILE.
+
+    """
+    status = 'paused'
+    try:
+        while eid not in stopped and budget.acquire():
+            response = get(
+                CITING_API.format(eid=eid, cursor=cursor) + PROFILES[profile],
+                headers=headers)
+            if isinstance(response, StoredResponse):
+                budget.release()  # Served from the store, no call spent
+            else:
+                budget.update(response)
+            try:
+                page = response.json()['search-results']
+            except KeyError:
+                cursor = '*'
+                continue
+            except JSONDecodeError:
+                print(response)
+                continue
+            if cursor == page['cursor']['@next']:
+                status = 'done'  # Reached the end of results.
+                break
+            cursor = page['cursor']['@next']
+            try:
+                entries = page['entry']
+            except KeyError:
+                entries = []
+            results.put(('page', eid, cursor, entries))
+        if eid in stopped:
+            status = 'stopped'
+    finally:
+        results.put((status, eid, cursor, None))
+
+
+def crawl_citing_concurrent(queue, headers, budget, handle_page, workers=4,
+                            get=requests.get, frontier=None, policy=None,
+                            profile=CITING_PROFILE):
+    """
+    Crawl the articles citing the queued publications with several workers.
+
+    Up to `workers` queued eids are fetched at the same time, each following
+    its own cursor. Pages are handed to handle_page in the calling thread,
+    so only one thread writes to the database. Eids queued by handle_page
+    while the crawl runs are picked up as well. An eid is acknowledged once
+    all of its pages have been handled; every unfinished eid keeps its
+    cursor in the queue to resume from. The pages of every eid are added
+    to its statistics in the queue, and its crawl is stopped as soon as the
+    policy says so; pages already fetched by then are still handled.
+
+    Parameters
+    ----------
+    queue : CrawlQueue
+        Queue of publications whose citing articles need crawling.
+    headers : dict
+        Request headers with the api key.
+    budget : RateLimit
+        Budget of API calls shared between the workers.
+    handle_page : function
+        Called as handle_page(eid, entries) for every fetched page, after
+        the cursor of the eid has been moved past the page. Returns the
+        number of new records of the page (None counts as 0).
+    workers : int, optional
+        Number of eids fetched at the same time. The default is 4.
+    get : function, optional
+        Function fetching a url, e.g. ResponseStore.get. The default is
+        requests.get.
+    frontier : Frontier, optional
+        Order in which the eids are started. The default is None (queue
+        order).
+    policy : StopPolicy, optional
+        When to stop the crawl of an eid early. The default is None (never).
+    profile : string, optional
+        Request profile, see PROFILES. The default is CITING_PROFILE.
+
+    Returns
+    -------
+    queue : CrawlQueue
+        Updated queue.
+
+    """
+    def process(message):
+        status, eid, cursor, entries = message
+        if status == 'page':
+            # handle_page commits the page, so move its cursor first.
+            queue.move(eid, cursor)
+            new = handle_page(eid, entries) or 0
+            citedby = citedby_count(entries[-1]) if len(entries) > 0 else None
+            eid_stats = queue.add_page(eid, new, len(entries), citedby)
+            reason = policy.stop(eid_stats) if policy is not None else None
+            if reason is not None and queue.is_pending(eid):
+                queue.stop(eid, reason)
+                stopped.add(eid)
+        elif status == 'done' and queue.is_pending(eid):
+            queue.ack(eid)
+    def next_eid():
+        if frontier is not None:
+            frontier.refresh(queue)
+            return frontier.pop(queue, exclude=in_flight)
+        for eid in queue:
+            if eid not in in_flight:
+                return eid
+        return None
+    results = Queue()
+    in_flight = set()
+    stopped = set()
+    message = None
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            while len(in_flight) < workers and budget.remaining > budget.floor:
+                eid = next_eid()
+                if eid is None:
+                    break
+                in_flight.add(eid)
+                executor.submit(fetch_citing_pages, eid, queue.cursor(eid),
+                                headers, budget, results, get, stopped,
+                                profile)
+            if len(in_flight) == 0:
+                break
+            try:
+                message = results.get(timeout=1)
+            except Empty:
+                continue
+            if message[0] != 'page':
+                in_flight.discard(message[1])
+            process(message)
+            message = None
+    except KeyboardInterrupt:
+        budget.halt()
+        executor.shutdown(wait=True)
+        # Write the page that was interrupted and the ones already fetched.
+        if message is not None:
+            process(message)
+        while not results.empty():
+            process(results.get())
+        raise
+    executor.shutdown(wait=True)
+    return queue
+
+
+def citedby_count(ele):
+    """Return the citedby-count of a search result, or None if it has none."""
+    try:
+        return int(ele['citedby-count'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def collect_ids(mycursor, check=True):
+    """
+    Return the ids of the records already in the database.
+
+    The publications are mapped to their labels. Every set is an IdIndex,
+    memory-mapped from the files in ids/ unless its table has changed
+    (only checked if check is True). 'next_author' gives the ids of authors
+    without a SCOPUS id, see AuthorIds.
+    """
+    indexes = load_ids(mycursor, check=check)
+    return {'publications': indexes['publications'],
+            'affiliations': indexes['affiliations'],
+            'authors': indexes['authors'], 'others': indexes['additional'],
+            'next_author': AuthorIds()}
+
+
+def save_ids(all_ids):
+    """Merge the ids added during the run into the files in ids/."""
+    for key in ('publications', 'affiliations', 'authors', 'others'):
+        all_ids[key].save()
+
+
+def replay(store=None, batch_size=1000):
+    """
+    Rebuild the database from the stored search pages, without the network.
+
+    Pages are fed to add_record/add_citing_record in the order they were
+    fetched. Citing pages are labelled with the keyword of the last search
+    page before them, like in main. Eids found for citing crawls go to an
+    in-memory queue, so the crawl queue is left as it is. The records per
+    second make this a deterministic benchmark of the ingestion.
+
+    Parameters
+    ----------
+    store : ResponseStore, optional
+        Store to replay. The default is None (responses.sqlite).
+    batch_size : int, optional
+        Commit the pending writes once at least this many records have been
+        processed. The default is 1000.
+
+    Returns
+    -------
+    stats : dict
+        Numbers of pages and records, seconds, and records per second.
+
+    """
+    if store is None:
+        store = ResponseStore()
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+    data = Checkpoint()  # For the ids of authors without a SCOPUS id
+    for key in ('records_checked', 'newlyadded', 'indatabase'):
+        data[key] = 0
+    all_ids = collect_ids(mycursor)
+    queue = CrawlQueue(':memory:')
+    batch = new_batch()
+    keywords_abbr = {**get_keywords('added_keywords.txt'), **get_keywords()}
+    matcher = build_matcher(keywords_abbr)
+    kw = ''
+    stats = {'pages': 0, 'records': 0}
+    start = perf_counter()
+    for response in store.pages('search'):
+        url = unquote(response.url)
+        try:
+            entries = response.json()['search-results']['entry']
+        except (KeyError, JSONDecodeError):
+            continue
+        citing = re.search(r'refeid\((.+?)\)', url)
+        if citing is None:
+            keyword = re.search(r'TITLE(?:-ABS)?\("(.+?)"', url)
+            if keyword is None or keyword.group(1) not in keywords_abbr:
+                continue
+            kw = keywords_abbr[keyword.group(1)]
+        for ele in entries:
+            if 'eid' not in ele:
+                continue  # Empty result page
+            if citing is None:
+                all_ids, data = add_record(
+                    mycursor, all_ids, data, batch, ele, matcher, kw)
+            else:
+                all_ids, data = add_citing_record(
+                    mycursor, all_ids, data, batch, ele, matcher, kw,
+                    citing.group(1))
+            stats['records'] += 1
+        stats['pages'] += 1
+        if batch['size'] >= batch_size:
+            flush_batch(mydb, mycursor, batch, SQL, queue)
+            data.save()
+    flush_batch(mydb, mycursor, batch, SQL, queue)
+    data.compact()
+    save_ids(all_ids)
+    stats['seconds'] = perf_counter() - start
+    stats['records/s'] = stats['records'] / max(stats['seconds'], 1e-9)
+    print(f"Replayed {stats['pages']} pages, {stats['records']} records in "
+          f"{stats['seconds']:.1f} s ({stats['records/s']:.0f} records/s)")
+    return stats
+
+
+def search_results(response, stream=False):
+    """
+    Return the search results of the response.
+
+    Parameters
+    ----------
+    response : requests.Response or StoredResponse
+        Response of the search API.
+    stream : bool, optional
+        If True, return a SearchPage whose entries are decoded one at a
+        time. The default is False (decode the whole page at once).
+
+    Returns
+    -------
+    dict or SearchPage
+        Search results, with the 'cursor', 'link' and 'entry' fields.
+
+    """
+    if stream:
+        return SearchPage(response)
+    return response.json()['search-results']
+
+
+def remaining_entries(page, done):
+    """
+    Return the entries of a search results page not added yet.
+
+    Parameters
+    ----------
+    page : dict or SearchPage
+        Search results page, see search_results.
+    done : int
+        Number of entries added before the page was interrupted.
+
+    Returns
+    -------
+    entries : list or generator
+        Entries after the first done ones. A SearchPage resumes its entries
+        with the interrupted one, so its entries are returned as they are.
+
+    """
+    if isinstance(page, SearchPage):
+        return page['entry']
+    return page['entry'][done:]
+
+
+def keyword_estimates(groups, publications, store, profile=KEYWORD_PROFILE):
+    """
+    Return the expected new records and calls to crawl every keyword query.
+
+    The number of results is read from the stored first page of the
+    query, if there is one. See scheduler.keyword_estimate.
+
+    Parameters
+    ----------
+    groups : dict
+        Abbreviation and keywords per query, see keyword_groups.
+    publications : IdIndex
+        Index of the publications and their labels.
+    store : ResponseStore
+        Store of the responses of the API.
+    profile : string, optional
+        Request profile of the keyword queries, see PROFILES. The default
+        is KEYWORD_PROFILE.
+
+    Returns
+    -------
+    estimates : dict
+        Expected new records and calls per query.
+
+    """
+    labelled = dict()
+    for labels, n in publications.value_counts().items():
+        for label in labels.split(','):
+            labelled[label] = labelled.get(label, 0) + n
+    estimates = dict()
+    for keyword, (kw, _) in groups.items():
+        total = None
+        response = store.peek(KEYWORD_API.format(keyword=keyword)
+                              + PROFILES[profile])
+        if response is not None:
+            try:
+                total = int(response.json()['search-results']['opensearch:totalResults'])
+            except (KeyError, ValueError):
+                pass
+        estimates[keyword] = keyword_estimate(total, labelled.get(kw, 0))
+    return estimates
+
+
+def keyword_order(estimates, data):
+    """
+    Return the keyword queries, most expected new records per call first.
+
+    The query that was partly crawled (data['query'], if data['api'] is
+    set) comes first, so its saved next page is used for it. Queries
+    without an estimate are assumed to give a full page of new records per
+    call.
+    """
+    def score(keyword):
+        expected, calls = estimates[keyword]
+        return PAGE_SIZE if expected is None else expected / calls
+    keywords = sorted(estimates, key=score, reverse=True)
+    query = data.get('query', '')
+    if data['api'] != '' and query in estimates:
+        keywords.remove(query)
+        return [query] + keywords
+    return keywords
+
+
+def main(workers=1, batch_size=None, stream=False, reserve=RESERVE,
+         dry_run=False, policy=None, keyword_profile=KEYWORD_PROFILE,
+         citing_profile=CITING_PROFILE):
+    """
+    Crawl SCOPUS for the keywords in list-of-labels.txt and their citations.
+
+    Every call goes to the keyword page or queued eid that is expected to
+    give the most new records per call: the last page of the keyword
+    stands in for its next one, and a queued eid is expected to give its
+    citedby-count minus its citations in the database (see
+    scheduler.Frontier). A started citing crawl is finished first, unless
+    the policy stops it early. Eids stopped by an earlier run are crawled
+    again if the policy would not stop them (all of them without a
+    policy), see CrawlQueue.resume.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of queued eids whose citing articles are fetched at the same
+        time. The default is 1 (sequential crawl).
+    batch_size : int, optional
+        Commit the pending writes and save progress once at least this many
+        records have been processed, at the end of a search-results page.
+        The default is None: commit after every page.
+    stream : bool, optional
+        Decode the entries of the search-results pages one at a time while
+        they are added, instead of the whole page first. Fetched pages are
+        read from the connection meanwhile (see ResponseStore.get), so a
+        page is never in memory whole. The default is False.
+    reserve : int, optional
+        Number of calls of the weekly quota to leave unused. The default is
+        RESERVE.
+    dry_run : bool, optional
+        Only report the calls needed to finish the crawl (see
+        scheduler.plan), without calling the API. The default is False.
+    policy : StopPolicy, optional
+        When to stop the crawl of the citing articles of an eid early. The
+        default is None (never).
+    keyword_profile : string, optional
+        Request profile of the keyword queries, see PROFILES. The default
+        is KEYWORD_PROFILE.
+    citing_profile : string, optional
+        Request profile of the citing articles. The default is
+        CITING_PROFILE.
+
+    Returns
+    -------
+    report : dict
+        Report of the planner if dry_run is True, else None.
+
+    """
     # Set up a connection to the local database
     db_data = load(open('mydb_setup.json'))
     mydb = mysql.connector.connect(**db_data)
@@ -318,63 +1185,108 @@ def main():
     data = load(open('headers.json'))
     for head in data:
         headers[head] = data[head]
-    # Read data from file
-    data = load(open('save.json'))
+    # Read the state of the project
+    data = Checkpoint()
     data['records_checked'] = 0
     data['newlyadded'] = 0
     data['indatabase'] = 0
-    # Collect ids
-    all_ids = dict()
-    mycursor.execute('SELECT eid FROM publications')
-    all_ids['publications'] = set(mycursor.fetchall())
-    mycursor.execute('SELECT id FROM affiliations')
-    all_ids['affiliations'] = set(mycursor.fetchall())
-    mycursor.execute('SELECT id FROM authors')
-    all_ids['authors'] = set(mycursor.fetchall())
-    mycursor.execute('SELECT id FROM additional')
-    all_ids['others'] = set(mycursor.fetchall())
-    sql = {'a': ('INSERT INTO authors (id, authname, surname, given_name,'
-                 ' initials, afids, url) VALUES (%s, %s, %s, %s, %s, %s, %s)'),
-           'v': ('INSERT INTO affiliations (id, name, city, country, url)'
-                 ' VALUES (%s,%s, %s, %s, %s)'),
-           'p': ('INSERT INTO publications (eid, title, source, issn, volume,'
-                 ' issue, date, doi, abstract, citedby, affiliation, type,'
-                 ' author_count, authors, author_keywords, source_id, url,'
-                 ' field, cites) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s,'
-                 ' %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)')}
+    quota = Quota.from_data(data)
+    # Move the queue of eids and cursors kept in save.json to the crawl queue
+    queue = CrawlQueue()
+    cursors = data.pop('cursors', dict())
+    for i, eid in enumerate(data.pop('eids', [])):
+        if not queue.push(eid):
+            continue
+        if i == 0 and data['cursor'] != '*':
+            queue.move(eid, data['cursor'])
+        elif eid in cursors:
+            queue.move(eid, cursors[eid])
+    resumed = queue.resume(policy)
+    if len(resumed) > 0:
+        print(f'{len(resumed)} stopped eids resumed')
+    queue.commit()
+    all_ids = collect_ids(mycursor)
+    batch = new_batch()
+    store = ResponseStore()
+    frontier = Frontier(mycursor)
+    queries = data.get('queries', dict())  # Overlap counters per query
+
+    def checkpoint(final=False):
+        # Save progress only once the records it covers are committed.
+        flush_batch(mydb, mycursor, batch, SQL, queue)
+        queue.commit()
+        quota.save(data)
+        data['queries'] = queries
+        data.save()
+        if final:  # Rewriting the id files takes a while, so only at the end
+            save_ids(all_ids)
     keywords_abbr = get_keywords()
-    for ele in keywords_abbr.copy():
-        keyword = ele
-        kw = keywords_abbr[ele]
-        while data['limit'] > 50:
+    # One query for all keywords of an abbreviation, see keyword_groups.
+    groups = keyword_groups(keywords_abbr,
+                            started=started_keyword(keywords_abbr, data))
+    if data.get('query', '') not in groups:
+        data['api'] = ''  # The query was removed from list-of-labels.txt
+    estimates = keyword_estimates(groups, all_ids['publications'], store,
+                                  keyword_profile)
+    if dry_run:
+        report = plan(frontier, queue, estimates, quota)
+        queue.close()
+        store.close()
+        return report
+    # Label publications with every known keyword, crawled or not.
+    matcher = build_matcher({**get_keywords('added_keywords.txt'),
+                             **keywords_abbr})
+    # After the keywords (None), only the queue is left to crawl.
+    for keyword in keyword_order(estimates, data) + [None]:
+        if keyword is None:
+            kw, score = '', -inf
+        else:
+            kw, keywords = groups[keyword]
+            stats = queries.setdefault(keyword, {
+                'label': kw, 'keywords': len(keywords), 'calls': 0,
+                'records': 0, 'new': 0, 'known': 0, 'hits': 0})
+            hits_matcher = build_matcher({k: k for k in keywords})
+            expected, calls = estimates[keyword]
+            # New records expected from the next page of the keyword.
+            score = PAGE_SIZE if expected is None else expected / calls
+        current = None  # Eid whose citing articles are being crawled
+        finished = False
+        while quota.allows(reserve):
             try:
-                if data['api'] == '':
-                    data['api'] = 'http://api.elsevier.com/content/search/scopus?query=TITLE("{keyword}")%20OR%20ABS("{keyword}")&cursor=*&view=COMPLETE'
+                frontier.refresh(queue)
+                if keyword is None and current is None and len(queue) == 0:
+                    break
+                if keyword is not None and data['api'] == '':
+                    data['api'] = KEYWORD_API + PROFILES[keyword_profile]
+                    data['query'] = keyword
                     data['cursor'] = '*'
                 # Get documents from SCOPUS that match the specified keyword
-                if len(data['eids']) == 0:
-                    response = requests.get(data['api'].format(
-                        keyword=keyword), headers=headers)
-                    try:
-                        data['limit'] = int(
-                            response.headers['X-RateLimit-Remaining'])
-                    except KeyError:
-                        data['limit'] -= 1
+                if (keyword is not None and current is None
+                        and (workers == 1 or len(queue) == 0)
+                        and score >= frontier.best(queue)):
+                    response = store.get(data['api'].format(
+                        keyword=keyword), headers=headers, stream=stream)
+                    quota.update(response)
+                    stats['calls'] += 1
                     # Convert response object to json (it's easier to use).
                     try:
-                        response = response.json()['search-results']
+                        response = search_results(response, stream)
                     except JSONDecodeError:
-                        with open('save.json', 'w', encoding='utf8') as json_file:
-                            dump(data, json_file, ensure_ascii=False)
+                        checkpoint()
                         print(response)
                         continue
                     if response['cursor']['@current'] == response['cursor']['@next']:
                         # The above is true if we reached the end of results.
                         data['cursor'] = '*'
                         data['api'] = ''
+                        data['query'] = ''
+                        finished = True
                         break
                     else:
                         data['cursor'] = response['cursor']['@next']
+                    newlyadded = data['newlyadded']
+                    indatabase = data['indatabase']
+                    done = 0  # Entries of the page added
                     try:
                         for link in response['link']:
                             if link['@ref'] == 'next':
@@ -382,109 +1294,120 @@ def main():
                         try:
                             for ele in response['entry']:
                                 all_ids, data = add_record(
-                                    mydb, mycursor, all_ids, data, ele, sql, keyword, kw)
+                                    mycursor, all_ids, data, batch, ele, matcher, kw)
                                 data['records_checked'] += 1
-                        except KeyError:
+                                stats['records'] += 1
+                                stats['hits'] += keyword_hits(hits_matcher, ele)
+                                done += 1
+                        except (KeyError, JSONDecodeError):
                             print(response)
                             continue
+                        score = data['newlyadded'] - newlyadded
+                        stats['new'] += score
+                        stats['known'] += data['indatabase'] - indatabase
+                        if batch_size is None or batch['size'] >= batch_size:
+                            checkpoint()
                     except KeyboardInterrupt:
                         for link in response['link']:
                             if link['@ref'] == 'next':
                                 data['api'] = link['@href']
-                        with open('save.json', 'w', encoding='utf8') as json_file:
-                            dump(data, json_file, ensure_ascii=False)
-                        foo = mycursor.fetchall()  # Collect records to avoid raising errors
-                        for ele in response['entry']:
+                        for ele in remaining_entries(response, done):
                             all_ids, data = add_record(
-                                mydb, mycursor, all_ids, data, ele, sql, keyword, kw)
+                                mycursor, all_ids, data, batch, ele, matcher, kw)
+                            data['records_checked'] += 1
+                        checkpoint(final=True)
+                        return
+                elif workers > 1:  # Fetch citing articles for several eids at once
+                    budget = RateLimit(quota.available(), floor=reserve)
+
+                    def handle_page(eid, entries):
+                        nonlocal all_ids, data
+                        newlyadded = data['newlyadded']
+                        for ele in entries:
+                            all_ids, data = add_citing_record(
+                                mycursor, all_ids, data, batch, ele, matcher, kw, eid)
+                            data['records_checked'] += 1
+                        if batch_size is None or batch['size'] >= batch_size:
+                            checkpoint()
+                        return data['newlyadded'] - newlyadded
+                    try:
+                        queue = crawl_citing_concurrent(
+                            queue, headers, budget, handle_page,
+                            workers=workers, get=store.get, frontier=frontier,
+                            policy=policy, profile=citing_profile)
+                    finally:
+                        budget.settle(quota)
+                else:  # Get the citing articles for the best queued publication
+                    if current is None:
+                        current = frontier.pop(queue)
+                    eid = current
+                    cursor = queue.cursor(eid)
+                    response = store.get(CITING_API.format(
+                        eid=eid, cursor=cursor) + PROFILES[citing_profile],
+                        headers=headers, stream=stream)
+                    quota.update(response)
+                    try:
+                        response = search_results(response, stream)
+                    except KeyError:
+                        queue.move(eid, '*')
+                        continue
+                    except JSONDecodeError:
+                        checkpoint()
+                        print(response)
+                        continue
+                    if cursor == response['cursor']['@next']:
+                        queue.ack(eid)
+                        current = None
+                        continue
+                    else:
+                        queue.move(eid, response['cursor']['@next'])
+                    newlyadded, records, citedby = data['newlyadded'], 0, None
+                    try:
+                        for ele in response['entry']:
+                            all_ids, data = add_citing_record(
+                                mycursor, all_ids, data, batch, ele, matcher, kw, eid)
+                            data['records_checked'] += 1
+                            records += 1
+                            citedby = citedby_count(ele)
+                        eid_stats = queue.add_page(
+                            eid, data['newlyadded'] - newlyadded, records, citedby)
+                        reason = policy.stop(eid_stats) if policy is not None else None
+                        if reason is not None:
+                            queue.stop(eid, reason)
+                            current = None
+                        if batch_size is None or batch['size'] >= batch_size:
+                            checkpoint()
+                    except JSONDecodeError:  # Page cut off while streamed
+                        print(response)
+                        queue.move(eid, cursor)
+                    except KeyboardInterrupt:
+                        for ele in remaining_entries(response, records):
+                            all_ids, data = add_citing_record(
+                                mycursor, all_ids, data, batch, ele, matcher, kw, eid)
+                            data['records_checked'] += 1
+                        checkpoint(final=True)
                         return
-                else:  # Get the citing articles for the publications in the queue
-                    api = 'http://api.elsevier.com/content/search/scopus?query=refeid({eid})&cursor={cursor}&view=COMPLETE&sort=citedby-count'
-                    while data['limit'] > 10 and len(data['eids']) > 0:
-                        eid = data['eids'][0]
-                        response = requests.get(api.format(
-                            eid=eid, cursor=data['cursor']), headers=headers)
-                        try:
-                            data['limit'] = int(
-                                response.headers['X-RateLimit-Remaining'])
-                        except KeyError:
-                            data['limit'] -= 1
-                        try:
-                            response = response.json()['search-results']
-                        except KeyError:
-                            data['cursor'] = '*'
-                            continue
-                        except JSONDecodeError:
-                            with open('save.json', 'w', encoding='utf8') as json_file:
-                                dump(data, json_file, ensure_ascii=False)
-                            print(response)
-                            continue
-                        if data['cursor'] == response['cursor']['@next']:
-                            data['cursor'] = '*'
-                            data['eids'].remove(eid)
-                            continue
-                        else:
-                            data['cursor'] = response['cursor']['@next']
-                        try:
-                            for ele in response['entry']:
-                                ele_eid = int(ele['eid'][7:])
-                                if (ele_eid,) in all_ids['publications']:
-                                    data['indatabase'] += 1
-                                    data['records_checked'] += 1
-                                    mycursor.execute(
-                                        f'SELECT cites from publications WHERE eid={ele_eid}')
-                                    referenced_articles = str(mycursor.fetchall()[0][0])
-                                    if eid[7:] in referenced_articles.split(','):
-                                        continue
-                                    if referenced_articles == '':
-                                        referenced_articles = eid[7:]
-                                    else:
-                                        referenced_articles = f'{referenced_articles},{eid[7:]}'
-                                    mycursor.execute(
-                                        f'UPDATE publications SET cites="{referenced_articles}" WHERE eid={ele_eid}')
-                                    mydb.commit()
-                                    continue
-                                all_ids, data = add_record(
-                                    mydb, mycursor, all_ids, data, ele, sql, keyword, kw, eid=eid)
-                                data['records_checked'] += 1
-                        except KeyboardInterrupt:
-                            foo = mycursor.fetchall()  # Collect records to avoid raising errors
-                            with open('save.json', 'w', encoding='utf8') as json_file:
-                                dump(data, json_file, ensure_ascii=False)
-                            for ele in response['entry']:
-                                ele_eid = int(ele['eid'][7:])
-                                if (ele_eid,) in all_ids['publications']:
-                                    data['indatabase'] += 1
-                                    mycursor.execute(
-                                        f'SELECT cites from publications WHERE eid={ele_eid}')
-                                    referenced_articles = str(mycursor.fetchall()[0][0])
-                                    if eid[7:] in referenced_articles.split(','):
-                                        continue
-                                    if referenced_articles == '':
-                                        referenced_articles = eid[7:]
-                                    else:
-                                        referenced_articles = f'{referenced_articles},{eid[7:]}'
-                                    mycursor.execute(
-                                        f'UPDATE publications SET cites="{referenced_articles}" WHERE eid={ele_eid}')
-                                    mydb.commit()
-                                    continue
-                                all_ids, data = add_record(
-                                    mydb, mycursor, all_ids, data, ele, sql, keyword, kw, eid=eid)
-                            return
             except KeyboardInterrupt:
-                with open('save.json', 'w', encoding='utf8') as json_file:
-                    dump(data, json_file, ensure_ascii=False)
+                checkpoint(final=True)
                 return  # If no records fetched from SCOPUS yet
+        if keyword is None or not finished:
+            break  # Out of quota, the keyword is resumed on the next run
         f = open('added_keywords.txt', 'a')
-        f.write(f'\n{keyword} : {kw}')
+        for key in keywords:
+            f.write(f'\n{key} : {kw}')
+            keywords_abbr.pop(key)
         f.close()
-        keywords_abbr.pop(keyword)
         f = open('list-of-labels.txt', 'w')
         for key in keywords_abbr:
             f.write(f'{key} : {keywords_abbr[key]}\n')
         f.close()
-    with open('save.json', 'w', encoding='utf8') as json_file:
-        dump(data, json_file, ensure_ascii=False)
+    checkpoint(final=True)
+    data.compact()
+    queue.close()
+    store.close()
+    if len(queries) > 0:
+        overlap_report(queries)
 
 
-main()
+if __name__ == '__main__':
+    main()
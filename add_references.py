@@ -7,199 +7,564 @@ Created on Sun Feb 26 16:16:36 2023
 """
 
 import requests
-import xmltodict
 import mysql.connector
-from json import load, dump
+from json import load
+from time import perf_counter
+from hashlib import sha256
+from xml.etree.ElementTree import ParseError
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor
+from checkpoint import Checkpoint
+from response_store import ResponseStore, StoredResponse
+from id_index import load_ids
+from author_ids import AuthorIds
+from ref_parser import parse_references
+from reference_resolver import ReferenceResolver
+from add_from_scopus import RateLimit
+from scheduler import Quota, RESERVE
 
 
-def add_record_additional(mydb, mycursor, all_ids, data, ele, entry, sql):
+def add_record_additional(all_ids, data, batch, ele, entry):
     """
-    Insert a row to the database (name 'additional').
+    Add a referenced publication to the batch (table 'additional').
+
+    The ids are resolved against the in-memory id sets only; the rows are
+    written by flush_references. A new reference that matches a
+    publication by doi or title (see ReferenceResolver) is not added; the
+    edge points to the publication instead.
 
     Parameters
     ----------
-    mydb : database
-        Connection to the database.
-    mycursor : cursor
-        Cursor connected to the database.
     all_ids : dict
         Dictionary of lists of publications, authors, and affiliations.
     data : dict
         Dictionary containing information about current state of the project.
-    ele : dict
-        Dictionary with info about the publication.
+    batch : dict
+        Pending rows, see new_reference_batch.
+    ele : Reference
+        Referenced publication, see ref_parser.
     entry : tuple
-        Tuple containing the id of the referenced publication.
-    sql : dict
-        Dictionary of strings for inserting rows into the database.
+        Tuple containing the id of the referencing publication.
 
     Returns
     -------
-    all_ids : TYPE
-        DESCRIPTION.
-    data : TYPE
-        DESCRIPTION.
+    all_ids : dict
+        Updated dictionary.
+    data : dict
+        Updated dictionary.
 
     """
-    if (int(ele['scopus-id']),) in all_ids['others']:
+    if ele.scopus_id in all_ids['others'] or ele.scopus_id in all_ids['publications']:
+        # Every reference is an edge, whichever table the cited record is in.
+        batch['c'].append((entry[0], ele.scopus_id, 'ref'))
         data['indatabase'] += 1
-        mycursor.execute(
-            f"SELECT referenced_by FROM additional WHERE id={ele['scopus-id']}")
-        articles_citing_ele = str(mycursor.fetchall()[0][0])
-        if str(entry[0]) in articles_citing_ele.split(','):
-            return all_ids, data
-        articles_citing_ele = f'{articles_citing_ele},{entry[0]}'
-        mycursor.execute(
-            f'UPDATE additional SET referenced_by="{articles_citing_ele}" WHERE id={ele["scopus-id"]}')
-    else:
-        if (int(ele['scopus-id']),) in all_ids['publications']:
-            data['indatabase'] += 1
-            mycursor.execute(
-                f'SELECT cites FROM publications WHERE eid={entry[0]}')
-            references = str(mycursor.fetchall()[0][0])
-            if str(ele['scopus-id']) in references.split(','):
-                return all_ids, data
-            elif references.split(',')[0] != '':
-                references = f"{references},{ele['scopus-id']}"
-            else:
-                references = str(ele['scopus-id'])
-            mycursor.execute(
-                f'UPDATE publications SET cites="{references}" WHERE eid={entry[0]}')
-            mydb.commit()
-            return all_ids, data
-        data['newlyadded'] += 1
-        all_ids['others'].add((int(ele['scopus-id']),))
-        authors, values_to_insert = [], []
-        if ele['author-list'] is not None and 'author' in ele['author-list']:
-            for author_info in ele['author-list']['author']:
-                try:
-                    authid = author_info['@auid']
-                except KeyError:
-                    authid = ''
-                except TypeError:
-                    continue
-                if authid == '':
-                    authid = data['auth_my']
-                    data['auth_my'] += 1
-                authors.append(str(authid))
-                if (int(authid),) not in all_ids['authors']:
-                    all_ids['authors'].add((int(authid),))
-                    if author_info['affiliation'] is not None and '@id' in author_info['affiliation']:
-                        afid = author_info['affiliation']['@id']
-                    else:
-                        afid = ''
-                    if 'author-url' in author_info:
-                        url = author_info['author-url']
-                    else:
-                        url = ''
-                    if 'ce:given-name' in author_info:
-                        first_name = author_info['ce:given-name']
-                    else:
-                        first_name = ''
-                    if 'ce:initials' in author_info:
-                        initials = author_info['ce:initials']
-                    else:
-                        initials = ''
-                    values_to_insert.append(
-                        (authid, author_info['ce:indexed-name'],
-                         author_info['ce:surname'], first_name,
-                         initials, afid, url))
-            if len(values_to_insert) > 0:
-                mycursor.executemany(sql['a'], values_to_insert)
-                mydb.commit()
-        if 'title' in ele:
-            title = ele['title']
-        else:
-            title = ''
-        try:
-            doi = ele['ce:doi']['#text']
-        except KeyError:
-            doi = ''
-        except TypeError:
-            doi = ele['ce:doi'][0]['#text']
-        if 'sourcetitle' in ele:
-            source = ele['sourcetitle']
-        else:
-            source = ''
-        try:
-            citedby = int(ele['citedby-count']['#text'])
-        except KeyError:
-            citedby = 0
-        except TypeError:
-            try:
-                citedby = int(ele['citedby-count'][0]['#text'])
-            except KeyError:
-                citedby = 0
-        if 'prism:coverDate' in ele:
-            date = ele['prism:coverDate']
-        else:
-            date = None
-        mycursor.execute(sql['p'], (ele['scopus-id'], title, ele['url'],
-                                    ele['type'], ','.join(authors), citedby,
-                                    date, doi, source, str(entry[0])))
-    mydb.commit()
+        return all_ids, data
+    eid = all_ids['resolver'].resolve(ele)
+    if eid is not None:
+        batch['c'].append((entry[0], eid, 'ref'))
+        data['resolved'] += 1
+        return all_ids, data
+    batch['c'].append((entry[0], ele.scopus_id, 'ref'))
+    data['newlyadded'] += 1
+    all_ids['others'].add(ele.scopus_id)
+    authors = []
+    for author in ele.authors:
+        authid = author.auid
+        if authid == '':
+            authid = next(all_ids['next_author'])
+        authors.append(str(authid))
+        if int(authid) not in all_ids['authors']:
+            all_ids['authors'].add(int(authid))
+            batch['a'].append(
+                (authid, author.indexed_name, author.surname,
+                 author.given_name, author.initials, author.afid, author.url))
+    batch['p'].append((ele.scopus_id, ele.title, ele.url, ele.type,
+                       ','.join(authors), ele.citedby, ele.date, ele.doi,
+                       ele.source, ''))
     return all_ids, data
 
 
-db_data = load(open('mydb_setup.json'))
-mydb = mysql.connector.connect(**db_data)
-sql = {
+def new_reference_batch():
+    """
+    Create an empty batch of the rows of one reference list.
+
+    Returns
+    -------
+    batch : dict
+        Rows to insert into authors ('a'), additional ('p') and citations
+        ('c').
+
+    """
+    return {'a': [], 'p': [], 'c': []}
+
+
+def flush_references(mycursor, batch, sql):
+    """
+    Insert the rows of the batch, one multi-row statement per table.
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+    batch : dict
+        Pending rows, see new_reference_batch.
+    sql : dict
+        Dictionary of strings for inserting rows into the database.
+
+    Returns
+    -------
+    rows : dict
+        Number of rows inserted per table ('authors', 'additional',
+        'citations'); duplicates skipped by INSERT IGNORE are not counted.
+
+    """
+    rows = dict()
+    for key, table in (('a', 'authors'), ('p', 'additional'),
+                       ('c', 'citations')):
+        rows[table] = 0
+        if len(batch[key]) > 0:
+            mycursor.executemany(sql[key], batch[key])
+            rows[table] = mycursor.rowcount
+    return rows
+
+
+SQL = {
     'a': ('INSERT INTO authors (id, authname, surname, given_name,'
           ' initials, afids, url) VALUES (%s, %s, %s, %s, %s, %s, %s)'),
     'p': ('INSERT INTO additional (id, title, url, reference_type, authors,'
           ' citedby, date, doi, source, referenced_by) VALUES'
-          ' (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)')
+          ' (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'),
+    'c': ('INSERT IGNORE INTO citations (citing_id, cited_id, source)'
+          ' VALUES (%s, %s, %s)')
     }
-api = 'https://api.elsevier.com/content/abstract/eid/{eid}?view=REF'
-headers = requests.utils.default_headers()
-data = load(open('headers.json'))
-for head in data:
-    headers[head] = data[head]
-data = load(open('save.json'))
-data['records_checked'] = 0
-data['newlyadded'] = 0
-data['indatabase'] = 0
-all_ids = dict()
-mycursor = mydb.cursor()
-mycursor.execute('SELECT eid FROM publications WHERE field LIKE "%BA"')
-all_ids['subfield'] = set(mycursor.fetchall())
-mycursor.execute('SELECT eid FROM publications')
-all_ids['publications'] = set(mycursor.fetchall())
-mycursor.execute('SELECT id FROM authors')
-all_ids['authors'] = set(mycursor.fetchall())
-mycursor.execute('SELECT id from additional')
-all_ids['others'] = set(mycursor.fetchall())
-reference_set = set()
-mycursor.execute('SELECT referenced_by FROM additional')
-reference_strings = set(mycursor.fetchall())
-for string in reference_strings:
-    reference_list = string[0].split(',')
-    for ref in reference_list:
-        reference_set.add((int(ref),))
-for entry in all_ids['subfield'].difference(reference_set):
-    eid = f'2-s2.0-{entry[0]}'
-    response = requests.get(api.format(eid=eid), headers=headers)
+REF_API = 'https://api.elsevier.com/content/abstract/eid/{eid}?view=REF'
+SUBFIELDS = ('BA',)  # Labels of the publications whose references are harvested
+REF_QUOTA = 10000  # Calls per week of the abstract retrieval API
+# Harvest status of every publication whose REF response was written.
+HARVESTED_SQL = ('REPLACE INTO harvested (eid, harvested_at, total_references,'
+                 ' response_hash) VALUES (%s, NOW(), %s, %s)')
+
+
+def create_harvested_table(mycursor):
+    """
+    Create the table of harvested publications if it does not exist yet.
+
+    A row is written with the references of the publication, in the same
+    transaction, see write_references. When the table is empty, it is
+    filled from the reference edges harvested before it existed; their
+    response hash is unknown (NULL).
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+
+    """
+    mycursor.execute('CREATE TABLE IF NOT EXISTS harvested ('
+                     'eid BIGINT NOT NULL PRIMARY KEY, '
+                     'harvested_at DATETIME NOT NULL, '
+                     'total_references INT, '
+                     'response_hash CHAR(64), '
+                     'INDEX (harvested_at))')
+    mycursor.execute('SELECT eid FROM harvested LIMIT 1')
+    if len(mycursor.fetchall()) == 0:
+        mycursor.execute(
+            'INSERT IGNORE INTO harvested (eid, harvested_at, total_references)'
+            ' SELECT eid, NOW(), ref_count FROM publications WHERE eid IN'
+            ' (SELECT citing_id FROM citations WHERE source="ref")')
+
+
+def collect_ids(mycursor):
+    """
+    Return the ids of the records already in the database, see IdIndex.
+
+    Also the allocator of author ids ('next_author') and the doi and title
+    indexes of the publications ('resolver').
+    """
+    indexes = load_ids(mycursor, ('publications', 'authors', 'additional'))
+    return {'publications': indexes['publications'],
+            'authors': indexes['authors'], 'others': indexes['additional'],
+            'next_author': AuthorIds(),
+            'resolver': ReferenceResolver.from_database(mycursor)}
+
+
+def pending_references(mycursor, subfields=SUBFIELDS, refresh=None):
+    """
+    Return the eids of the publications whose references are not harvested.
+
+    A publication is harvested once it has a row in the harvested table,
+    written in the same transaction as its references; an interrupted
+    harvest resumes with the first publication not written. The selection
+    is a single query on the primary keys, see create_harvested_table.
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+    subfields : tuple, optional
+        Labels of the publications, any of which must be in the 'field'
+        column. None for all publications. The default is SUBFIELDS.
+    refresh : int, optional
+        Also return the publications harvested more than this many days
+        ago. The default is None (never harvested again).
+
+    Returns
+    -------
+    eids : list
+        Sorted eids, e.g. '2-s2.0-85000000000'.
+
+    """
+    condition = 'h.eid IS NULL'
+    if refresh is not None:
+        condition = (f'({condition} OR h.harvested_at < '
+                     f'NOW() - INTERVAL {int(refresh)} DAY)')
+    query = ('SELECT p.eid FROM publications p LEFT JOIN harvested h'
+             f' ON h.eid = p.eid WHERE {condition}')
+    if subfields is not None:
+        query += ' AND (' + ' OR '.join(
+            f'FIND_IN_SET("{label}", p.field)' for label in subfields) + ')'
+    mycursor.execute(query + ' ORDER BY p.eid')
+    return [f'2-s2.0-{row[0]}' for row in mycursor.fetchall()]
+
+
+def write_references(mydb, mycursor, all_ids, data, eid, references,
+                     digest=None):
+    """
+    Write the reference list of one publication in one transaction.
+
+    The ids of all references are resolved in memory first, then the new
+    rows are inserted with one statement per table, see flush_references,
+    so the number of statements does not grow with the references. The
+    transaction also records the publication as harvested. A response
+    whose hash is the one recorded is skipped, and ref_count is only
+    updated when the number of references changed.
+
+    Parameters
+    ----------
+    mydb : database
+        Connection to the database.
+    mycursor : cursor
+        Cursor connected to the database.
+    all_ids : dict
+        Dictionary of lists of publications, authors, and affiliations.
+    data : dict
+        Dictionary containing information about current state of the project.
+    eid : string
+        Id of the publication.
+    references : ReferenceList or None
+        Parsed REF response, see ref_parser.parse_references; None if the
+        response has no references.
+    digest : string, optional
+        Hash of the response, see response_hash. The default is None.
+
+    Returns
+    -------
+    all_ids : dict
+        Updated dictionary.
+    data : dict
+        Updated dictionary.
+    rows : dict
+        Number of rows inserted per table, see flush_references.
+
+    """
+    entry = (int(eid[7:]),)
+    mycursor.execute('SELECT total_references, response_hash FROM harvested'
+                     f' WHERE eid={entry[0]}')
+    row = mycursor.fetchall()
+    if len(row) > 0 and digest is not None and row[0][1] == digest:
+        data['unchanged'] += 1
+        return all_ids, data, {'authors': 0, 'additional': 0, 'citations': 0}
+    total = references.total if references is not None else 0
+    if len(row) == 0 or row[0][0] != total:
+        mycursor.execute(
+            f'UPDATE publications SET ref_count={total} WHERE eid={entry[0]}')
+    batch = new_reference_batch()
+    if references is not None:
+        for ele in references.references:
+            all_ids, data = add_record_additional(
+                all_ids, data, batch, ele, entry)
+            data['records_checked'] += 1
+    rows = flush_references(mycursor, batch, SQL)
+    mycursor.execute(HARVESTED_SQL, (entry[0], total, digest))
+    mydb.commit()
+    return all_ids, data, rows
+
+
+def response_hash(response):
+    """Return the SHA-256 of the response body, as hexadecimal."""
+    return sha256(response.content).hexdigest()
+
+
+def fetch_references(eid, headers, budget, results, get=requests.get):
+    """
+    Fetch and parse the reference list of one publication.
+
+    Runs in a worker thread. The message put on the results queue is
+    ('done', eid, references, digest), with references None if the
+    response has none and digest its hash, ('failed', eid, None, None) if
+    the request or parsing failed, or ('paused', eid, None, None) if the
+    budget ran out first.
+
+    Parameters
+    ----------
+    eid : string
+        Id of the publication.
+    headers : dict
+        Request headers with the api key.
+    budget : RateLimit
+        Budget of API calls shared between the workers.
+    results : Queue
+        Queue read by the writer.
+    get : function, optional
+        Function fetching a url, e.g. ResponseStore.get. The default is
+        requests.get.
+
+    """
+    if not budget.acquire():
+        results.put(('paused', eid, None, None))
+        return
+    status, references, digest = 'failed', None, None
     try:
-        result_dict = xmltodict.parse(response.content)['abstracts-retrieval-response']['references']
-    except KeyError:
-        continue
-    mycursor.execute(
-        f'UPDATE publications SET ref_count={int(result_dict["@total-references"])} WHERE eid={entry[0]}')
+        response = get(REF_API.format(eid=eid), headers=headers)
+        if isinstance(response, StoredResponse):
+            budget.release()  # Served from the store, no call spent
+        else:
+            budget.update(response)
+        if response.status_code == 200:
+            references = parse_references(response)
+            digest = response_hash(response)
+            status = 'done'
+        else:
+            print(eid, response)
+    except Exception as error:  # Retried by the next harvest
+        print(eid, repr(error))
+    finally:
+        results.put((status, eid, references, digest))
+
+
+def harvest(eids, headers, budget, handle_references, workers=4,
+            get=requests.get):
+    """
+    Fetch the reference lists of the publications with a bounded pool.
+
+    Up to `workers` REF requests are in flight at the same time. Parsed
+    responses are handed to handle_references in the calling thread in the
+    order they arrive, so only one thread writes to the database. Eids are
+    taken from the iterable only when a request can be started.
+
+    Parameters
+    ----------
+    eids : iterable
+        Ids of the publications.
+    headers : dict
+        Request headers with the api key.
+    budget : RateLimit
+        Budget of API calls shared between the workers.
+    handle_references : function
+        Called as handle_references(eid, references, digest) for every
+        publication whose response was parsed; references is None if it
+        has none, digest is the hash of the response.
+    workers : int, optional
+        Number of requests in flight. The default is 4.
+    get : function, optional
+        Function fetching a url, e.g. ResponseStore.get. The default is
+        requests.get.
+
+    Returns
+    -------
+    stats : dict
+        Number of responses per status ('done', 'failed', 'paused').
+
+    """
+    def process(message):
+        status, eid, references, digest = message
+        stats[status] += 1
+        if status == 'done':
+            handle_references(eid, references, digest)
+    eids = iter(eids)
+    results = Queue()
+    stats = {'done': 0, 'failed': 0, 'paused': 0}
+    in_flight = 0
+    message = None
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            while in_flight < workers and budget.remaining > budget.floor:
+                eid = next(eids, None)
+                if eid is None:
+                    break
+                executor.submit(fetch_references, eid, headers, budget,
+                                results, get)
+                in_flight += 1
+            if in_flight == 0:
+                break
+            try:
+                message = results.get(timeout=1)
+            except Empty:
+                continue
+            in_flight -= 1
+            process(message)
+            message = None
+    except KeyboardInterrupt:
+        budget.halt()
+        executor.shutdown(wait=True)
+        # Write the response that was interrupted and the ones fetched.
+        if message is not None:
+            process(message)
+        while not results.empty():
+            process(results.get())
+        raise
+    executor.shutdown(wait=True)
+    return stats
+
+
+def replay(store=None):
+    """
+    Rebuild the references from the stored REF responses, without network.
+
+    The responses are fed to write_references in the order they were
+    fetched; responses that are not XML are skipped. The records per
+    second make this a deterministic benchmark of the ingestion.
+
+    Parameters
+    ----------
+    store : ResponseStore, optional
+        Store to replay. The default is None (responses.sqlite).
+
+    Returns
+    -------
+    stats : dict
+        Numbers of responses and references, rows inserted per table,
+        seconds, and references per second.
+
+    """
+    if store is None:
+        store = ResponseStore()
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+    data = Checkpoint()
+    for key in ('records_checked', 'newlyadded', 'indatabase', 'resolved',
+                'unchanged'):
+        data[key] = 0
+    create_harvested_table(mycursor)
     mydb.commit()
-    if result_dict['@total-references'] == '1':
-        result_dict['reference'] = [result_dict['reference']]
+    all_ids = collect_ids(mycursor)
+    stats = {'responses': 0, 'records': 0, 'rows': dict()}
+    start = perf_counter()
+    for response in store.pages('abstract'):
+        if not response.url.endswith('view=REF'):
+            continue
+        try:
+            references = parse_references(response)
+        except ParseError:  # Not XML, e.g. an error in JSON
+            print(response.url)
+            continue
+        eid = response.url.split('/eid/')[1].split('?')[0]
+        checked = data['records_checked']
+        all_ids, data, rows = write_references(
+            mydb, mycursor, all_ids, data, eid, references,
+            response_hash(response))
+        for table, n in rows.items():
+            stats['rows'][table] = stats['rows'].get(table, 0) + n
+        stats['records'] += data['records_checked'] - checked
+        stats['responses'] += 1
+        data.save()
+    data.compact()
+    all_ids['authors'].save()
+    all_ids['others'].save()
+    stats['seconds'] = perf_counter() - start
+    stats['records/s'] = stats['records'] / max(stats['seconds'], 1e-9)
+    print(f"Replayed {stats['responses']} responses, {stats['records']} "
+          f"references in {stats['seconds']:.1f} s "
+          f"({stats['records/s']:.0f} references/s)")
+    return stats
+
+
+def main(subfields=SUBFIELDS, workers=4, reserve=RESERVE, refresh=None):
+    """
+    Harvest the reference lists of the publications in the subfields.
+
+    The responses are fetched by a pool of `workers` threads and written
+    one publication per transaction. The quota of the abstract retrieval
+    API is kept in save.json['ref_limit'], 'ref_reset' and 'ref_quota'
+    (see scheduler.Quota), so it is restored after the weekly reset;
+    responses served from the store are not charged. Stopping (also with
+    Ctrl+C) and running again continues with the publications not written
+    yet, see pending_references. Publications harvested before are fetched again
+    only with refresh, and responses that did not change are not written.
+
+    Parameters
+    ----------
+    subfields : tuple, optional
+        Labels of the publications; None for all. The default is SUBFIELDS.
+    workers : int, optional
+        Number of REF requests in flight. The default is 4.
+    reserve : int, optional
+        Number of calls of the quota to leave unused. The default is
+        RESERVE.
+    refresh : int, optional
+        Harvest again the publications harvested more than this many days
+        ago. The default is None.
+
+    Returns
+    -------
+    stats : dict
+        Number of responses per status, see harvest, and of rows inserted
+        per table ('rows').
+
+    """
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    headers = requests.utils.default_headers()
+    data = load(open('headers.json'))
+    for head in data:
+        headers[head] = data[head]
+    data = Checkpoint()
+    data['records_checked'] = 0
+    data['newlyadded'] = 0
+    data['indatabase'] = 0
+    data['resolved'] = 0
+    data['unchanged'] = 0
+    mycursor = mydb.cursor()
+    create_harvested_table(mycursor)
+    mydb.commit()
+    all_ids = collect_ids(mycursor)
+    eids = pending_references(mycursor, subfields, refresh)
+    store = ResponseStore()
+    quota = Quota.from_data(data, 'ref_', REF_QUOTA)
+    budget = RateLimit(quota.available(), floor=reserve)
+
+    rows = {'authors': 0, 'additional': 0, 'citations': 0}
+
+    def handle_references(eid, references, digest):
+        nonlocal all_ids, data
+        all_ids, data, written = write_references(
+            mydb, mycursor, all_ids, data, eid, references, digest)
+        for table, n in written.items():
+            rows[table] += n
+        budget.settle(quota)
+        quota.save(data, 'ref_')
+        data.save()
     try:
-        for ele in result_dict['reference']:
-            all_ids, data = add_record_additional(
-                mydb, mycursor, all_ids, data, ele, entry, sql)
-            data['records_checked'] += 1
-    except Exception:
-        with open('save.json', 'w', encoding='utf8') as json_file:
-            dump(data, json_file, ensure_ascii=False)
-        foo = mycursor.fetchall()  # Collect records to avoid raising errors
-        for ele in result_dict['reference']:
-            all_ids, data = add_record_additional(
-                mydb, mycursor, all_ids, data, ele, entry, sql)
-        break
-with open('save.json', 'w', encoding='utf8') as json_file:
-    dump(data, json_file, ensure_ascii=False)
+        stats = harvest(eids, headers, budget, handle_references,
+                        workers=workers, get=store.get)
+    finally:
+        budget.settle(quota)
+        quota.save(data, 'ref_')
+        data.compact()
+        all_ids['authors'].save()
+        all_ids['others'].save()
+        all_ids['next_author'].close()
+        store.close()
+    print(f"{stats['done']} of {len(eids)} publications harvested, "
+          f"{data['newlyadded']} new and {data['indatabase']} known references"
+          f", {data['resolved']} matched to publications by doi or title, "
+          f"{data['unchanged']} responses unchanged")
+    print(', '.join(f'{n} rows into {table}' for table, n in rows.items()))
+    stats['rows'] = rows
+    return stats
+
+
+if __name__ == '__main__':
+    main()
@@ -8,41 +8,251 @@ Created on Wed Jun 28 17:09:27 2023
 
 import mysql.connector
 import requests
-from json import load, dump, JSONDecodeError
-from unidecode import unidecode
-from html import unescape
+from json import load, JSONDecodeError
 from random import shuffle
 import xmltodict
+import pandas as pd
 from mysql.connector.errors import DataError
+from response_store import ResponseStore
+from normalization import normalize, normalize_many
+from author_ids import AuthorIds
+from ref_cache import RefCache
 
+CLEANUP_CHUNK = 10000  # Rows updated per transaction by the cleanups
 
-def remove_duplicate_references():
+
+def create_citations_table(mycursor):
+    """
+    Create the table of citation edges if it does not exist yet.
+
+    Each row is one edge from the citing to the cited publication. Either
+    id can belong to the publications or the additional table. The source
+    tells how the edge was found: 'search' (refeid search or the cites
+    string of publications), 'ref' (reference list from view=REF or the
+    referenced_by string of additional) or 'merge' (moved by merge_records).
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+
+    """
+    mycursor.execute('CREATE TABLE IF NOT EXISTS citations ('
+                     'citing_id BIGINT NOT NULL, '
+                     'cited_id BIGINT NOT NULL, '
+                     'source VARCHAR(8) NOT NULL DEFAULT "", '
+                     'PRIMARY KEY (citing_id, cited_id), '
+                     'KEY cited_id (cited_id))')
+
+
+def migrate_citation_strings(chunk=50000):
+    """
+    Copy the edges in the cites and referenced_by strings to the citations table.
+
+    Safe to run more than once: existing edges are ignored. Ids that are
+    not numbers are skipped and counted.
+
+    Parameters
+    ----------
+    chunk : int, optional
+        Number of edges inserted per transaction. The default is 50000.
+
+    """
     db_data = load(open('mydb_setup.json'))
     mydb = mysql.connector.connect(**db_data)
     mycursor = mydb.cursor()
-    mycursor.execute('SELECT eid, cites FROM publications')
-    data = mycursor.fetchall()
-    data_gen = (x for x in data)
-    del data, db_data
-    for row in data_gen:
-        cites = ','.join(set(row[1].split(',')))
-        if cites != row[1]:
-            mycursor.execute(f'UPDATE publications SET cites="{cites}" WHERE eid={row[0]}')
-            mydb.commit()
-            print(f'Updated {row[0]}')
+    create_citations_table(mycursor)
+    sql = ('INSERT IGNORE INTO citations (citing_id, cited_id, source)'
+           ' VALUES (%s, %s, %s)')
+    edges, skipped, total = [], 0, 0
+    queries = (('SELECT eid, cites FROM publications', 'search'),
+               ('SELECT id, referenced_by FROM additional', 'ref'))
+    for query, source in queries:
+        mycursor.execute(query)
+        rows = mycursor.fetchall()
+        for row in rows:
+            if row[1] is None or row[1] == '':
+                continue
+            for ref in row[1].split(','):
+                ref = ref.strip()
+                if not ref.isdigit():
+                    skipped += 1
+                    continue
+                if source == 'search':  # Publication cites ref.
+                    edges.append((row[0], int(ref), source))
+                else:  # Ref cites the publication in the additional table.
+                    edges.append((int(ref), row[0], source))
+                if len(edges) >= chunk:
+                    mycursor.executemany(sql, edges)
+                    mydb.commit()
+                    total += len(edges)
+                    edges = []
+        del rows
+    if len(edges) > 0:
+        mycursor.executemany(sql, edges)
+        mydb.commit()
+        total += len(edges)
+    print(f'Migrated {total} edges, skipped {skipped} ids')
+
 
+def refresh_citation_strings():
+    """
+    Rebuild the cites and referenced_by strings from the citations table.
 
-def strip_references():
+    The strings are kept only as a derived view for exports (csv files).
+    The cites string of a publication lists the cited publications, the
+    referenced_by string of a record in the additional table lists the
+    publications that cite it.
+    """
     db_data = load(open('mydb_setup.json'))
     mydb = mysql.connector.connect(**db_data)
     mycursor = mydb.cursor()
-    mycursor.execute('SELECT eid, cites FROM publications WHERE cites LIKE "0%"')
-    data = mycursor.fetchall()
-    for row in data:
-        refs = row[1].split(',')
-        refs = [eid.lstrip('0') for eid in refs]
-        mycursor.execute(f'UPDATE publications SET cites="{",".join(refs)}" WHERE eid={row[0]}')
+    mycursor.execute('SET SESSION group_concat_max_len = 1000000')
+    mycursor.execute(
+        'UPDATE publications p LEFT JOIN (SELECT c.citing_id, '
+        'GROUP_CONCAT(c.cited_id) AS cites FROM citations c JOIN publications q '
+        'ON q.eid = c.cited_id GROUP BY c.citing_id) e ON e.citing_id = p.eid '
+        'SET p.cites = COALESCE(e.cites, "")')
+    mycursor.execute(
+        'UPDATE additional a LEFT JOIN (SELECT cited_id, '
+        'GROUP_CONCAT(citing_id) AS refs FROM citations GROUP BY cited_id) e '
+        'ON e.cited_id = a.id SET a.referenced_by = COALESCE(e.refs, "")')
+    mydb.commit()
+
+
+# The cleanups of the cites strings below are for databases whose edges are
+# not in the citations table yet: run them before migrate_citation_strings.
+# Afterwards the strings are rebuilt from the citations table by
+# refresh_citation_strings, whose edges have no duplicates (primary key)
+# or leading zeros (BIGINT ids), so there is nothing left to clean.
+
+
+def cites_frame(mycursor, condition=''):
+    """Return the eid and cites string of the publications as a DataFrame."""
+    mycursor.execute(f'SELECT eid, cites FROM publications{condition}')
+    frame = pd.DataFrame(mycursor.fetchall(), columns=['eid', 'cites'])
+    frame['cites'] = frame['cites'].fillna('')
+    return frame
+
+
+def rewrite_cites(frame, rewrite):
+    """
+    Rewrite the cites strings in one pass over all of their ids.
+
+    Parameters
+    ----------
+    frame : DataFrame
+        Columns eid and cites, see cites_frame.
+    rewrite : function
+        Takes the Series of all cited ids (as strings) indexed by the eid
+        citing them, in the order of the strings, and returns it rewritten.
+
+    Returns
+    -------
+    changes : DataFrame
+        Columns eid, cites and new of the rows whose string changed.
+
+    """
+    refs = frame.set_index('eid')['cites'].str.split(',').explode()
+    new = rewrite(refs).groupby(level=0, sort=False).agg(','.join)
+    changes = frame.assign(new=new.reindex(frame['eid']).fillna('').to_numpy())
+    return changes[changes['cites'] != changes['new']]
+
+
+def report_changes(changes, sample=5):
+    """Print the number of rows to update and a few of the changes."""
+    print(f'{len(changes)} cites strings to update')
+    for eid, old, new in changes.head(sample).itertuples(index=False):
+        print(f'{eid}: {old} -> {new}')
+
+
+def write_cites(mydb, mycursor, changes, chunk=CLEANUP_CHUNK):
+    """
+    Write the new cites strings with one joined UPDATE per chunk of rows.
+
+    The new values of every chunk go to a temporary table, which is joined
+    with the publications, in one transaction per chunk.
+    """
+    mycursor.execute('CREATE TEMPORARY TABLE IF NOT EXISTS cleanup ('
+                     'eid BIGINT NOT NULL PRIMARY KEY, '
+                     'cites MEDIUMTEXT NOT NULL)')
+    rows = list(zip(changes['eid'].astype(int).tolist(),
+                    changes['new'].tolist()))
+    for i in range(0, len(rows), chunk):
+        mycursor.executemany('INSERT INTO cleanup (eid, cites) VALUES (%s, %s)',
+                             rows[i:i + chunk])
+        mycursor.execute('UPDATE publications p JOIN cleanup c ON c.eid = p.eid'
+                         ' SET p.cites = c.cites')
+        mycursor.execute('DELETE FROM cleanup')
         mydb.commit()
+    mycursor.execute('DROP TEMPORARY TABLE cleanup')
+
+
+def remove_duplicate_references(dry_run=False, chunk=CLEANUP_CHUNK):
+    """
+    Remove the repeated ids from the cites strings, keeping the first one.
+
+    Only for cites strings not yet migrated to the citations table, see
+    the note above cites_frame.
+
+    Parameters
+    ----------
+    dry_run : bool, optional
+        Only report the changes. The default is False.
+    chunk : int, optional
+        Number of rows updated per transaction. The default is
+        CLEANUP_CHUNK.
+
+    Returns
+    -------
+    changes : DataFrame
+        Old and new strings of the changed rows, see rewrite_cites.
+
+    """
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+
+    def first_of_each(refs):
+        return refs[~refs.reset_index().duplicated().to_numpy()]
+    changes = rewrite_cites(cites_frame(mycursor), first_of_each)
+    report_changes(changes)
+    if not dry_run:
+        write_cites(mydb, mycursor, changes, chunk)
+    return changes
+
+
+def strip_references(dry_run=False, chunk=CLEANUP_CHUNK):
+    """
+    Remove the leading zeros of the ids in the cites strings.
+
+    Only for cites strings not yet migrated to the citations table, see
+    the note above cites_frame.
+
+    Parameters
+    ----------
+    dry_run : bool, optional
+        Only report the changes. The default is False.
+    chunk : int, optional
+        Number of rows updated per transaction. The default is
+        CLEANUP_CHUNK.
+
+    Returns
+    -------
+    changes : DataFrame
+        Old and new strings of the changed rows, see rewrite_cites.
+
+    """
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+    frame = cites_frame(
+        mycursor, ' WHERE cites LIKE "0%" OR cites LIKE "%,0%"')
+    changes = rewrite_cites(frame, lambda refs: refs.str.lstrip('0'))
+    report_changes(changes)
+    if not dry_run:
+        write_cites(mydb, mycursor, changes, chunk)
+    return changes
 
 
 def get_smashed_refs():
@@ -122,98 +332,151 @@ def get_ids_to_correct(table):
     f.close()
 
 
-def correct_reference(mydb, mycursor, scopus_id, author_set):
-    scopus_id = int(scopus_id)
-    data = load(open('save.json'))
-    data_updated = False
-    mycursor.execute(f'SELECT authors, referenced_by FROM additional WHERE id={scopus_id}')
-    row = mycursor.fetchall()[0]
-    citing = row[1].split(',')
-    eid = f'2-s2.0-{int(citing[0])}'
-    # Connect to SCOPUS
-    headers = requests.utils.default_headers()
-    data_head = load(open('headers.json'))
-    for head in data_head:
-        headers[head] = data_head[head]
-    api = 'https://api.elsevier.com/content/abstract/eid/{eid}?view=REF'
-    response = requests.get(api.format(eid=eid), headers=headers)
-    try:
-        result_dict = xmltodict.parse(response.content)['abstracts-retrieval-response']['references']
-    except KeyError:
-        return author_set
-    if result_dict['@total-references'] == '1':
-        result_dict['reference'] = [result_dict['reference']]
-    r_list = result_dict['reference']
-    ids = [int(ele['scopus-id']) for ele in r_list]
-    try:
-        i = ids.index(scopus_id)
-    except ValueError:
-        print('Reference not found')
-        return author_set
-    a_list = r_list[i]['author-list']
-    if a_list is None:
-        print('No authors')
-        return author_set
-    else:
-        a_list = a_list['author']
-    try:
-        author_string = ','.join([a['@auid'] for a in a_list])
-    except TypeError:
-        if type(a_list) is dict:
-            author_string = a_list['@auid']
-            a_list = [a_list]
-        else:
-            print(a_list)
-            raise Exception('TypeError')
-    except KeyError:
-        for a in a_list:
-            if '@auid' not in a:
-                a['@auid'] = str(data['auth_my'])
-                data['auth_my'] += 1
-        data_updated = True
-        author_string = ','.join([a['@auid'] for a in a_list])
-    values_to_insert = []
-    for author_info in a_list:
-        authid = int(author_info['@auid'])
-        if (authid,) not in author_set:
-            author_set.add((int(authid),))
-            if ('affiliation' in author_info and author_info['affiliation'] is not None and '@id' in author_info['affiliation']):
-                afid = author_info['affiliation']['@id']
-            else:
-                afid = ''
-            if 'author-url' in author_info:
-                url = author_info['author-url']
-            else:
-                url = ''
-            if 'ce:given-name' in author_info:
-                first_name = author_info['ce:given-name']
-            else:
-                first_name = ''
-            if 'ce:initials' in author_info:
-                initials = author_info['ce:initials']
-            else:
-                initials = ''
-            values_to_insert.append(
-                (authid, author_info['ce:indexed-name'],
-                 author_info['ce:surname'], first_name, initials, afid, url))
-    if len(values_to_insert) > 0:
-        mycursor.executemany(
-            'INSERT INTO authors (id, authname, surname, given_name, initials, afids, url) VALUES (%s, %s, %s, %s, %s, %s, %s)',
-            values_to_insert)
-        mydb.commit()
-    if set(row[0].split(',')) != set(author_string.split(',')):
+def reference_sources(mycursor, ids, chunk=1000):
+    """
+    Choose the citing publication whose REF document corrects every id.
+
+    Every id is assigned to the publication citing it that cites the most
+    of the ids, so the ids are covered by few documents.
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+    ids : list
+        Ids of the records in the additional table.
+    chunk : int, optional
+        Number of ids per query. The default is 1000.
+
+    Returns
+    -------
+    groups : dict
+        Ids to correct per eid of the citing publication.
+
+    """
+    citing = dict()  # cited id: list of citing ids
+    for i in range(0, len(ids), chunk):
+        part = ', '.join(str(x) for x in ids[i:i + chunk])
+        mycursor.execute('SELECT cited_id, citing_id FROM citations'
+                         f' WHERE cited_id IN ({part})')
+        for cited_id, citing_id in mycursor.fetchall():
+            citing.setdefault(int(cited_id), []).append(int(citing_id))
+    counts = dict()
+    for sources in citing.values():
+        for citing_id in sources:
+            counts[citing_id] = counts.get(citing_id, 0) + 1
+    groups = dict()
+    for cited_id, sources in citing.items():
+        best = min(sources, key=lambda x: (-counts[x], x))
+        groups.setdefault(f'2-s2.0-{best}', []).append(cited_id)
+    return groups
+
+
+def correct_references(mydb, mycursor, ids, author_set, refs=None,
+                       author_ids=None):
+    """
+    Correct the authors of references from the REF documents citing them.
+
+    The ids are grouped by the citing publication whose REF document is
+    used (see reference_sources), every document is fetched and parsed
+    once (see RefCache), and the fixes from one document are written with
+    one insert and one update.
+
+    Parameters
+    ----------
+    mydb : database
+        Connection to the database.
+    mycursor : cursor
+        Cursor connected to the database.
+    ids : list
+        Ids of the records in the additional table.
+    author_set : set
+        Tuples (id,) of the authors in the database; new ones are added.
+    refs : RefCache, optional
+        Cache of the REF documents. The default is None (a new one).
+    author_ids : AuthorIds, optional
+        Ids for authors without a SCOPUS id. The default is None (leased
+        when needed).
+
+    Returns
+    -------
+    author_set : set
+        Updated set.
+
+    """
+    ids = [int(x) for x in ids]
+    current = dict()  # id: author string in the database
+    for i in range(0, len(ids), 1000):
+        part = ', '.join(str(x) for x in ids[i:i + 1000])
+        mycursor.execute(f'SELECT id, authors FROM additional WHERE id IN ({part})')
+        current.update(mycursor.fetchall())
+    groups = reference_sources(mycursor, list(current))
+    grouped = {x for group in groups.values() for x in group}
+    for scopus_id in current:
+        if scopus_id not in grouped:
+            print(f'No citing articles: {scopus_id}')
+    if refs is None:
+        refs = RefCache()
+    for eid, group in groups.items():
+        references = refs.get(eid)
+        if references is None:
+            continue
+        values_to_insert = []
+        updates = []
+        for scopus_id in group:
+            found = references.get(scopus_id)
+            if found is None:
+                print(f'Reference not found: {scopus_id}')
+                continue
+            if len(found.authors) == 0:
+                print(f'No authors: {scopus_id}')
+                continue
+            authids = []
+            for author in found.authors:
+                if author.auid == '':
+                    if author_ids is None:
+                        author_ids = AuthorIds()
+                    authid = next(author_ids)
+                else:
+                    authid = int(author.auid)
+                authids.append(str(authid))
+                if (authid,) not in author_set:
+                    author_set.add((authid,))
+                    values_to_insert.append(
+                        (authid, author.indexed_name, author.surname,
+                         author.given_name, author.initials, author.afid,
+                         author.url))
+            if set(current[scopus_id].split(',')) != set(authids):
+                updates.append((','.join(authids), scopus_id))
+        if len(values_to_insert) > 0:
+            mycursor.executemany(
+                'INSERT INTO authors (id, authname, surname, given_name, initials, afids, url) VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                values_to_insert)
+        sql = 'UPDATE additional SET authors=%s WHERE id=%s'
         try:
-            mycursor.execute(f'UPDATE additional SET authors="{author_string}" WHERE id={scopus_id}')
-            mydb.commit()
-        except DataError:
-            print(f'Author string too long: {scopus_id}')
-    if data_updated:
-        with open('save.json', 'w', encoding='utf8') as json_file:
-            dump(data, json_file, ensure_ascii=False)
+            mycursor.executemany(sql, updates)
+        except DataError:  # Find the ones that are too long
+            for update in updates:
+                try:
+                    mycursor.execute(sql, update)
+                except DataError:
+                    print(f'Author string too long: {update[1]}')
+        mydb.commit()
+        print(f'Corrected {len(updates)} of {len(group)} references from {eid}')
     return author_set
 
 
-def correct_record(mydb, mycursor, scopus_id, author_set, table='publications'):
+def correct_reference(mydb, mycursor, scopus_id, author_set, store=None,
+                      author_ids=None, refs=None):
+    """Correct the authors of one reference, see correct_references."""
+    if refs is None:
+        refs = RefCache(store)
+    return correct_references(mydb, mycursor, [scopus_id], author_set,
+                              refs=refs, author_ids=author_ids)
+
+
+def correct_record(mydb, mycursor, scopus_id, author_set, table='publications',
+                  store=None):
     # Connect to SCOPUS
     headers = requests.utils.default_headers()
     data = load(open('headers.json'))
@@ -221,7 +484,9 @@ def correct_record(mydb, mycursor, scopus_id, author_set, table='publications'):
         headers[head] = data[head]
     eid = f'2-s2.0-{scopus_id}'
     api = 'https://api.elsevier.com/content/abstract/eid/{eid}?view=META_ABS'
-    response = requests.get(api.format(eid=eid), headers=headers)
+    if store is None:
+        store = ResponseStore()
+    response = store.get(api.format(eid=eid), headers=headers)
     try:
         a_list = xmltodict.parse(response.content)['abstracts-retrieval-response']['authors']
         if a_list is None:
@@ -297,41 +562,42 @@ def correct_from_file():
     mycursor = mydb.cursor()
     mycursor.execute('SELECT id FROM authors')
     author_set = set(mycursor.fetchall())
+    author_ids = AuthorIds()
     f = open('to_correct_a.txt', 'r')  # Check the file name
     file = f.readlines()
     ids = file[0].split(', ')
     ids.pop(-1)  # Remove End Of File string
-    shuffle(ids)
-    for eid in ids:
-        # author_set = correct_record(mydb, mycursor, eid, author_set, table='additional')  # Check table name
-        author_set = correct_reference(mydb, mycursor, eid, author_set)
-        print(f'Corrected {eid}')
+    refs = RefCache()
+    # for eid in ids:
+    #     author_set = correct_record(mydb, mycursor, eid, author_set, table='additional', store=refs.store)  # Check table name
+    author_set = correct_references(mydb, mycursor, ids, author_set,
+                                    refs=refs, author_ids=author_ids)
+    print(f'{refs.misses} REF documents read, {refs.hits} cache hits')
 
 
 def remove_faulty_edges(eid):
-    eid = str(eid)
+    """
+    Remove all references of the given publication to the additional table.
+
+    Records of the additional table that no other publication cites are
+    deleted as well.
+
+    Parameters
+    ----------
+    eid : int
+        Id of the publication with the faulty reference list.
+
+    """
     db_data = load(open('mydb_setup.json'))
     mydb = mysql.connector.connect(**db_data)
     mycursor = mydb.cursor()
-    conditions = [f'referenced_by LIKE "%,{eid},%"',
-                  f'referenced_by LIKE "%,{eid}"',
-                  f'referenced_by LIKE "{eid},%"']
-    mycursor.execute(f'DELETE FROM additional WHERE referenced_by="{eid}"')
+    mycursor.execute(
+        f'DELETE c FROM citations c JOIN additional a ON a.id = c.cited_id '
+        f'WHERE c.citing_id={int(eid)}')
+    mycursor.execute(
+        'DELETE a FROM additional a LEFT JOIN citations c ON c.cited_id = a.id '
+        'WHERE c.cited_id IS NULL')
     mydb.commit()
-    for i in range(3):
-        mycursor.execute(
-            f'SELECT id, referenced_by FROM additional WHERE {conditions[i]}')
-        records = mycursor.fetchall()
-        for rec in records:
-            if i == 0:
-                updated_str = rec[1].replace(f',{eid},', ',')
-            elif i == 1:
-                updated_str = rec[1][:-(len(eid)+1)]
-            else:
-                updated_str = rec[1][(len(eid)+1):]
-            mycursor.execute(
-                f'UPDATE additional SET referenced_by="{updated_str}" WHERE id={rec[0]}')
-            mydb.commit()
 
 
 def relabel_indatabase(old, new):
@@ -387,25 +653,6 @@ def rename_dict(labels):
     return renamed
 
 
-def normalize(text):
-    """Return string in lower case and with non-standard letters removed."""
-    norm = text.casefold()
-    norm = norm.replace('&amp;', '&')  # Replace HTML entity '&amp;' with '&'
-    norm = unescape(norm)
-    norm = unidecode(norm, 'ignore')
-    norm = norm.replace('.-', '.')  # For normalizing initials
-    replacements = {
-        ('/', ''), ('?', ''), ('&', ''), ('-', ' '), ('"', ''), ("'", ""),
-        ('!', ''), ('@', ''), ('#', ''), ('$', ''), ('^', ''), ('\\', ' '),
-        ('*', ''), ('=', ''), ('`', ''), (':', ''), (';', ''), ('|', ''),
-        ('~', ''), ('±', ''), ('{', ''), ('}', ''), ('[', ' '), (']', ''),
-        ('   ', ' '), ('  ', ' ')
-    }
-    for old, new in replacements:
-        norm = norm.replace(old, new)
-    return norm
-
-
 def merge_records(mydb, mycursor, idp, ida):
     """
     Merge two identical records if their authors match.
@@ -435,11 +682,10 @@ def merge_records(mydb, mycursor, idp, ida):
     info_idp = {
         'author_string': res[0],
         'author_count': res[1]}
-    mycursor.execute(f'SELECT authors, referenced_by FROM additional WHERE id={ida}')
+    mycursor.execute(f'SELECT authors FROM additional WHERE id={ida}')
     res = mycursor.fetchall()[0]
     info_ida = {
-        'author_string': res[0],
-        'citing_articles': res[1]}
+        'author_string': res[0]}
     info_idp.update({'authors': dict()})
     info_ida.update({'authors': dict()})
     ids_idp = set(info_idp['author_string'].split(','))
@@ -491,18 +737,11 @@ def merge_records(mydb, mycursor, idp, ida):
             for ala in aliases:
                 mycursor.execute(f'UPDATE authors SET aka="{",".join(aliases[ala])}" WHERE id={ala}')
             mydb.commit()
-    # Update the reference lists of articles that cite the duplicated record.
-    for ref in info_ida['citing_articles'].split(','):
-        mycursor.execute(f'SELECT cites FROM publications WHERE eid={ref}')
-        referenced_articles = str(mycursor.fetchall()[0][0])
-        if str(idp) in referenced_articles.split(','):
-            continue
-        elif referenced_articles.split(',')[0] == '':
-            referenced_articles = str(idp)
-        else:
-            referenced_articles = f'{referenced_articles},{idp}'
-        mycursor.execute(f'UPDATE publications SET cites="{referenced_articles}" WHERE eid={ref}')
-        mydb.commit()
+    # Move the citations of the duplicated record to the kept record.
+    mycursor.execute(
+        f'INSERT IGNORE INTO citations (citing_id, cited_id, source) '
+        f'SELECT citing_id, {idp}, "merge" FROM citations WHERE cited_id={ida}')
+    mycursor.execute(f'DELETE FROM citations WHERE cited_id={ida}')
     # Remove the other record.
     mycursor.execute(f'DELETE FROM additional WHERE id={ida}')
     mydb.commit()
@@ -556,11 +795,13 @@ def merge_matching_title():
     mycursor.execute('SELECT title, date, source, eid FROM publications')
     info_publications = mycursor.fetchall()
     publication_titles, other_titles = dict(), dict()
-    for ele in info_other:
-        other_titles[normalize(ele[0])] = {
+    norms = normalize_many([ele[0] for ele in info_other])
+    for norm, ele in zip(norms, info_other):
+        other_titles[norm] = {
             'date': str(ele[1]), 'source': ele[2], 'id': ele[3], 'doi': ele[4]}
-    for ele in info_publications:
-        publication_titles[normalize(ele[0])] = {
+    norms = normalize_many([ele[0] for ele in info_publications])
+    for norm, ele in zip(norms, info_publications):
+        publication_titles[norm] = {
             'date': str(ele[1]), 'source': ele[2], 'eid': ele[3]}
     overlap = list(set(
         publication_titles.keys()).intersection(set(other_titles.keys())))
@@ -589,21 +830,20 @@ def count_incomplete_title_matches():
     info_other = mycursor.fetchall()
     mycursor.execute('SELECT title, date FROM publications')
     info_publications = mycursor.fetchall()
-    publication_titles, other_titles = dict(), dict()
-    other_titles = set(normalize(ele[0]) for ele in info_other if ele[0] is not None)
-    publication_titles = set(normalize(ele[0]) for ele in info_publications)
+    norms_other = normalize_many([ele[0] for ele in info_other])
+    norms_publications = normalize_many([ele[0] for ele in info_publications])
+    other_titles = set(norm for norm in norms_other if norm is not None)
+    publication_titles = set(norms_publications)
     overlap = publication_titles.intersection(other_titles)
     titles_and_dates = dict()
-    for ele in info_other:
-        if ele[0] is not None:
-            title = normalize(ele[0])
+    for title, ele in zip(norms_other, info_other):
+        if title is not None:
             if title in overlap:
                 if title in titles_and_dates:
                     titles_and_dates[title]['o'].add(str(ele[1])[:4])
                 else:
                     titles_and_dates[title] = {'o': {str(ele[1])[:4]}, 'p': set()}
-    for ele in info_publications:
-        title = normalize(ele[0])
+    for title, ele in zip(norms_publications, info_publications):
         if title in overlap:
             titles_and_dates[title]['p'].add(str(ele[1])[:4])
     # repeated_titles = set(x for x in titles_and_dates if len(titles_and_dates[x]['o']) + len(titles_and_dates[x]['p']) > 2)
@@ -1074,6 +1314,7 @@ def fill_missing(table, match_type):
     mycursor = mydb.cursor()
     mycursor.execute('SELECT id FROM authors')
     author_set = set(mycursor.fetchall())
+    author_ids = AuthorIds()
     records = get_record_generator(mydb, mycursor, table, match_type)
     for row in records:
         # Get metadata.
@@ -1108,13 +1349,11 @@ def fill_missing(table, match_type):
         string = get_update_string(metadata, row, match_type)
         # Check if need to update authors.
         if row[4] == '' and len(metadata['authors']) != 0:
-            data = load(open('save.json'))
             authors, values_to_insert = [], []
             gen_list = (a for a in metadata['authors'])
             for author in gen_list:
                 author_info = metadata['authors'][author]
-                authid = data['auth_my']
-                data['auth_my'] += 1
+                authid = next(author_ids)
                 authors.append(str(authid))
                 values_to_insert.append(
                     (authid, author, author_info['surname'],
@@ -1124,8 +1363,6 @@ def fill_missing(table, match_type):
                                      ' surname, given_name, initials) VALUES '
                                      '(%s, %s, %s, %s, %s)', values_to_insert)
                 mydb.commit()
-                with open('save.json', 'w', encoding='utf8') as json_file:
-                    dump(data, json_file, ensure_ascii=False)
                 authors = ','.join(authors)
                 if string != '':
                     string = f'{string}, authors="{authors}"'
@@ -1147,6 +1384,7 @@ def fill_missing_check(table, match_type):
     mycursor = mydb.cursor()
     mycursor.execute('SELECT id FROM authors')
     author_set = set(mycursor.fetchall())
+    author_ids = AuthorIds()
     if match_type == 'doi':
         if table == 'additional':
             mycursor.execute('SELECT title, doi, date, citedby, authors, '
@@ -1204,13 +1442,11 @@ def fill_missing_check(table, match_type):
         string = get_update_string(metadata, row, match_type)
         # Check if need to update authors.
         if row[4] == '' and len(metadata['authors']) != 0:
-            data = load(open('save.json'))
             authors, values_to_insert = [], []
             gen_list = (a for a in metadata['authors'])
             for author in gen_list:
                 author_info = metadata['authors'][author]
-                authid = data['auth_my']
-                data['auth_my'] += 1
+                authid = next(author_ids)
                 authors.append(str(authid))
                 values_to_insert.append(
                     (authid, author, author_info['surname'],
@@ -1220,8 +1456,6 @@ def fill_missing_check(table, match_type):
                                      ' surname, given_name, initials) VALUES '
                                      '(%s, %s, %s, %s, %s)', values_to_insert)
                 mydb.commit()
-                with open('save.json', 'w', encoding='utf8') as json_file:
-                    dump(data, json_file, ensure_ascii=False)
                 authors = ','.join(authors)
                 if string != '':
                     string = f'{string}, authors="{authors}"'
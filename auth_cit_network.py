@@ -230,6 +230,10 @@ def get_data(source):
         Each entry contains a list of information about a record.
     others_data : list
         Each entry contains a list of information about a record.
+    authors_data : set
+        Set of author ids.
+    edges : list
+        Each entry contains the ids of the citing and the cited record.
 
     """
     if source == 'database':
@@ -237,21 +241,24 @@ def get_data(source):
         mydb = mysql.connector.connect(**db_data)
         mycursor = mydb.cursor()
         mycursor.execute(
-            'SELECT eid, authors, cites, field FROM publications')
+            'SELECT eid, authors, field FROM publications')
         publications_data = mycursor.fetchall()
         mycursor.execute(
-            'SELECT id, authors, referenced_by FROM additional')
+            'SELECT id, authors FROM additional')
         others_data = mycursor.fetchall()
         mycursor.execute('SELECT id FROM authors')
         authors_data = set(mycursor.fetchall())
+        mycursor.execute('SELECT citing_id, cited_id FROM citations')
+        edges = mycursor.fetchall()
     elif source == 'csv':
         # Change the file paths if needed.
-        publications_data = eval(pd.read_csv('publications.csv', sep=',', usecols=['eid', 'field', 'cites', 'authors']).to_json(orient='values'))
-        others_data = eval(pd.read_csv('additional.csv', sep=',', usecols=['id', 'authors', 'referenced_by']).to_json(orient='values'))
+        publications_data = eval(pd.read_csv('publications.csv', sep=',', usecols=['eid', 'authors', 'field']).to_json(orient='values'))
+        others_data = eval(pd.read_csv('additional.csv', sep=',', usecols=['id', 'authors']).to_json(orient='values'))
         authors_data = set(eval(pd.read_csv('authors.csv', sep=',', usecols=['id']).to_json(orient='values')))
+        edges = eval(pd.read_csv('citations.csv', sep=',', usecols=['citing_id', 'cited_id']).to_json(orient='values'))
     else:
         raise ValueError('argument value not appropriate')
-    return (publications_data, others_data, authors_data)
+    return (publications_data, others_data, authors_data, edges)
 
 
 def get_author_fields(subfields, counts):
@@ -283,20 +290,19 @@ def get_generators_and_net(source):
     def concat(a, b):
         yield from a
         yield from b
-    data_pub, data_add, authors = get_data(source)
+    data_pub, data_add, authors, edges = get_data(source)
     GA = nx.DiGraph()
     GA.add_nodes_from(authors)
     del authors
     print('Authors added')
     work_to_auth = dict()
     chain_works = concat(data_pub, data_add)
-    pub_gen = (x for x in data_pub)
-    add_gen = (x for x in data_add)
-    del data_pub, data_add
+    edge_gen = (x for x in edges)
+    del data_pub, data_add, edges
     print('Generators finished')
     for entry in chain_works:
         work_to_auth[str(entry[0])] = entry[1].split(',')
-    return GA, pub_gen, add_gen, work_to_auth
+    return GA, edge_gen, work_to_auth
 
 
 def author_citation_graph(subfields, source='database'):
@@ -316,64 +322,28 @@ def author_citation_graph(subfields, source='database'):
         Author-citation network.
 
     """
-    GA, pub_gen, add_gen, work_to_auth = get_generators_and_net(source)
+    GA, edge_gen, work_to_auth = get_generators_and_net(source)
     weights = dict()
     counts = dict()
     empty = dict()
     for entry in subfields:
         empty[entry] = 0
-    print('Adding pub')
-    # Add authors from publications table.
-    for entry in pub_gen:
-        # fd = entry[3].split(',')
-        auth = entry[1].split(',')
-        # counts = update_counts(auth, counts, empty, fd)
+    print('Adding edges')
+    # Every author of the citing work cites every author of the cited work.
+    for citing, cited in edge_gen:
         try:
-            cites = set(entry[2].split(','))
-            if cites != {''}:
-                cites = (ele for ele in cites)
-            else:
-                continue
-        except AttributeError:
-            continue
-        for ele in cites:
-            auth_gen = (x for x in work_to_auth[ele])
-            for w in auth_gen:
-                for a in auth:
+            auth = work_to_auth[str(citing)]
+            cited_auth = work_to_auth[str(cited)]
+        except KeyError:
+            continue  # Record no longer in the database.
+        for w in cited_auth:
+            for a in auth:
+                if (a, w) in weights:
+                    weights[(a, w)] = weights[(a, w)] + 1
+                else:
                     GA.add_edge(a, w)
-                    
-                    if (a, w) in weights:
-                        weights[(a, w)] = weights[(a, w)] + 1
-                    else:
-                        GA.add_edge(a, w)
-                        weights[(a, w)] = 1
-                    
-    print('Pub finished')
-    # Add authors from additional table.
-    for entry in add_gen:
-        auth = entry[1].split(',')
-        # counts = update_counts(auth, counts, empty, ['OTHER'])
-        try:
-            citedby = set(entry[2].split(','))
-            if citedby != {''}:
-                citedby = (ele for ele in citedby)
-            else:
-                continue
-        except AttributeError:
-            continue
-        for ele in citedby:
-            auth_gen = (x for x in work_to_auth[ele])
-            for w in auth_gen:
-                for a in auth:
-                    GA.add_edge(w, a)
-                    
-                    if (w, a) in weights:
-                        weights[(w, a)] = weights[(w, a)] + 1
-                    else:
-                        GA.add_edge(w, a)
-                        weights[(w, a)] = 1
-                    
-    print('Add finished')
+                    weights[(a, w)] = 1
+    print('Edges finished')
     subfields.discard('OTHER')
     # Set labels for the nodes.
     fields = get_author_fields(subfields, counts)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Oct 23 10:26:54 2026
+
+Ids for authors without a SCOPUS id, shared by all scripts and processes.
+
+@author: milasiunaite
+"""
+
+import mysql.connector
+from json import load
+from checkpoint import Checkpoint
+
+BLOCK = 10000  # Ids leased from the database at a time
+SEQUENCE = 'author_ids'
+
+
+def create_sequences_table(mycursor):
+    """
+    Create the table of id sequences if it does not exist yet.
+
+    Each row holds the next free id of one sequence. Ids are taken from it
+    in blocks by AuthorIds.
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+
+    """
+    mycursor.execute('CREATE TABLE IF NOT EXISTS sequences ('
+                     'name VARCHAR(32) NOT NULL PRIMARY KEY, '
+                     'next_id BIGINT NOT NULL)')
+
+
+class AuthorIds:
+    """
+    Allocator of ids for authors without a SCOPUS id.
+
+    Ids are leased from the 'author_ids' row of the sequences table in
+    blocks of consecutive ids, by one UPDATE that moves the next free id
+    past the block. The row lock makes the lease atomic, so scripts and
+    processes running at the same time get disjoint blocks. Ids are then
+    handed out from memory; the unused rest of a block is skipped when the
+    allocator is dropped.
+
+    The lease uses its own connection, so it never commits the pending
+    writes of the caller. The sequence starts at save.json['auth_my'],
+    the counter used before.
+
+    Parameters
+    ----------
+    block : int, optional
+        Number of ids leased at a time. The default is BLOCK.
+    db_data : dict, optional
+        Connection settings. The default is None (mydb_setup.json).
+
+    """
+
+    def __init__(self, block=BLOCK, db_data=None):
+        if db_data is None:
+            db_data = load(open('mydb_setup.json'))
+        self.block = block
+        self.mydb = mysql.connector.connect(**db_data)
+        self.mycursor = self.mydb.cursor()
+        create_sequences_table(self.mycursor)
+        self.mycursor.execute(f'SELECT next_id FROM sequences WHERE name="{SEQUENCE}"')
+        if len(self.mycursor.fetchall()) == 0:
+            data = Checkpoint()
+            self.mycursor.execute(
+                'INSERT IGNORE INTO sequences (name, next_id) VALUES (%s, %s)',
+                (SEQUENCE, data.get('auth_my', 1)))
+            self.mydb.commit()
+        self._next = 0
+        self._end = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """Return an unused id."""
+        if self._next == self._end:
+            self.lease()
+        authid = self._next
+        self._next += 1
+        return authid
+
+    def lease(self):
+        """Take the next block of ids from the sequence."""
+        self.mycursor.execute(
+            'UPDATE sequences SET next_id = LAST_INSERT_ID(next_id + %s)'
+            ' WHERE name = %s', (self.block, SEQUENCE))
+        self.mycursor.execute('SELECT LAST_INSERT_ID()')
+        self._end = int(self.mycursor.fetchall()[0][0])
+        self.mydb.commit()
+        self._next = self._end - self.block
+
+    def close(self):
+        """Close the connection; the rest of the block is not used."""
+        self.mydb.close()
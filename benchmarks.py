@@ -0,0 +1,575 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 11:40:05 2026
+
+Benchmarks of the crawler against the local mock of the Scopus API.
+
+@author: milasiunaite
+"""
+
+import os
+import tracemalloc
+import requests
+import multiprocessing
+from json import dumps
+from resource import getrusage, RUSAGE_SELF
+from time import perf_counter
+from tempfile import TemporaryDirectory
+from html import unescape
+from unidecode import unidecode
+import xmltodict
+import add_from_scopus
+import add_references
+import mock_scopus
+import normalization
+import ref_parser
+import sharded_crawl
+from crawl_queue import CrawlQueue
+from response_store import ResponseStore
+from scheduler import RESERVE
+
+
+def use_mock_api(search_api):
+    """Point the crawler at the given search endpoint."""
+    old = add_from_scopus.SEARCH_API
+    add_from_scopus.SEARCH_API = search_api
+    add_from_scopus.CITING_API = add_from_scopus.CITING_API.replace(
+        old, search_api)
+    add_from_scopus.KEYWORD_API = add_from_scopus.KEYWORD_API.replace(
+        old, search_api)
+    add_references.REF_API = search_api.replace(
+        '/content/search/scopus', '/content/abstract/eid/{eid}?view=REF')
+
+
+def bench_citing_crawler(levels=(1, 2, 4, 8, 16), n_eids=32, pages=5,
+                         latency=0.05):
+    """
+    Report pages per second of the citing-article crawl per concurrency level.
+
+    Parameters
+    ----------
+    levels : tuple, optional
+        Numbers of workers to measure. The default is (1, 2, 4, 8, 16).
+    n_eids : int, optional
+        Number of queued eids. The default is 32.
+    pages : int, optional
+        Number of result pages per eid. The default is 5.
+    latency : float, optional
+        Response latency of the mock server in seconds. The default is 0.05.
+
+    Returns
+    -------
+    results : dict
+        Pages per second for every concurrency level.
+
+    """
+    server, search_api = mock_scopus.start_server(pages=pages, latency=latency)
+    use_mock_api(search_api)
+    results = dict()
+    try:
+        for workers in levels:
+            queue = CrawlQueue(':memory:')
+            for i in range(n_eids):
+                queue.push(f'2-s2.0-{i}')
+            budget = add_from_scopus.RateLimit(10**6)
+            fetched = [0]
+
+            def handle_page(eid, entries):
+                fetched[0] += 1
+            start = perf_counter()
+            add_from_scopus.crawl_citing_concurrent(
+                queue, {}, budget, handle_page, workers=workers)
+            elapsed = perf_counter() - start
+            results[workers] = fetched[0] / elapsed
+            print(f'{workers:>3} workers: {fetched[0]} pages in '
+                  f'{elapsed:.2f} s, {results[workers]:.1f} pages/s')
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_references(levels=(1, 4, 16), n_eids=64, references=50,
+                     latency=0.05):
+    """
+    Report responses per second of the reference harvest per pool size.
+
+    The responses are fetched and parsed; the writer does nothing, so this
+    measures how far the pool hides the latency of the API.
+
+    Parameters
+    ----------
+    levels : tuple, optional
+        Numbers of requests in flight to measure. The default is (1, 4, 16).
+    n_eids : int, optional
+        Number of publications. The default is 64.
+    references : int, optional
+        Number of references per publication. The default is 50.
+    latency : float, optional
+        Response latency of the mock server in seconds. The default is 0.05.
+
+    Returns
+    -------
+    results : dict
+        Responses per second for every pool size.
+
+    """
+    server, search_api = mock_scopus.start_server(
+        latency=latency, references=references)
+    use_mock_api(search_api)
+    results = dict()
+    try:
+        for workers in levels:
+            parsed = [0]
+
+            def handle_references(eid, refs, digest):
+                parsed[0] += len(refs.references)
+            budget = add_from_scopus.RateLimit(10**6)
+            start = perf_counter()
+            stats = add_references.harvest(
+                [f'2-s2.0-{i}' for i in range(n_eids)], {}, budget,
+                handle_references, workers=workers)
+            elapsed = perf_counter() - start
+            results[workers] = stats['done'] / elapsed
+            print(f'{workers:>3} workers: {stats["done"]} responses '
+                  f'({parsed[0]} references) in {elapsed:.2f} s, '
+                  f'{results[workers]:.1f} responses/s')
+    finally:
+        server.shutdown()
+    return results
+
+
+def legacy_normalize(text):
+    """Normalization of titles and author names before the shared module."""
+    norm = text.casefold()
+    norm = norm.replace('&amp;', '&')
+    norm = unescape(norm)
+    norm = unidecode(norm, 'ignore')
+    norm = norm.replace('.-', '.')
+    replacements = [
+        ('/', ''), ('?', ''), ('&', ''), ('-', ' '), ('"', ''), ("'", ""),
+        ('!', ''), ('@', ''), ('#', ''), ('$', ''), ('^', ''), ('\\', ' '),
+        ('*', ''), ('=', ''), ('`', ''), (':', ''), (';', ''), ('|', ''),
+        ('~', ''), ('±', ''), ('{', ''), ('}', ''), ('[', ' '), (']', ''),
+        ('   ', ' '), ('  ', ' ')
+    ]
+    for old, new in replacements:
+        norm = norm.replace(old, new)
+    return norm
+
+
+def legacy_normalize_search(text):
+    """Normalization of keyword text before the shared module."""
+    norm = text.casefold()
+    norm = unidecode(norm, 'ignore')
+    norm = norm.replace('optimis', 'optimiz')
+    return norm.replace('-', ' ')
+
+
+def bench_normalize(texts=None, repeat=3):
+    """
+    Compare the shared normalization with the previous implementations.
+
+    Checks that the outputs are identical and reports the time of a cold
+    pass (empty cache), a warm pass and the batch API.
+
+    Parameters
+    ----------
+    texts : list, optional
+        Titles to normalize. The default is 50000 generated titles, a tenth
+        of them with accents or HTML entities and every one repeated twice.
+    repeat : int, optional
+        Number of passes to time for each implementation. The default is 3.
+
+    Returns
+    -------
+    results : dict
+        Seconds per pass for every implementation.
+
+    """
+    if texts is None:
+        texts = []
+        for i in range(25000):
+            title = f'A Multi-Objective Optimisation: Study {i} of [Swarm] Search'
+            if i % 10 == 0:
+                title = f'Évolution &amp; Métaheuristiques {i} — «Étude»'
+            texts.append(title)
+        texts = texts + texts
+    pairs = [(normalization.normalize, legacy_normalize),
+             (normalization.normalize_search, legacy_normalize_search)]
+    for new, old in pairs:
+        for text in set(texts):
+            if new(text) != old(text):
+                raise ValueError(f'{new.__name__} differs for {text!r}')
+    results = dict()
+
+    def timed(name, function):
+        start = perf_counter()
+        for _ in range(repeat):
+            function()
+        results[name] = (perf_counter() - start) / repeat
+        print(f'{name:>16}: {results[name] * 1000:.1f} ms per pass')
+    timed('legacy', lambda: [legacy_normalize(text) for text in texts])
+    normalization.normalize.cache_clear()
+    timed('cold', lambda: (normalization.normalize.cache_clear(),
+                           [normalization.normalize(text) for text in texts]))
+    timed('warm', lambda: [normalization.normalize(text) for text in texts])
+    normalization.normalize.cache_clear()
+    timed('batch', lambda: (normalization.normalize.cache_clear(),
+                            normalization.normalize_many(texts)))
+    timed('legacy search',
+          lambda: [legacy_normalize_search(text) for text in texts])
+    timed('search', lambda: (normalization.normalize_search.cache_clear(),
+                             [normalization.normalize_search(text)
+                              for text in texts]))
+    return results
+
+
+def fill_store(path='responses.sqlite', keyword='swarm', n_eids=32, pages=5):
+    """
+    Store the search and citing pages of the mock API, for replay().
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the store. The default is 'responses.sqlite'.
+    keyword : string, optional
+        Keyword of the search pages. The default is 'swarm'.
+    n_eids : int, optional
+        Number of eids whose citing pages are stored. The default is 32.
+    pages : int, optional
+        Number of result pages per query. The default is 5.
+
+    """
+    server, search_api = mock_scopus.start_server(pages=pages, latency=0)
+    store = ResponseStore(path)
+    try:
+        url = (search_api + f'?query=TITLE("{keyword}")%20OR%20ABS("{keyword}")'
+               '&cursor={cursor}&view=COMPLETE')
+        citing = add_from_scopus.CITING_API.replace(
+            add_from_scopus.SEARCH_API, search_api)
+        cursor = '*'
+        for _ in range(pages):
+            cursor = store.get(url.format(cursor=cursor)).json()[
+                'search-results']['cursor']['@next']
+        for i in range(n_eids):
+            cursor = '*'
+            for _ in range(pages):
+                cursor = store.get(citing.format(eid=f'2-s2.0-{i}', cursor=cursor)).json()[
+                    'search-results']['cursor']['@next']
+    finally:
+        server.shutdown()
+        store.close()
+
+
+def bench_replay(path='responses.sqlite', batch_size=1000):
+    """
+    Report the ingestion throughput of replaying the stored search pages.
+
+    The pages are written to the database in mydb_setup.json, so run it
+    against an empty copy of the database.
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the store, e.g. filled by fill_store. The default is
+        'responses.sqlite'.
+    batch_size : int, optional
+        Records per commit. The default is 1000.
+
+    Returns
+    -------
+    stats : dict
+        Numbers of pages and records, seconds, and records per second.
+
+    """
+    return add_from_scopus.replay(ResponseStore(path), batch_size=batch_size)
+
+
+def parse_pages(path, stream, results):
+    """Parse the stored pages and put peak memory and timings on results."""
+    store = ResponseStore(path)
+    rss = getrusage(RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    first, fields = [], 0
+    start = perf_counter()
+    for response in store.pages('search'):
+        page_start = perf_counter()
+        page = add_from_scopus.search_results(response, stream)
+        for i, ele in enumerate(page['entry']):
+            if i == 0:
+                first.append(perf_counter() - page_start)
+            fields += len(ele)  # Stands in for add_record
+    elapsed = perf_counter() - start
+    heap = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results.put({'heap': heap, 'rss': getrusage(RUSAGE_SELF).ru_maxrss - rss,
+                 'first': sum(first) / max(len(first), 1), 'total': elapsed})
+
+
+def bench_stream(path=None, n_pages=20, count=200, abstract=2000):
+    """
+    Compare streamed and whole-page parsing of stored search results pages.
+
+    Every mode runs in a new process that reads the pages one at a time and
+    reports the peak of traced Python memory, the growth of the peak RSS,
+    the mean time from the start of a page to its first entry, and the
+    total time.
+
+    Parameters
+    ----------
+    path : string, optional
+        Store whose search pages are parsed. The default is None: store
+        n_pages pages of mock entries in a temporary file.
+    n_pages : int, optional
+        Number of generated pages. The default is 20.
+    count : int, optional
+        Entries per generated page. The default is 200.
+    abstract : int, optional
+        Length of the abstracts of the generated entries. The default is
+        2000.
+
+    Returns
+    -------
+    results : dict
+        Measurements for 'whole' and 'stream'.
+
+    """
+    with TemporaryDirectory() as directory:
+        if path is None:
+            path = os.path.join(directory, 'pages.sqlite')
+            store = ResponseStore(path)
+            for p in range(n_pages):
+                entries = []
+                for i in range(count):
+                    entry = mock_scopus.make_entry(p * count + i)
+                    entry['dc:description'] = 'x' * abstract
+                    entries.append(entry)
+                store.put(f'{add_from_scopus.SEARCH_API}?cursor={p}', dumps(
+                    {'search-results': {
+                        'cursor': {'@current': str(p), '@next': str(p + 1)},
+                        'link': [], 'entry': entries}}).encode('utf8'))
+            store.close()
+        results = dict()
+        context = multiprocessing.get_context('spawn')
+        for name, stream in (('whole', False), ('stream', True)):
+            queue = context.Queue()
+            process = context.Process(target=parse_pages,
+                                      args=(path, stream, queue))
+            process.start()
+            results[name] = queue.get()
+            process.join()
+            print(f"{name:>6}: peak heap {results[name]['heap'] / 2**20:.2f} "
+                  f"MiB, peak RSS +{results[name]['rss'] / 1024:.2f} MiB, "
+                  f"first entry {results[name]['first'] * 1000:.2f} ms, "
+                  f"total {results[name]['total']:.2f} s")
+    return results
+
+
+def parse_ref_responses(path, parser, results):
+    """Parse the stored REF responses and put memory and timings on results."""
+    store = ResponseStore(path)
+    tracemalloc.start()
+    references, authors, elapsed = 0, 0, 0
+    for response in store.pages('abstract'):
+        start = perf_counter()
+        if parser == 'xmltodict':
+            refs = xmltodict.parse(response.content)[
+                'abstracts-retrieval-response']['references']['reference']
+            if isinstance(refs, dict):
+                refs = [refs]
+            for ele in refs:
+                a_list = (ele.get('author-list') or {}).get('author', [])
+                authors += len(a_list) if isinstance(a_list, list) else 1
+        else:
+            refs = ref_parser.parse_references(response).references
+            for ele in refs:
+                authors += len(ele.authors)
+        references += len(refs)
+        elapsed += perf_counter() - start
+    heap = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results.put({'heap': heap, 'total': elapsed, 'references': references,
+                 'authors': authors})
+
+
+def bench_ref_parser(path=None, n_eids=50, references=200):
+    """
+    Compare xmltodict and ref_parser on stored REF responses.
+
+    Every parser runs in a new process that reads the responses one at a
+    time and reports the peak of traced Python memory and the time spent
+    parsing, including a walk over the references and their authors.
+
+    Parameters
+    ----------
+    path : string, optional
+        Store whose abstract responses are parsed. The default is None:
+        store n_eids mock REF responses in a temporary file.
+    n_eids : int, optional
+        Number of generated responses. The default is 50.
+    references : int, optional
+        References per generated response. The default is 200.
+
+    Returns
+    -------
+    results : dict
+        Measurements for 'xmltodict' and 'ref_parser'.
+
+    """
+    with TemporaryDirectory() as directory:
+        if path is None:
+            path = os.path.join(directory, 'refs.sqlite')
+            store = ResponseStore(path)
+            for eid in range(1, n_eids + 1):
+                store.put(add_references.REF_API.format(eid=f'2-s2.0-{eid}'),
+                          mock_scopus.make_references(eid, references).encode('utf8'))
+            store.close()
+        results = dict()
+        context = multiprocessing.get_context('spawn')
+        for parser in ('xmltodict', 'ref_parser'):
+            queue = context.Queue()
+            process = context.Process(target=parse_ref_responses,
+                                      args=(path, parser, queue))
+            process.start()
+            results[parser] = queue.get()
+            process.join()
+            print(f"{parser:>10}: peak heap {results[parser]['heap'] / 2**20:.2f} "
+                  f"MiB, {results[parser]['total']:.2f} s for "
+                  f"{results[parser]['references']} references")
+    return results
+
+
+def bench_profiles(n_pages=40, count=25, latency=0):
+    """
+    Report bytes and seconds per 1k records of every request profile.
+
+    Every profile (see add_from_scopus.PROFILES) crawls the same keyword
+    query of the mock server, with and without gzip. The bytes are those
+    of the response bodies as sent; the seconds include decoding the
+    entries.
+
+    Parameters
+    ----------
+    n_pages : int, optional
+        Pages per crawl. The default is 40.
+    count : int, optional
+        Entries per page. The default is 25.
+    latency : float, optional
+        Seconds the mock waits before every answer. The default is 0.
+
+    Returns
+    -------
+    results : dict
+        Bytes and seconds per 1k records, per (profile, gzip).
+
+    """
+    server, search_api = mock_scopus.start_server(
+        pages=n_pages, count=count, latency=latency)
+    use_mock_api(search_api)
+    url = add_from_scopus.KEYWORD_API.format(
+        keyword=add_from_scopus.keyword_query(['particle swarm']))
+    results = dict()
+    try:
+        for profile in add_from_scopus.PROFILES:
+            for gzip in (False, True):
+                headers = dict(requests.utils.default_headers())
+                if not gzip:
+                    headers['Accept-Encoding'] = 'identity'
+                server.bytes = 0
+                records = 0
+                start = perf_counter()
+                page = requests.get(url + add_from_scopus.PROFILES[profile],
+                                    headers=headers).json()['search-results']
+                while page['cursor']['@current'] != page['cursor']['@next']:
+                    records += len(page['entry'])
+                    page = requests.get(page['link'][0]['@href'],
+                                        headers=headers).json()['search-results']
+                elapsed = perf_counter() - start
+                results[profile, gzip] = {
+                    'bytes': server.bytes * 1000 / records,
+                    'seconds': elapsed * 1000 / records}
+                print(f"{profile:>8}{' gzip' if gzip else '     '}: "
+                      f"{results[profile, gzip]['bytes'] / 1024:8.1f} KiB and "
+                      f"{results[profile, gzip]['seconds']:.3f} s per 1k records")
+    finally:
+        server.shutdown()
+    return results
+
+
+def bench_sharded(levels=(1, 2, 4), calls=100, n_eids=32, pages=5,
+                  latency=0.05):
+    """
+    Report pages per second of the sharded crawl per number of processes.
+
+    Every process has its own api key with `calls` calls and the citations
+    of the mock never run out, so every level makes calls * processes
+    calls; linear scaling keeps the time per level the same. Each level
+    crawls other publications (see mock_scopus.start_server), starting from
+    n_eids queued eids, in a temporary directory. The rows are written to
+    the database in mydb_setup.json, so run it against an empty copy of
+    the database.
+
+    Parameters
+    ----------
+    levels : tuple, optional
+        Numbers of processes to measure. The default is (1, 2, 4).
+    calls : int, optional
+        Calls per api key. The default is 100.
+    n_eids : int, optional
+        Number of queued eids. The default is 32.
+    pages : int, optional
+        Number of result pages per query. The default is 5.
+    latency : float, optional
+        Response latency of the mock server in seconds. The default is 0.05.
+
+    Returns
+    -------
+    results : dict
+        Pages per second for every number of processes.
+
+    """
+    with open('mydb_setup.json') as json_file:
+        db_setup = json_file.read()
+    cwd = os.getcwd()
+    results = dict()
+    for level, workers in enumerate(levels):
+        server, search_api = mock_scopus.start_server(
+            pages=pages, latency=latency, remaining=calls + RESERVE,
+            offset=(level + 1) * 10**10)
+        use_mock_api(search_api)
+        try:
+            with TemporaryDirectory() as tmp:
+                os.chdir(tmp)
+                with open('mydb_setup.json', 'w') as json_file:
+                    json_file.write(db_setup)
+                with open('save.json', 'w') as json_file:
+                    json_file.write(dumps({'api': '', 'cursor': '*',
+                                           'auth_my': 1, 'limit': calls}))
+                with open('added_keywords.txt', 'w') as f:
+                    f.write('particle swarm : PSO')
+                open('list-of-labels.txt', 'w').close()
+                queue = CrawlQueue()
+                for i in range(n_eids):
+                    queue.push(f'2-s2.0-{10**9 + (level + 1) * 10**10 + i}')
+                queue.close()
+                start = perf_counter()
+                sharded_crawl.main(headers=[{'X-ELS-APIKey': f'bench-{i}'}
+                                            for i in range(workers)])
+                elapsed = perf_counter() - start
+        finally:
+            os.chdir(cwd)
+            server.shutdown()
+        results[workers] = server.requests / elapsed
+        print(f'{workers:>3} processes: {server.requests} pages in '
+              f'{elapsed:.2f} s, {results[workers]:.1f} pages/s')
+    return results
+
+
+if __name__ == '__main__':
+    bench_citing_crawler()
+    bench_references()
+    bench_ref_parser()
+    bench_profiles()
+    bench_normalize()
+    bench_stream()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:37:12 2026
+
+Crash-safe state of the project (save.json) with an append-only journal.
+
+@author: milasiunaite
+"""
+
+import os
+from json import load, loads, dumps, dump, JSONDecodeError
+from collections.abc import MutableMapping
+
+
+class Checkpoint(MutableMapping):
+    """
+    Dictionary with the state of the project that survives crashes.
+
+    The snapshot (save.json) is only ever replaced by an atomic rename.
+    Changes in between are appended to a journal (save.json.journal), one
+    line per save() with the new values of the changed keys. Values are
+    stored whole, so replaying a line twice gives the same state. A line
+    that was cut off by a crash is ignored. Once the journal has more than
+    compact_every lines, it is folded into a new snapshot.
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the snapshot. The default is 'save.json'.
+    compact_every : int, optional
+        Number of journal lines after which save() writes a new snapshot.
+        The default is 1000.
+
+    """
+
+    def __init__(self, path='save.json', compact_every=1000):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        self._state = dict()
+        self._changed = set()
+        self._deleted = set()
+        self._lines = 0
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as json_file:
+                self._state = load(json_file)
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf8') as journal:
+                for line in journal:
+                    try:
+                        entry = loads(line)
+                    except JSONDecodeError:
+                        break  # Torn write at the end of the journal
+                    self._state.update(entry['set'])
+                    for key in entry['del']:
+                        self._state.pop(key, None)
+            # Start from a clean journal, without a torn line to append to.
+            self.compact()
+
+    def __getitem__(self, key):
+        return self._state[key]
+
+    def __setitem__(self, key, value):
+        self._state[key] = value
+        self._changed.add(key)
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        del self._state[key]
+        self._changed.discard(key)
+        self._deleted.add(key)
+
+    def __iter__(self):
+        return iter(self._state)
+
+    def __len__(self):
+        return len(self._state)
+
+    def save(self):
+        """Append the changes since the last save to the journal."""
+        if len(self._changed) == 0 and len(self._deleted) == 0:
+            return
+        entry = {'set': {key: self._state[key] for key in self._changed},
+                 'del': list(self._deleted)}
+        with open(self.journal_path, 'a', encoding='utf8') as journal:
+            journal.write(dumps(entry, ensure_ascii=False) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._changed.clear()
+        self._deleted.clear()
+        self._lines += 1
+        if self._lines >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Write the whole state to a new snapshot and empty the journal."""
+        self._changed.clear()
+        self._deleted.clear()
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf8') as json_file:
+            dump(self._state, json_file, ensure_ascii=False)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(temp_path, self.path)
+        # A crash before the journal is emptied only replays known values.
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._lines = 0
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 09:21:47 2026
+
+Persistent queue of publications whose citing articles still need crawling.
+
+@author: milasiunaite
+"""
+
+import sqlite3
+from collections import OrderedDict
+
+
+class CrawlQueue:
+    """
+    Deduplicated FIFO queue of eids stored in an SQLite file.
+
+    Every eid that was ever queued is remembered, so it is only crawled
+    once. Pending eids keep the cursor of the next page to fetch, so a crawl
+    resumes where it stopped. Membership, push, pop and acknowledgement are
+    answered from memory; the file is only written on commit.
+
+    Pushes are committed with commit(staged=False), before the rows that
+    caused them are committed to MySQL, so a crash cannot lose a queued eid.
+    Cursor moves and acknowledgements are staged until commit(), which is
+    called after the MySQL commit, so a crash cannot skip unsaved pages.
+
+    For every eid the new records and records of each crawled page are
+    kept, with the citedby-count of the last citing article, so a crawl
+    can be stopped early (see scheduler.StopPolicy). A stopped eid keeps
+    its cursor and is pending again once resume() is called with a policy
+    that lets it continue.
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the SQLite file. The default is 'crawl_queue.sqlite'.
+
+    """
+
+    def __init__(self, path='crawl_queue.sqlite'):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS queue ('
+                          'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          'eid TEXT NOT NULL UNIQUE, '
+                          'cursor TEXT NOT NULL DEFAULT "*", '
+                          'done INTEGER NOT NULL DEFAULT 0)')
+        # Added later: done=2 for stopped eids, and the crawl statistics.
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(queue)')}
+        for column, definition in (('stopped', 'TEXT'),
+                                   ('history', 'TEXT NOT NULL DEFAULT ""'),
+                                   ('citedby', 'INTEGER')):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE queue ADD COLUMN {column} {definition}')
+        self.conn.commit()
+        self._known = set()
+        self._pending = OrderedDict()  # eid -> cursor, in queue order
+        self._stopped = dict()  # eid -> (reason, cursor)
+        self._stats = dict()  # eid -> {'history': [(new, records)], 'citedby'}
+        self._staged = dict()  # eid -> new cursor, or None once done
+        self._staged_stats = set()
+        rows = self.conn.execute('SELECT eid, cursor, done, stopped, history,'
+                                 ' citedby FROM queue ORDER BY seq')
+        for eid, cursor, done, stopped, history, citedby in rows:
+            self._known.add(eid)
+            if done == 2:
+                self._stopped[eid] = (stopped, cursor)
+            elif not done:
+                self._pending[eid] = cursor
+            if history != '':
+                self._stats[eid] = {
+                    'history': [tuple(map(int, page.split(':')))
+                                for page in history.split(',')],
+                    'citedby': citedby}
+
+    def __len__(self):
+        """Return the number of pending eids."""
+        return len(self._pending)
+
+    def __contains__(self, eid):
+        """Return True if the eid was ever queued."""
+        return eid in self._known
+
+    def __iter__(self):
+        """Iterate over the pending eids in queue order."""
+        return iter(self._pending)
+
+    def push(self, eid):
+        """
+        Add the eid to the end of the queue unless it was queued before.
+
+        Parameters
+        ----------
+        eid : string
+            Id of the publication, e.g. '2-s2.0-85000000000'.
+
+        Returns
+        -------
+        bool
+            True if the eid was added.
+
+        """
+        if eid in self._known:
+            return False
+        self._known.add(eid)
+        self._pending[eid] = '*'
+        self.conn.execute('INSERT OR IGNORE INTO queue (eid) VALUES (?)', (eid,))
+        return True
+
+    def is_pending(self, eid):
+        """Return True if the citing articles of the eid still need crawling."""
+        return eid in self._pending
+
+    def done(self):
+        """Iterate over the eids whose citing articles have been crawled."""
+        return (eid for eid in self._known if eid not in self._pending)
+
+    def peek(self):
+        """Return the first pending eid, or None if the queue is empty."""
+        for eid in self._pending:
+            return eid
+        return None
+
+    def cursor(self, eid):
+        """Return the cursor of the next page to fetch for the eid."""
+        return self._pending[eid]
+
+    def move(self, eid, cursor):
+        """Store the cursor of the next page to fetch for the eid."""
+        if eid in self._stopped:  # A page fetched before the stop was seen
+            self._stopped[eid] = (self._stopped[eid][0], cursor)
+        else:
+            self._pending[eid] = cursor
+        self._staged[eid] = cursor
+
+    def ack(self, eid):
+        """Remove the eid from the pending eids once it is fully crawled."""
+        del self._pending[eid]
+        self._staged[eid] = None
+
+    def stats(self, eid):
+        """Return the new records and records per page, and the last citedby."""
+        return self._stats.get(eid, {'history': [], 'citedby': None})
+
+    def add_page(self, eid, new, records, citedby=None):
+        """
+        Add a crawled page to the statistics of the eid.
+
+        Parameters
+        ----------
+        eid : string
+            Id of the cited publication.
+        new : int
+            Number of records of the page added to the database.
+        records : int
+            Number of records of the page.
+        citedby : int, optional
+            Citedby-count of the last citing article of the page. The
+            default is None (unchanged).
+
+        Returns
+        -------
+        stats : dict
+            Updated statistics of the eid.
+
+        """
+        stats = self._stats.setdefault(eid, {'history': [], 'citedby': None})
+        stats['history'].append((new, records))
+        if citedby is not None:
+            stats['citedby'] = citedby
+        self._staged_stats.add(eid)
+        return stats
+
+    def stop(self, eid, reason):
+        """Stop crawling the eid early, keeping its cursor to resume."""
+        self._stopped[eid] = (reason, self._pending.pop(eid))
+        self._staged[eid] = self._stopped[eid][1]
+
+    def stopped(self):
+        """Return the reason every stopped eid was stopped for, by eid."""
+        return {eid: reason for eid, (reason, _) in self._stopped.items()}
+
+    def resume(self, policy=None):
+        """
+        Make the stopped eids pending again, unless the policy stops them.
+
+        Parameters
+        ----------
+        policy : StopPolicy, optional
+            Policy of the next crawl. The default is None (resume all).
+
+        Returns
+        -------
+        resumed : list
+            Eids that are pending again.
+
+        """
+        resumed = []
+        for eid, (_, cursor) in list(self._stopped.items()):
+            if policy is None or policy.stop(self.stats(eid)) is None:
+                del self._stopped[eid]
+                self._pending[eid] = cursor
+                self._staged[eid] = cursor
+                resumed.append(eid)
+        return resumed
+
+    def commit(self, staged=True):
+        """
+        Write the queue to the file.
+
+        Parameters
+        ----------
+        staged : bool, optional
+            If False, only commit pushed eids and keep cursor moves and
+            acknowledgements staged. The default is True.
+
+        """
+        if staged and len(self._staged) > 0:
+            rows = []
+            for eid, cursor in self._staged.items():
+                if cursor is None:
+                    rows.append(('*', 1, None, eid))
+                elif eid in self._stopped:
+                    rows.append((cursor, 2, self._stopped[eid][0], eid))
+                else:
+                    rows.append((cursor, 0, None, eid))
+            self.conn.executemany(
+                'UPDATE queue SET cursor=?, done=?, stopped=? WHERE eid=?', rows)
+            self._staged.clear()
+        if staged and len(self._staged_stats) > 0:
+            self.conn.executemany(
+                'UPDATE queue SET history=?, citedby=? WHERE eid=?',
+                [(','.join(f'{new}:{records}' for new, records
+                           in self._stats[eid]['history']),
+                  self._stats[eid]['citedby'], eid)
+                 for eid in self._staged_stats])
+            self._staged_stats.clear()
+        self.conn.commit()
+
+    def close(self):
+        """Commit everything and close the file."""
+        self.commit()
+        self.conn.close()
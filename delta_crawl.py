@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 11:08:40 2026
+
+Refresh the crawled keywords and seed eids with the records SCOPUS loaded
+since their last crawl.
+
+@author: milasiunaite
+"""
+
+import requests
+import mysql.connector
+from json import load, JSONDecodeError
+import add_from_scopus
+from add_from_scopus import (SQL, PROFILES, KEYWORD_PROFILE, CITING_PROFILE,
+                             get_keywords, keyword_groups, build_matcher,
+                             new_batch, flush_batch, add_record,
+                             add_citing_record, collect_ids, save_ids,
+                             search_results)
+from checkpoint import Checkpoint
+from crawl_queue import CrawlQueue
+from high_water import HighWater, load_date
+from response_store import ResponseStore
+from scheduler import Quota, RESERVE
+
+# {since} is '' or a date restriction, see since_filter.
+DELTA_KEYWORD_API = (add_from_scopus.SEARCH_API
+                     + '?query=TITLE-ABS({keyword}){since}&cursor=*&view=COMPLETE')
+DELTA_CITING_API = (add_from_scopus.SEARCH_API
+                    + '?query=refeid({eid}){since}&cursor={cursor}'
+                    '&view=COMPLETE&sort=citedby-count')
+
+
+def since_filter(loaded, pub_year):
+    """
+    Return the restriction of a query to the records after the marks.
+
+    The load date of the last complete crawl is used if there is one.
+    Otherwise the records published in or after the latest year in the
+    database are asked for, as that year may not be complete. Without
+    either, the query is not restricted.
+    """
+    if loaded is not None:
+        return f' AND LOAD-DATE AFT {loaded}'
+    if pub_year:
+        return f' AND PUBYEAR AFT {pub_year - 1}'
+    return ''
+
+
+def year(ele):
+    """Return the year of publication of a search result, or None."""
+    try:
+        return int(ele['prism:coverDate'][:4])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def pub_years(mycursor):
+    """
+    Return the latest year of publication in the database per unit.
+
+    Returns
+    -------
+    labels : dict
+        Latest year of the publications with every label.
+    cited : dict
+        Latest year of the publications citing every eid, found by its
+        citing crawl ('search' edges), by eid as in the crawl queue.
+
+    """
+    labels = dict()
+    mycursor.execute('SELECT field, MAX(date) FROM publications'
+                     ' WHERE date IS NOT NULL AND field IS NOT NULL'
+                     ' GROUP BY field')
+    for field, date in mycursor.fetchall():
+        for label in field.split(','):
+            labels[label] = max(labels.get(label, 0), int(str(date)[:4]))
+    mycursor.execute('SELECT c.cited_id, MAX(p.date) FROM citations AS c'
+                     ' JOIN publications AS p ON p.eid = c.citing_id'
+                     ' WHERE c.source = "search" AND p.date IS NOT NULL'
+                     ' GROUP BY c.cited_id')
+    cited = {f'2-s2.0-{eid}': int(str(date)[:4])
+             for eid, date in mycursor.fetchall()}
+    return labels, cited
+
+
+def crawl_unit(url, headers, store, quota, reserve, stream, handle):
+    """
+    Fetch the pages of one query and hand their entries to handle.
+
+    Parameters
+    ----------
+    url : string
+        Url of the first page.
+    headers : dict
+        Request headers with the api key.
+    store : ResponseStore
+        Store of the responses of the API.
+    quota : Quota
+        Quota of the api key, updated from the responses.
+    reserve : int
+        Number of calls of the quota to leave unused.
+    stream : bool
+        Decode the entries of the pages one at a time.
+    handle : function
+        Called with the entries of every page, then the page is committed.
+
+    Returns
+    -------
+    complete : bool
+        True if every page was handled, False if the quota ran out or the
+        query failed.
+    calls : int
+        Number of requests.
+
+    """
+    calls = 0
+    while quota.allows(reserve):
+        response = store.get(url, headers=headers, stream=stream)
+        quota.update(response)
+        calls += 1
+        try:
+            page = search_results(response, stream)
+        except (KeyError, JSONDecodeError):
+            print(response)
+            return False, calls
+        if page['cursor']['@current'] == page['cursor']['@next']:
+            return True, calls  # End of the results
+        try:
+            handle(page['entry'])
+        except KeyError:  # Skip the page, like add_from_scopus.main
+            print(response)
+        except JSONDecodeError:  # Page cut off while streamed, fetch again
+            print(response)
+            continue
+        for link in page['link']:
+            if link['@ref'] == 'next':
+                url = link['@href']
+    return False, calls
+
+
+def main(kinds=('keyword', 'citing'), stream=False, reserve=RESERVE,
+         keyword_profile=KEYWORD_PROFILE, citing_profile=CITING_PROFILE,
+         path='high_water.sqlite'):
+    """
+    Add the records loaded since the last crawl of the crawled units.
+
+    The keyword queries of added_keywords.txt (see
+    add_from_scopus.keyword_groups) and the fully crawled eids of the
+    crawl queue are searched again, restricted to the records loaded
+    after their high-water mark, or, before their first refresh, to those
+    published in or after the latest year in the database (see
+    since_filter). Records go through add_record and add_citing_record
+    like in add_from_scopus.main, and newly labelled eids are queued for
+    that crawl. The least recently refreshed units go first. The mark of
+    a unit is only moved once all of its pages are committed, so a unit
+    cut off by the quota is refreshed again in full by the next run; units
+    refreshed today are skipped.
+
+    Parameters
+    ----------
+    kinds : tuple, optional
+        Units to refresh: 'keyword' and/or 'citing'. The default is both.
+    stream : bool, optional
+        Decode the entries of the pages one at a time. The default is False.
+    reserve : int, optional
+        Number of calls of the weekly quota to leave unused. The default is
+        RESERVE.
+    keyword_profile : string, optional
+        Request profile of the keyword queries, see
+        add_from_scopus.PROFILES. The default is KEYWORD_PROFILE.
+    citing_profile : string, optional
+        Request profile of the citing articles. The default is
+        CITING_PROFILE.
+    path : string, optional
+        Path of the high-water marks. The default is 'high_water.sqlite'.
+
+    Returns
+    -------
+    stats : dict
+        Numbers of units refreshed, calls, records and new records.
+
+    """
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+    headers = requests.utils.default_headers()
+    data = load(open('headers.json'))
+    for head in data:
+        headers[head] = data[head]
+    data = Checkpoint()
+    quota = Quota.from_data(data)
+    queue = CrawlQueue()
+    marks = HighWater(path)
+    store = ResponseStore()
+    all_ids = collect_ids(mycursor)
+    batch = new_batch()
+    keywords_abbr = get_keywords('added_keywords.txt')
+    matcher = build_matcher({**keywords_abbr, **get_keywords()})
+    labels, cited = pub_years(mycursor)
+    today = load_date()
+    units = []  # (loaded, kind, key, label, url)
+    if 'keyword' in kinds:
+        for query, (kw, _) in keyword_groups(keywords_abbr).items():
+            loaded, latest = marks.get('keyword', query)
+            since = since_filter(loaded, latest or labels.get(kw))
+            units.append((loaded, 'keyword', query, kw, DELTA_KEYWORD_API.format(
+                keyword=query, since=since) + PROFILES[keyword_profile]))
+    if 'citing' in kinds:
+        stopped = queue.stopped()
+        known = marks.marks('citing')
+        for eid in queue.done():
+            if eid in stopped:
+                continue  # Not crawled to the end
+            loaded, latest = known.get(eid, (None, None))
+            since = since_filter(loaded, latest or cited.get(eid))
+            units.append((loaded, 'citing', eid, '', DELTA_CITING_API.format(
+                eid=eid, since=since, cursor='*') + PROFILES[citing_profile]))
+    # Never refreshed first, then the oldest marks.
+    units.sort(key=lambda unit: (unit[0] is not None, unit[0] or ''))
+    counts = {'newlyadded': 0, 'indatabase': 0, 'records_checked': 0}
+    stats = {'units': 0, 'calls': 0}
+    try:
+        for loaded, kind, key, kw, url in units:
+            if loaded == today:
+                continue  # Refreshed today
+            unit = {'records': 0, 'year': None}
+
+            def handle(entries):
+                nonlocal all_ids
+                for ele in entries:
+                    if kind == 'keyword':
+                        all_ids, _ = add_record(
+                            mycursor, all_ids, counts, batch, ele, matcher, kw)
+                    else:
+                        all_ids, _ = add_citing_record(
+                            mycursor, all_ids, counts, batch, ele, matcher,
+                            kw, key)
+                    counts['records_checked'] += 1
+                    unit['records'] += 1
+                    published = year(ele)
+                    if published is not None:
+                        unit['year'] = max(unit['year'] or 0, published)
+                flush_batch(mydb, mycursor, batch, SQL, queue)
+                queue.commit()
+                quota.save(data)
+                data.save()
+            complete, calls = crawl_unit(url, headers, store, quota, reserve,
+                                         stream, handle)
+            stats['calls'] += calls
+            if not complete:
+                if not quota.allows(reserve):
+                    break  # Out of quota, the rest is refreshed next time
+                continue
+            marks.set(kind, key, today, unit['year'], unit['records'])
+            stats['units'] += 1
+    except KeyboardInterrupt:
+        flush_batch(mydb, mycursor, batch, SQL, queue)
+    quota.save(data)
+    data.save()
+    save_ids(all_ids)
+    queue.close()
+    marks.close()
+    store.close()
+    all_ids['next_author'].close()
+    stats['records'] = counts['records_checked']
+    stats['new'] = counts['newlyadded']
+    print(f"Refreshed {stats['units']} of {len(units)} units with"
+          f" {stats['calls']} calls: {stats['records']} records,"
+          f" {stats['new']} new")
+    return stats
+
+
+if __name__ == '__main__':
+    main()
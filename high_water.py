@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 10:26:53 2026
+
+High-water marks of the crawled keyword queries and seed eids.
+
+@author: milasiunaite
+"""
+
+import sqlite3
+from datetime import date, timedelta
+
+
+def load_date(day=None):
+    """
+    Return the LOAD-DATE mark of a crawl started on the day.
+
+    SCOPUS compares LOAD-DATE AFT strictly, so the mark is the day before:
+    records loaded while the crawl ran are found again, and skipped as
+    known, rather than missed.
+    """
+    if day is None:
+        day = date.today()
+    return (day - timedelta(days=1)).strftime('%Y%m%d')
+
+
+class HighWater:
+    """
+    Marks up to which a keyword query or seed eid is crawled, in SQLite.
+
+    A unit ('keyword' with its query as key, or 'citing' with its eid) has
+    the LOAD-DATE of its last complete crawl (yyyymmdd) and the latest year
+    of publication seen. A delta crawl only asks SCOPUS for the records
+    loaded after the mark, see delta_crawl.
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the SQLite file. The default is 'high_water.sqlite'.
+
+    """
+
+    def __init__(self, path='high_water.sqlite'):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS marks ('
+                          'kind TEXT NOT NULL, '
+                          'key TEXT NOT NULL, '
+                          'loaded TEXT, '
+                          'pub_year INTEGER, '
+                          'records INTEGER NOT NULL DEFAULT 0, '
+                          'PRIMARY KEY (kind, key))')
+        self.conn.commit()
+
+    def get(self, kind, key):
+        """Return the load date and year of publication of the unit."""
+        row = self.conn.execute('SELECT loaded, pub_year FROM marks'
+                                ' WHERE kind = ? AND key = ?',
+                                (kind, key)).fetchone()
+        return (None, None) if row is None else row
+
+    def marks(self, kind):
+        """Return the load date and year of publication by key."""
+        rows = self.conn.execute('SELECT key, loaded, pub_year FROM marks'
+                                 ' WHERE kind = ?', (kind,))
+        return {key: (loaded, year) for key, loaded, year in rows}
+
+    def set(self, kind, key, loaded, pub_year=None, records=0):
+        """
+        Store the marks of a unit once its crawl is complete.
+
+        Parameters
+        ----------
+        kind : string
+            'keyword' or 'citing'.
+        key : string
+            Search terms of the keyword query, or eid.
+        loaded : string
+            LOAD-DATE up to which the unit is crawled, see load_date.
+        pub_year : int, optional
+            Latest year of publication seen; an earlier one is not stored.
+            The default is None.
+        records : int, optional
+            Number of records of the crawl, added to the total. The default
+            is 0.
+
+        """
+        self.conn.execute(
+            'INSERT INTO marks (kind, key, loaded, pub_year, records)'
+            ' VALUES (?, ?, ?, ?, ?) ON CONFLICT (kind, key) DO UPDATE SET'
+            ' loaded = excluded.loaded,'
+            ' pub_year = MAX(COALESCE(pub_year, excluded.pub_year),'
+            ' COALESCE(excluded.pub_year, pub_year)),'
+            ' records = records + excluded.records',
+            (kind, key, loaded, pub_year, records))
+        self.conn.commit()
+
+    def close(self):
+        """Close the file."""
+        self.conn.close()
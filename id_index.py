@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 09:31:18 2026
+
+Compact sets of the ids in the database tables, persisted between runs.
+
+@author: milasiunaite
+"""
+
+import os
+import numpy as np
+from json import load, dump
+from zlib import crc32
+
+DIRECTORY = 'ids'
+FETCH_SIZE = 100000
+# Tables with their id column and the column kept as value, if any.
+TABLES = {'publications': ('eid', 'field'), 'authors': ('id', None),
+          'affiliations': ('id', None), 'additional': ('id', None)}
+
+
+class IdIndex:
+    """
+    Set of the ids in one table, optionally mapping every id to a string.
+
+    The ids are kept in a sorted int64 array that is memory-mapped from
+    ids/<table>.npy, so membership is a binary search and an id takes 8
+    bytes. Values are stored as int32 codes into a list of the distinct
+    values, e.g. the few hundred label combinations of the publications.
+    Changes made during a run are kept in memory and merged into the files
+    by save().
+
+    The files also hold a fingerprint of their content: the number of ids,
+    their sum and the sum of the CRC32 of the values. load() compares it
+    with the same sums computed by the database and rebuilds the files
+    from the table if they differ, e.g. after another script changed it.
+
+    Parameters
+    ----------
+    table : string
+        Name of the table, one of TABLES.
+    directory : string, optional
+        Directory of the files. The default is DIRECTORY.
+
+    """
+
+    def __init__(self, table, directory=DIRECTORY):
+        self.table = table
+        self.column, self.value_column = TABLES[table]
+        self.path = os.path.join(directory, table)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty(0, dtype=np.int32)
+        self.vocabulary = []
+        self.fingerprint = None
+        self._added = dict()  # id -> value, for ids added or changed
+        self._removed = set()
+
+    def __contains__(self, key):
+        if key in self._added:
+            return True
+        if key in self._removed:
+            return False
+        i = self.ids.searchsorted(key)
+        return i < len(self.ids) and self.ids[i] == key
+
+    def __len__(self):
+        new = sum(1 for key in self._added if not self._stored(key))
+        gone = sum(1 for key in self._removed if self._stored(key))
+        return len(self.ids) + new - gone
+
+    def __getitem__(self, key):
+        if key in self._added:
+            return self._added[key]
+        if key not in self._removed:
+            i = self.ids.searchsorted(key)
+            if i < len(self.ids) and self.ids[i] == key:
+                return self.vocabulary[self.codes[i]]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        self._added[key] = value
+        self._removed.discard(key)
+
+    def _stored(self, key):
+        i = self.ids.searchsorted(key)
+        return i < len(self.ids) and self.ids[i] == key
+
+    def add(self, key, value=None):
+        """Add the id, with its value for indexes of a value column."""
+        self[key] = value
+
+    def discard(self, key):
+        """Remove the id if present."""
+        self._added.pop(key, None)
+        self._removed.add(key)
+
+    def value_counts(self):
+        """Return the number of ids per value."""
+        counts = dict()
+        if len(self.codes) > 0:
+            for code, n in enumerate(np.bincount(self.codes)):
+                if n > 0:
+                    counts[self.vocabulary[code]] = int(n)
+        for key in set(self._added) | self._removed:
+            if self._stored(key):
+                value = self.vocabulary[self.codes[self.ids.searchsorted(key)]]
+                counts[value] -= 1
+            if key in self._added:
+                value = self._added[key]
+                counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def query_fingerprint(self, mycursor):
+        """Return the fingerprint of the table computed by the database."""
+        value = '0'
+        if self.value_column is not None:
+            value = f'SUM(CRC32(COALESCE({self.value_column}, "")))'
+        mycursor.execute(f'SELECT COUNT(*), SUM({self.column}), {value}'
+                         f' FROM {self.table}')
+        count, total, values = mycursor.fetchall()[0]
+        return [int(count), int(total or 0) % 2**64, int(values or 0)]
+
+    def compute_fingerprint(self):
+        """Return the fingerprint of the ids and values in the files."""
+        total = int(self.ids.sum(dtype=np.uint64)) if len(self.ids) > 0 else 0
+        values = 0
+        if self.value_column is not None and len(self.codes) > 0:
+            counts = np.bincount(self.codes, minlength=len(self.vocabulary))
+            values = sum(int(n) * crc32(v.encode('utf8'))
+                         for n, v in zip(counts, self.vocabulary))
+        return [len(self.ids), total, values]
+
+    def load(self, mycursor, check=True):
+        """
+        Memory-map the files, or rebuild them if the table has changed.
+
+        Parameters
+        ----------
+        mycursor : cursor
+            Cursor connected to the database.
+        check : bool, optional
+            Compare the fingerprint with the table. If False, files that
+            exist are used as they are, e.g. while other processes write to
+            the table. The default is True.
+
+        Returns
+        -------
+        self : IdIndex
+            Loaded index.
+
+        """
+        self._added.clear()
+        self._removed.clear()
+        try:
+            with open(self.path + '.json', encoding='utf8') as json_file:
+                meta = load(json_file)
+            fingerprint = (self.query_fingerprint(mycursor) if check
+                           else meta['fingerprint'])
+            if meta['fingerprint'] == fingerprint:
+                self.ids = np.load(self.path + '.npy', mmap_mode='r')
+                if len(self.ids) != fingerprint[0]:
+                    raise ValueError('Id file does not match its metadata')
+                if self.value_column is not None:
+                    self.codes = np.load(self.path + '.codes.npy', mmap_mode='r')
+                self.vocabulary = meta['vocabulary']
+                self.fingerprint = fingerprint
+                return self
+        except (OSError, ValueError, KeyError):
+            pass  # Missing or damaged files
+        return self.rebuild(mycursor)
+
+    def rebuild(self, mycursor):
+        """Read all ids (and values) from the table and save the files."""
+        columns = self.column
+        if self.value_column is not None:
+            columns += f', {self.value_column}'
+        mycursor.execute(f'SELECT {columns} FROM {self.table}')
+        ids, codes, vocabulary = [], [], dict()
+        rows = mycursor.fetchmany(FETCH_SIZE)
+        while len(rows) > 0:
+            ids.append(np.fromiter((row[0] for row in rows), dtype=np.int64,
+                                   count=len(rows)))
+            if self.value_column is not None:
+                codes.append(np.fromiter(
+                    (vocabulary.setdefault(row[1] or '', len(vocabulary))
+                     for row in rows), dtype=np.int32, count=len(rows)))
+            rows = mycursor.fetchmany(FETCH_SIZE)
+        self.ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+        order = np.argsort(self.ids, kind='stable')
+        self.ids = self.ids[order]
+        if self.value_column is not None:
+            self.codes = (np.concatenate(codes)[order] if codes
+                          else np.empty(0, dtype=np.int32))
+        self.vocabulary = list(vocabulary)
+        self._added.clear()
+        self._removed.clear()
+        self._write()
+        return self
+
+    def save(self):
+        """Merge the changes of this run into the files."""
+        if len(self._added) == 0 and len(self._removed) == 0:
+            return
+        keep = ~np.isin(self.ids, np.fromiter(
+            set(self._added) | self._removed, dtype=np.int64))
+        new = np.fromiter(self._added, dtype=np.int64, count=len(self._added))
+        ids = np.concatenate([self.ids[keep], new])
+        order = np.argsort(ids, kind='stable')
+        if self.value_column is not None:
+            vocabulary = {value: i for i, value in enumerate(self.vocabulary)}
+            new_codes = np.fromiter(
+                (vocabulary.setdefault(value or '', len(vocabulary))
+                 for value in self._added.values()),
+                dtype=np.int32, count=len(self._added))
+            self.codes = np.concatenate([self.codes[keep], new_codes])[order]
+            self.vocabulary = list(vocabulary)
+        self.ids = ids[order]
+        self._added.clear()
+        self._removed.clear()
+        self._write()
+
+    def _write(self):
+        """Write the arrays and the metadata, each by an atomic rename."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.fingerprint = self.compute_fingerprint()
+        arrays = [('.npy', self.ids)]
+        if self.value_column is not None:
+            arrays.append(('.codes.npy', self.codes))
+        for suffix, array in arrays:
+            with open(self.path + suffix + '.tmp', 'wb') as npy_file:
+                np.save(npy_file, np.ascontiguousarray(array))
+            os.replace(self.path + suffix + '.tmp', self.path + suffix)
+        with open(self.path + '.json.tmp', 'w', encoding='utf8') as json_file:
+            dump({'fingerprint': self.fingerprint,
+                  'vocabulary': self.vocabulary}, json_file)
+        os.replace(self.path + '.json.tmp', self.path + '.json')
+        # Map the new files, so the arrays read above can be freed.
+        self.ids = np.load(self.path + '.npy', mmap_mode='r')
+        if self.value_column is not None:
+            self.codes = np.load(self.path + '.codes.npy', mmap_mode='r')
+
+
+def load_ids(mycursor, tables=tuple(TABLES), directory=DIRECTORY, check=True):
+    """
+    Return an IdIndex for each of the tables, see IdIndex.load.
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+    tables : tuple, optional
+        Names of the tables. The default is all of TABLES.
+    directory : string, optional
+        Directory of the files. The default is DIRECTORY.
+    check : bool, optional
+        Compare the files with the tables. The default is True.
+
+    Returns
+    -------
+    all_ids : dict
+        IdIndex per table name.
+
+    """
+    return {table: IdIndex(table, directory).load(mycursor, check)
+            for table in tables}
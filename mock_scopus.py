@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 10:12:31 2026
+
+Local mock of the Scopus search API for testing and benchmarking the crawler.
+Point the crawler at it by replacing 'http://api.elsevier.com/content/search/scopus'
+in add_from_scopus.SEARCH_API and add_from_scopus.CITING_API with the url
+returned by start_server. Reference lists (view=REF) are served under
+/content/abstract/eid/.
+
+@author: milasiunaite
+"""
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode, quote
+from gzip import compress
+from threading import Thread, Lock
+from json import dumps
+from time import sleep
+from xml.sax.saxutils import escape
+
+REF_NAMESPACES = ('xmlns="http://www.elsevier.com/xml/svapi/abstract/dtd"'
+                  ' xmlns:ce="http://www.elsevier.com/xml/ani/common"'
+                  ' xmlns:prism="http://prismstandard.org/namespaces/basic/2.0/"')
+
+
+def make_entry(eid):
+    """
+    Generate a search result entry with every field used by add_record.
+
+    Also has the other fields of view=COMPLETE, which the crawler does not
+    read, so trimming the response with field= can be measured.
+
+    Parameters
+    ----------
+    eid : int
+        Scopus id of the publication.
+
+    Returns
+    -------
+    entry : dict
+        Entry in the format of the 'view=COMPLETE' search results.
+
+    """
+    return {
+        'eid': f'2-s2.0-{eid}',
+        'dc:title': f'Publication {eid} on particle swarm optimization',
+        'dc:description': f'Abstract of publication {eid}.',
+        'prism:publicationName': 'Mock Journal',
+        'prism:issn': '12345678',
+        'prism:volume': '1',
+        'prism:issueIdentifier': '1',
+        'prism:coverDate': '2020-01-01',
+        'prism:doi': f'10.0000/mock.{eid}',
+        'prism:url': f'https://api.elsevier.com/content/abstract/scopus_id/{eid}',
+        'citedby-count': str(eid % 97),
+        'subtypeDescription': 'Article',
+        'source-id': '12345',
+        'author-count': {'@total': '1'},
+        'affiliation': [{
+            'afid': str(60000000 + eid % 1000), 'affilname': 'Mock University',
+            'affiliation-city': 'Vilnius', 'affiliation-country': 'Lithuania',
+            'affiliation-url': ''}],
+        'author': [{
+            'authid': str(50000000000 + eid % 100000), 'authname': 'Doe J.',
+            'surname': 'Doe', 'given-name': 'John', 'initials': 'J.',
+            'afid': [{'$': str(60000000 + eid % 1000)}], 'author-url': ''}],
+        'authkeywords': 'swarm intelligence | optimization',
+        # Not read by the crawler.
+        '@_fa': 'true',
+        'link': [{'@_fa': 'true', '@ref': ref, '@href': (
+            f'https://www.scopus.com/inward/record.uri?partnerID=HzOxMe3b'
+            f'&scp={eid}&origin={ref}')}
+            for ref in ('self', 'author-affiliation', 'scopus', 'scopus-citedby')],
+        'dc:identifier': f'SCOPUS_ID:{eid}',
+        'dc:creator': 'Doe J.',
+        'prism:eIssn': '87654321',
+        'prism:pageRange': '1-10',
+        'prism:aggregationType': 'Journal',
+        'subtype': 'ar',
+        'article-number': str(eid % 10000),
+        'pubmed-id': str(eid % 10**8),
+        'fund-acr': 'MOCK', 'fund-no': 'undefined', 'fund-sponsor': 'Mock Foundation',
+        'openaccess': '0', 'openaccessFlag': False,
+        'freetoread': {'value': [{'$': 'all'}]},
+        'freetoreadLabel': {'value': [{'$': 'All Open Access'}]},
+        }
+
+
+def make_references(eid, count):
+    """
+    Generate the view=REF response of a publication.
+
+    The references are drawn from a pool shared by all publications, so the
+    same reference is cited by several of them.
+
+    Parameters
+    ----------
+    eid : int
+        Scopus id of the publication.
+    count : int
+        Number of references.
+
+    Returns
+    -------
+    body : string
+        XML of the abstract retrieval response.
+
+    """
+    references = []
+    for i in range(count):
+        ref = 2 * 10**9 + (eid * 31 + i * 7919) % (count * 50)
+        references.append(
+            '<reference><author-list>'
+            f'<author seq="1" auid="{50000000000 + ref % 100000}">'
+            '<ce:initials>J.</ce:initials><ce:indexed-name>Doe J.</ce:indexed-name>'
+            '<ce:surname>Doe</ce:surname><ce:given-name>John</ce:given-name>'
+            f'<author-url>https://api.elsevier.com/content/author/author_id/{ref}</author-url>'
+            f'<affiliation id="{60000000 + ref % 1000}"/></author>'
+            '<author seq="2"><ce:initials>A.</ce:initials>'
+            '<ce:indexed-name>Roe A.</ce:indexed-name><ce:surname>Roe</ce:surname>'
+            '<affiliation/></author></author-list>'
+            '<sourcetitle>Mock Journal</sourcetitle>'
+            f'<title>{escape(f"Reference {ref} on swarms & colonies")}</title>'
+            '<prism:coverDate>2010-01-01</prism:coverDate>'
+            '<type>resolvedReference</type>'
+            f'<ce:doi {REF_NAMESPACES.split(" ")[1]}>10.0000/ref.{ref}</ce:doi>'
+            f'<citedby-count date="2020-01-01">{ref % 89}</citedby-count>'
+            f'<scopus-id>{ref}</scopus-id>'
+            f'<url>https://api.elsevier.com/content/abstract/scopus_id/{ref}</url>'
+            '</reference>')
+    return (f'<abstracts-retrieval-response {REF_NAMESPACES}>'
+            f'<references total-references="{count}">{"".join(references)}'
+            '</references></abstracts-retrieval-response>')
+
+
+class MockScopusHandler(BaseHTTPRequestHandler):
+    """
+    Answer search requests with deterministic, paged results.
+
+    The field= parameter trims the entries, and responses are compressed
+    for clients that accept gzip.
+    """
+
+    def do_GET(self):
+        server = self.server
+        if server.latency > 0:
+            sleep(server.latency)
+        path = urlparse(self.path).path
+        if path.startswith('/content/abstract/eid/'):
+            eid = int(path.rsplit('/', 1)[1][7:])
+            self.answer(make_references(eid, server.references).encode('utf8'),
+                        'text/xml')
+            return
+        query = parse_qs(urlparse(self.path).query)
+        text = query.get('query', [''])[0]
+        cursor = query.get('cursor', ['*'])[0]
+        page = 0 if cursor == '*' else int(cursor)
+        seed = sum(ord(c) * (i + 1) for i, c in enumerate(text)) % 10**6
+        if page < server.pages:
+            entries = [make_entry(10**9 + server.offset + seed * 1000
+                                  + page * server.count + i)
+                       for i in range(server.count)]
+            if 'field' in query:  # Only the requested fields
+                fields = set(query['field'][0].split(','))
+                entries = [{key: value for key, value in entry.items()
+                            if key in fields} for entry in entries]
+            next_cursor = str(page + 1)
+        else:
+            entries = []
+            next_cursor = cursor
+        body = {'search-results': {
+            'opensearch:totalResults': str(server.pages * server.count),
+            'cursor': {'@current': cursor, '@next': next_cursor},
+            'link': [{'@ref': 'next', '@href': (
+                f'http://{server.server_address[0]}:{server.server_address[1]}'
+                f'{urlparse(self.path).path}?' + urlencode(
+                    {**{key: value[0] for key, value in query.items()},
+                     'cursor': next_cursor}, quote_via=quote))}],
+            'entry': entries}}
+        self.answer(dumps(body).encode('utf8'), 'application/json')
+
+    def answer(self, body, content_type):
+        """Send the body, counting the call against the api key."""
+        server = self.server
+        key = self.headers.get('X-ELS-APIKey', '')
+        gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzip:
+            body = compress(body, compresslevel=6)
+        with server.lock:
+            # Every api key has its own quota.
+            server.used[key] = server.used.get(key, 0) + 1
+            server.requests += 1
+            server.bytes += len(body)
+            remaining = server.remaining - server.used[key]
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-RateLimit-Remaining', str(remaining))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        return  # Keep the console quiet.
+
+
+class MockScopusServer(ThreadingHTTPServer):
+    """Threaded server with room for many concurrent connections."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_server(pages=5, count=25, latency=0.05, remaining=20000, port=0,
+                 offset=0, references=20):
+    """
+    Start the mock server in a background thread.
+
+    Parameters
+    ----------
+    pages : int, optional
+        Number of result pages for every query. The default is 5.
+    count : int, optional
+        Number of entries per page. The default is 25.
+    latency : float, optional
+        Seconds to wait before answering. The default is 0.05.
+    remaining : int, optional
+        Initial value of the 'X-RateLimit-Remaining' header, per api key
+        ('X-ELS-APIKey' header). The default is 20000.
+    port : int, optional
+        Port to listen on; 0 picks a free port. The default is 0.
+    offset : int, optional
+        Added to every eid, so servers with different offsets return
+        different publications. The default is 0.
+    references : int, optional
+        Number of references of every publication. The default is 20.
+
+    Returns
+    -------
+    server : MockScopusServer
+        Running server; call server.shutdown() to stop it.
+    search_api : string
+        Url of the mock search endpoint.
+
+    """
+    server = MockScopusServer(('127.0.0.1', port), MockScopusHandler)
+    server.pages = pages
+    server.count = count
+    server.latency = latency
+    server.remaining = remaining
+    server.offset = offset
+    server.references = references
+    server.used = dict()  # Calls per api key
+    server.requests = 0
+    server.bytes = 0  # Bytes of the response bodies sent
+    server.lock = Lock()
+    Thread(target=server.serve_forever, daemon=True).start()
+    search_api = f'http://127.0.0.1:{server.server_address[1]}/content/search/scopus'
+    return server, search_api
+
+
+if __name__ == '__main__':
+    server, search_api = start_server(port=8080)
+    print(f'Serving on {search_api}')
+    input('Press Enter to stop the server.\n')
+    server.shutdown()
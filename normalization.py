@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:02:55 2026
+
+Text normalization shared by the crawler and the deduplication functions.
+
+@author: milasiunaite
+"""
+
+import re
+from functools import lru_cache
+from html import unescape
+from unidecode import unidecode
+
+CACHE_SIZE = 2**18
+# Signs replaced by a space in titles and author names, and signs removed.
+# The text is ASCII once transliterated, so bytes.translate can be used.
+TRANSLATION = bytes.maketrans(b'-\\[', b'   ')
+DELETED = b'/?&"\'!@#$^*=`:;|~{}]'
+SPACES = re.compile(' {2,}')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize(text):
+    """
+    Return string in lower case and with non-standard letters removed.
+
+    Used to compare titles and author names. Text that is plain ASCII after
+    unescaping HTML entities skips the transliteration. Runs of spaces are
+    collapsed into one space.
+
+    Parameters
+    ----------
+    text : string
+        Text to normalize.
+
+    Returns
+    -------
+    norm : string
+        Normalized text.
+
+    """
+    norm = text.casefold()
+    if '&' in norm:
+        norm = norm.replace('&amp;', '&')  # Replace HTML entity '&amp;' with '&'
+        norm = unescape(norm)
+    if not norm.isascii():
+        norm = unidecode(norm, 'ignore')
+    norm = norm.replace('.-', '.')  # For normalizing initials
+    norm = norm.encode('ascii').translate(TRANSLATION, DELETED).decode('ascii')
+    if '  ' in norm:
+        norm = SPACES.sub(' ', norm)
+    return norm
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def normalize_search(text):
+    """
+    Generalize the text by removing any non-standard letters or signs.
+
+    Used to find keywords in titles and abstracts.
+
+    Parameters
+    ----------
+    text : string
+        Text to generalize.
+
+    Returns
+    -------
+    norm : string
+        Generalized text.
+
+    """
+    norm = text.casefold()
+    if not norm.isascii():
+        norm = unidecode(norm, 'ignore')
+    norm = norm.replace('optimis', 'optimiz')
+    return norm.replace('-', ' ')
+
+
+def normalize_many(texts, function=normalize):
+    """
+    Normalize a list or pandas Series of texts at once.
+
+    Every distinct text is normalized only once. Missing values (None) are
+    kept as they are.
+
+    Parameters
+    ----------
+    texts : list or pd.Series
+        Texts to normalize.
+    function : function, optional
+        Either normalize or normalize_search. The default is normalize.
+
+    Returns
+    -------
+    list or pd.Series
+        Normalized texts, in the type and order of the input.
+
+    """
+    unique = dict.fromkeys(texts)
+    for text in unique:
+        if isinstance(text, str):
+            unique[text] = function(text)
+    if hasattr(texts, 'map'):  # pandas Series
+        return texts.map(unique)
+    return [unique[text] for text in texts]
@@ -194,6 +194,8 @@ def get_data(source):
         Each entry contains a list of information about a record.
     others_data : list
         Each entry contains a list of information about a record.
+    edges : list
+        Each entry contains the ids of the citing and the cited record.
 
     """
     if source == 'database':
@@ -201,25 +203,28 @@ def get_data(source):
         mydb = mysql.connector.connect(**db_data)
         mycursor = mydb.cursor()
         mycursor.execute(
-            'SELECT eid, field, cites, authors, citedby, ref_count FROM publications')
+            'SELECT eid, field, authors, citedby, ref_count FROM publications')
         publications_data = mycursor.fetchall()
-        mycursor.execute(
-            "SELECT id, authors, referenced_by FROM additional")
+        mycursor.execute("SELECT id, authors FROM additional")
         others_data = mycursor.fetchall()
+        mycursor.execute('SELECT citing_id, cited_id FROM citations')
+        edges = mycursor.fetchall()
     elif source == 'csv':
         # Change the file paths if needed.
         publications_data = eval(pd.read_csv('publications.csv', sep=',',
-                                             usecols=['eid', 'field', 'cites',
+                                             usecols=['eid', 'field',
                                                       'authors', 'citedby',
                                                       'ref_count']).to_json(
                                                           orient='values'))
         others_data = eval(pd.read_csv('additional.csv', sep=',',
-                                       usecols=['id', 'authors',
-                                                'referenced_by']).to_json(
+                                       usecols=['id', 'authors']).to_json(
                                                     orient='values'))
+        edges = eval(pd.read_csv('citations.csv', sep=',',
+                                 usecols=['citing_id', 'cited_id']).to_json(
+                                     orient='values'))
     else:
         raise ValueError('argument value not appropriate')
-    return (publications_data, others_data)
+    return (publications_data, others_data, edges)
 
 
 def paper_citation_network(source='database'):
@@ -240,39 +245,29 @@ def paper_citation_network(source='database'):
 
     """
     G = nx.DiGraph()
-    data_pub, data_add = get_data(source)
+    data_pub, data_add, edges = get_data(source)
     nodes = [str(d[0]) for d in data_pub]
     gen_pub = (x for x in data_pub)
     gen_add = (x for x in data_add)
     G.add_nodes_from(nodes)
-    del nodes, data_add
-    edges, fields, citedby, authors, refcount = set(), dict(), dict(), dict(), dict()
+    del nodes
+    fields, citedby, authors, refcount = dict(), dict(), dict(), dict()
     for entry in gen_pub:
         eid = str(entry[0])
         fields[eid] = entry[1]
-        authors[eid] = entry[3]
-        citedby[eid] = entry[4]
-        refcount[eid] = entry[5]
+        authors[eid] = entry[2]
+        citedby[eid] = entry[3]
+        refcount[eid] = entry[4]
     labels = set(fields.values())
-    gen_pub = (x for x in data_pub)
     del data_pub
-    for entry in gen_pub:
-        if entry[2] != '':
-            try:
-                cites = (x for x in entry[2].split(','))
-            except AttributeError:
-                continue
-            for ele in cites:
-                G.add_edge(str(entry[0]), ele)
     for entry in gen_add:
         eid = str(entry[0])
         G.add_node(eid)
         authors[eid] = entry[1]
         fields[eid] = 'OTHER'
-        if entry[2] != '':
-            cites = (x for x in entry[2].split(','))
-            for ele in cites:
-                G.add_edge(ele, eid)
+    del data_add
+    G.add_edges_from((str(e[0]), str(e[1])) for e in edges)
+    del edges
     nx.set_node_attributes(G, fields, 'field')
     nx.set_node_attributes(G, citedby, 'citedby')
     nx.set_node_attributes(G, refcount, 'refcount')
@@ -369,31 +364,18 @@ def compare_reference_counts(G):
     f.close()
 
 
-def remove_ref(string, ref):
-    updated_string = string.replace(ref, '')
-    updated_string = updated_string.replace(',,', ',')
-    updated_string = updated_string.strip(',')
-    return updated_string
-
-
 def remove_edges_between_other(G):
     db_data = load(open('mydb_setup.json'))
     mydb = mysql.connector.connect(**db_data)
     mycursor = mydb.cursor()
-    mycursor.execute('SELECT eid FROM publications')
-    ids_publications = set(mycursor.fetchall())
     edges_to_remove = set()
     for e1, e2 in G.edges():
         if G.nodes[e1]['field'] == 'OTHER' and G.nodes[e2]['field'] == 'OTHER':
             edges_to_remove.add((e1, e2))
-            if (int(e1),) in ids_publications:
-                mycursor.execute(
-                    f'SELECT cites FROM publications WHERE eid={e1}')
-                string = mycursor.fetchall()[0][0]
-                updated = remove_ref(string, e2)
-                mycursor.execute(
-                    f'UPDATE publications SET cites="{updated}" WHERE eid={e1}')
-                mydb.commit()
+    mycursor.executemany(
+        'DELETE FROM citations WHERE citing_id=%s AND cited_id=%s',
+        [(int(e1), int(e2)) for e1, e2 in edges_to_remove])
+    mydb.commit()
     G.remove_edges_from(edges_to_remove)
     return G, len(edges_to_remove)
 
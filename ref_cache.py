@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 14:02:19 2026
+
+Parsed reference lists of citing publications, cached for the corrections.
+
+@author: milasiunaite
+"""
+
+import requests
+from json import load
+from collections import OrderedDict
+from xml.etree.ElementTree import ParseError
+from ref_parser import parse_references
+from response_store import ResponseStore
+
+REF_API = 'https://api.elsevier.com/content/abstract/eid/{eid}?view=REF'
+CACHE_SIZE = 256  # Parsed documents kept in memory
+
+
+def read_headers(file_name='headers.json'):
+    """Return the request headers with the api key from the file."""
+    headers = requests.utils.default_headers()
+    data = load(open(file_name))
+    for head in data:
+        headers[head] = data[head]
+    return headers
+
+
+class RefCache:
+    """
+    References of citing publications by scopus id, least recently used out.
+
+    The REF document of a publication is read from the response store (the
+    disk cache, which only calls the API if it has no fresh copy) and
+    parsed once; its references stay in memory until CACHE_SIZE other
+    documents were asked for since. The headers are read once.
+
+    Parameters
+    ----------
+    store : ResponseStore, optional
+        Store of the responses of the API. The default is None (a new one).
+    headers : dict, optional
+        Request headers with the api key. The default is None (read from
+        headers.json).
+    size : int, optional
+        Number of documents kept in memory. The default is CACHE_SIZE.
+
+    """
+
+    def __init__(self, store=None, headers=None, size=CACHE_SIZE):
+        self.store = store if store is not None else ResponseStore()
+        self.headers = headers if headers is not None else read_headers()
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+
+    def get(self, eid):
+        """
+        Return the references of the publication.
+
+        Parameters
+        ----------
+        eid : string
+            Id of the citing publication, e.g. '2-s2.0-85000000000'.
+
+        Returns
+        -------
+        references : dict or None
+            Reference per scopus id, or None if the document has no
+            references or is not XML (e.g. an error).
+
+        """
+        if eid in self._documents:
+            self.hits += 1
+            self._documents.move_to_end(eid)
+            return self._documents[eid]
+        self.misses += 1
+        response = self.store.get(REF_API.format(eid=eid), headers=self.headers)
+        try:
+            parsed = parse_references(response)
+        except ParseError:
+            parsed = None
+        references = None
+        if parsed is not None:
+            references = dict()
+            for reference in parsed.references:
+                references.setdefault(reference.scopus_id, reference)
+        self._documents[eid] = references
+        if len(self._documents) > self.size:
+            self._documents.popitem(last=False)
+        return references
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 24 09:58:21 2026
+
+Parser of the reference lists in abstract retrieval responses (view=REF).
+
+@author: milasiunaite
+"""
+
+from io import BytesIO
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse
+
+# Author of a reference; auid is '' if SCOPUS gives no id.
+Author = namedtuple('Author', ['auid', 'indexed_name', 'surname',
+                               'given_name', 'initials', 'afid', 'url'])
+# Reference of a publication; authors is a list, possibly empty.
+Reference = namedtuple('Reference', ['scopus_id', 'title', 'source', 'doi',
+                                     'citedby', 'date', 'type', 'url',
+                                     'authors'])
+# Number of references SCOPUS reports and the list of those returned.
+ReferenceList = namedtuple('ReferenceList', ['total', 'references'])
+
+
+def local(tag):
+    """Return the tag without its namespace, e.g. 'doi' for ce:doi."""
+    return tag.rpartition('}')[2]
+
+
+def text(element):
+    """Return the text of the element, including that of inline markup."""
+    if element is None:
+        return ''
+    return ''.join(element.itertext()).strip()
+
+
+def children(element):
+    """Return the first child of the element per local tag name."""
+    found = dict()
+    for child in element:
+        found.setdefault(local(child.tag), child)
+    return found
+
+
+def parse_author(element):
+    """Return the Author of an author element."""
+    fields = children(element)
+    affiliation = fields.get('affiliation')
+    return Author(
+        auid=element.get('auid', ''),
+        indexed_name=text(fields.get('indexed-name')),
+        surname=text(fields.get('surname')),
+        given_name=text(fields.get('given-name')),
+        initials=text(fields.get('initials')),
+        afid=affiliation.get('id', '') if affiliation is not None else '',
+        url=text(fields.get('author-url')))
+
+
+def parse_reference(element):
+    """Return the Reference of a reference element."""
+    fields = children(element)
+    authors = []
+    if 'author-list' in fields:
+        authors = [parse_author(author) for author in fields['author-list']
+                   if local(author.tag) == 'author']
+    citedby = text(fields.get('citedby-count'))
+    return Reference(
+        scopus_id=int(text(fields['scopus-id'])),
+        title=text(fields.get('title')),
+        source=text(fields.get('sourcetitle')),
+        doi=text(fields.get('doi')),
+        citedby=int(citedby) if citedby.isdigit() else 0,
+        date=text(fields.get('coverDate')) or None,
+        type=text(fields.get('type')),
+        url=text(fields.get('url')),
+        authors=authors)
+
+
+def parse_references(response):
+    """
+    Return the references of a REF response, or None if it has none.
+
+    The document is read with iterparse. Every reference element becomes
+    a Reference as soon as it is complete and is then cleared, so the tree
+    of the whole document is never built. A single reference, a single
+    author and repeated elements (the first one is kept) need no special
+    cases in the callers.
+
+    Parameters
+    ----------
+    response : requests.Response or StoredResponse
+        Response of the abstract retrieval API.
+
+    Returns
+    -------
+    ReferenceList or None
+        Total number of references and the parsed references.
+
+    Raises
+    ------
+    xml.etree.ElementTree.ParseError
+        If the response is not XML, e.g. an error in JSON.
+
+    """
+    total = None
+    references = []
+    for _, element in iterparse(BytesIO(response.content)):
+        name = local(element.tag)
+        if name == 'reference':
+            references.append(parse_reference(element))
+            element.clear()
+        elif name == 'references':
+            total = int(element.get('total-references', 0))
+    if total is None:
+        return None
+    return ReferenceList(total, references)
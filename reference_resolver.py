@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 25 10:14:37 2026
+
+Match harvested references to the publications already in the database.
+
+@author: milasiunaite
+"""
+
+from normalization import normalize, normalize_many
+
+
+def doi_key(doi):
+    """Return the doi as compared, or '' if there is none."""
+    if doi is None:
+        return ''
+    return doi.strip().casefold()
+
+
+class ReferenceResolver:
+    """
+    DOI and title indexes of the publications table, kept in memory.
+
+    A reference is resolved to a publication by the rules of
+    additional_functions.merge_matching_doi and merge_matching_title, so
+    the records these passes would merge later are never created:
+
+    - same doi, and the same normalized title unless the reference has
+      none;
+    - no doi, same normalized title, and the same year unless the
+      reference has no date.
+
+    A doi or title shared by several publications resolves to nothing.
+
+    Parameters
+    ----------
+    rows : iterable
+        Tuples (eid, doi, title, date) of the publications.
+
+    """
+
+    def __init__(self, rows):
+        rows = list(rows)
+        norms = normalize_many([title or '' for _, _, title, _ in rows])
+        self.dois = dict()  # doi: (eid, normalized title), None if repeated
+        self.titles = dict()  # normalized title: list of (year, eid)
+        for (eid, doi, _, date), norm in zip(rows, norms):
+            key = doi_key(doi)
+            if key != '':
+                self.dois[key] = None if key in self.dois else (eid, norm)
+            if norm != '':
+                self.titles.setdefault(norm, []).append((str(date)[:4], eid))
+
+    @classmethod
+    def from_database(cls, mycursor):
+        """Build the indexes from the publications table."""
+        mycursor.execute('SELECT eid, doi, title, date FROM publications')
+        return cls(mycursor.fetchall())
+
+    def resolve(self, reference):
+        """
+        Return the eid of the publication the reference stands for.
+
+        Parameters
+        ----------
+        reference : Reference
+            Harvested reference, see ref_parser.
+
+        Returns
+        -------
+        eid : int or None
+            Eid of the matching publication, or None if there is none or
+            the match is ambiguous.
+
+        """
+        norm = normalize(reference.title) if reference.title else ''
+        key = doi_key(reference.doi)
+        if key != '':
+            match = self.dois.get(key)
+            if match is None or (norm != '' and norm != match[1]):
+                return None
+            return match[0]
+        if norm == '' or norm not in self.titles:
+            return None
+        year = str(reference.date)[:4] if reference.date else None
+        eids = {eid for y, eid in self.titles[norm] if year is None or y == year}
+        if len(eids) != 1:
+            return None
+        return eids.pop()
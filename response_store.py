@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 10:12:31 2026
+
+Compressed on-disk store of raw responses of the SCOPUS API.
+
+@author: milasiunaite
+"""
+
+import re
+import sqlite3
+import zlib
+import requests
+from json import loads
+from time import time
+from hashlib import sha256
+from threading import Lock
+from requests.structures import CaseInsensitiveDict
+
+# Seconds a stored response stays fresh, per endpoint; None never expires.
+# Search results change as new articles are indexed, abstracts more rarely.
+TTL = {'search': 7 * 24 * 3600, 'abstract': 30 * 24 * 3600}
+ENDPOINT = re.compile(r'/content/(\w+)/')
+CHUNK_SIZE = 65536  # Bytes read from a streamed response at a time
+
+
+class StoredResponse:
+    """Response read from the store, with the parts of requests.Response used."""
+
+    def __init__(self, url, content, status_code=200, headers=None):
+        self.url = url
+        self.content = content
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers or {})
+
+    @property
+    def text(self):
+        return self.content.decode('utf8')
+
+    def json(self):
+        return loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __repr__(self):
+        return f'<Response [{self.status_code}]>'
+
+
+class TeeResponse:
+    """
+    Live response whose body is stored while it is read.
+
+    iter_content reads the body from the connection. Every chunk is hashed
+    and compressed on its way to the caller, and the body is stored once the
+    last chunk has been read. So only the compressed body is kept, never the
+    whole page. A body that is not read to the end is not stored. The rest
+    of requests.Response is read through, with content reading the whole
+    body at once.
+
+    Parameters
+    ----------
+    store : ResponseStore
+        Store the body is written to.
+    url : string
+        Request url.
+    response : requests.Response
+        Response fetched with stream=True.
+
+    """
+
+    def __init__(self, store, url, response):
+        self.url = url
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._store = store
+        self._response = response
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = b''.join(self.iter_content(CHUNK_SIZE))
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode('utf8')
+
+    def json(self):
+        return loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        digest = sha256()
+        compressor = zlib.compressobj(6)
+        parts = []
+        for chunk in self._response.iter_content(chunk_size):
+            digest.update(chunk)
+            parts.append(compressor.compress(chunk))
+            yield chunk
+        parts.append(compressor.flush())
+        self._store.put_compressed(self.url, digest.hexdigest(), b''.join(parts))
+
+    def __repr__(self):
+        return f'<Response [{self.status_code}]>'
+
+
+class ResponseStore:
+    """
+    Raw responses of the SCOPUS API, keyed by request url (incl. cursor).
+
+    Bodies are compressed with zlib and stored once per sha256 of their
+    content, so identical pages share one row. get() is a drop-in for
+    requests.get: a stored response that is still fresh is returned
+    without calling the API, otherwise the response is fetched and stored.
+    Responses are kept in the order they were first fetched, which is the
+    order pages() replays them in.
+
+    A stored response carries the X-RateLimit-Remaining value of the last
+    response fetched from the API, or no such header before the first one.
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the SQLite file. The default is 'responses.sqlite'.
+    ttl : dict, optional
+        Seconds a response stays fresh, per endpoint ('search', 'abstract').
+        The default is TTL.
+
+    """
+
+    def __init__(self, path='responses.sqlite', ttl=None):
+        self.ttl = {**TTL, **(ttl or {})}
+        self.remaining = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = Lock()  # Shared by the threads of the citing crawl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS blobs ('
+                          'hash TEXT PRIMARY KEY, body BLOB NOT NULL)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                          'seq INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          'url TEXT NOT NULL UNIQUE, '
+                          'endpoint TEXT NOT NULL, '
+                          'hash TEXT NOT NULL, '
+                          'fetched_at REAL NOT NULL)')
+        self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def endpoint(url):
+        """Return the endpoint of the url, e.g. 'search' or 'abstract'."""
+        match = ENDPOINT.search(url)
+        return match.group(1) if match is not None else ''
+
+    def _read(self, url):
+        row = self.conn.execute(
+            'SELECT r.fetched_at, b.body FROM responses r JOIN blobs b'
+            ' ON r.hash = b.hash WHERE r.url = ?', (url,)).fetchone()
+        if row is None:
+            return None, None
+        return row[0], zlib.decompress(row[1])
+
+    def _response(self, url, content):
+        headers = dict()
+        if self.remaining is not None:
+            headers['X-RateLimit-Remaining'] = str(self.remaining)
+        return StoredResponse(url, content, headers=headers)
+
+    def get(self, url, headers=None, stream=False):
+        """
+        Return the response for the url, from the store if still fresh.
+
+        Parameters
+        ----------
+        url : string
+            Request url.
+        headers : dict, optional
+            Request headers with the api key. The default is None.
+        stream : bool, optional
+            Read the body of a fetched response from the connection while
+            it is used, see TeeResponse. The default is False.
+
+        Returns
+        -------
+        requests.Response, TeeResponse or StoredResponse
+            Response of the API.
+
+        """
+        ttl = self.ttl.get(self.endpoint(url))
+        with self._lock:
+            fetched_at, content = self._read(url)
+        if fetched_at is not None and (ttl is None or time() - fetched_at < ttl):
+            self.hits += 1
+            return self._response(url, content)
+        self.misses += 1
+        response = requests.get(url, headers=headers, stream=stream)
+        try:
+            remaining = int(response.headers['X-RateLimit-Remaining'])
+            with self._lock:
+                self.remaining = remaining
+        except (KeyError, ValueError):
+            pass
+        if response.status_code == 200:
+            if stream:
+                return TeeResponse(self, url, response)
+            self.put(url, response.content)
+        return response
+
+    def peek(self, url):
+        """Return the stored response for the url, or None, whatever its age."""
+        with self._lock:
+            _, content = self._read(url)
+        if content is None:
+            return None
+        return StoredResponse(url, content)
+
+    def put(self, url, content):
+        """Store the body of the response to the url."""
+        self.put_compressed(url, sha256(content).hexdigest(),
+                            zlib.compress(content, 6))
+
+    def put_compressed(self, url, digest, body):
+        """Store a body given by its sha256 digest and zlib compressed."""
+        with self._lock:
+            self.conn.execute('INSERT OR IGNORE INTO blobs (hash, body) VALUES (?, ?)',
+                              (digest, body))
+            self.conn.execute(
+                'INSERT INTO responses (url, endpoint, hash, fetched_at)'
+                ' VALUES (?, ?, ?, ?) ON CONFLICT(url) DO UPDATE SET'
+                ' hash = excluded.hash, fetched_at = excluded.fetched_at',
+                (url, self.endpoint(url), digest, time()))
+            self.conn.commit()
+
+    def pages(self, endpoint=None):
+        """
+        Yield the stored responses in the order they were first fetched.
+
+        Parameters
+        ----------
+        endpoint : string, optional
+            Only yield responses of this endpoint. The default is None (all).
+
+        Yields
+        ------
+        StoredResponse
+            Stored response, without a rate limit header.
+
+        """
+        query = 'SELECT url FROM responses'
+        if endpoint is not None:
+            query += ' WHERE endpoint = ?'
+        query += ' ORDER BY seq'
+        with self._lock:
+            urls = [row[0] for row in self.conn.execute(
+                query, () if endpoint is None else (endpoint,))]
+        for url in urls:
+            with self._lock:
+                _, content = self._read(url)
+            yield StoredResponse(url, content)
+
+    def close(self):
+        """Close the file."""
+        self.conn.close()
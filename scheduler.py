@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Oct 21 14:05:40 2026
+
+Quota model and priority frontier of the SCOPUS crawl.
+
+@author: milasiunaite
+"""
+
+import heapq
+from math import ceil, inf
+from time import time
+from response_store import StoredResponse
+
+PAGE_SIZE = 25  # Entries per page of view=COMPLETE search results
+RESERVE = 10  # Calls kept for other scripts
+CHUNK = 1000  # Ids per query
+
+
+class Quota:
+    """
+    Remaining weekly quota of the api key, read from the response headers.
+
+    X-RateLimit-Remaining gives the calls left, X-RateLimit-Limit the
+    weekly quota and X-RateLimit-Reset the time (epoch seconds) at which
+    it is restored. Once that time has passed, the full quota is assumed
+    to be available again until the next response says otherwise.
+
+    Parameters
+    ----------
+    remaining : int
+        Number of calls left.
+    reset : float, optional
+        Time at which the quota is restored. The default is None.
+    limit : int, optional
+        Weekly quota. The default is None.
+
+    """
+
+    def __init__(self, remaining, reset=None, limit=None):
+        self.remaining = remaining
+        self.reset = reset
+        self.limit = limit
+
+    @classmethod
+    def from_data(cls, data, prefix='', default=None):
+        """
+        Return the quota saved in the state of the project.
+
+        The keys of another API start with the prefix, e.g. 'ref_' for the
+        abstract retrieval API. Without a saved quota the default number
+        of calls is left, if one is given.
+        """
+        if default is None:
+            remaining = data[f'{prefix}limit']
+        else:
+            remaining = data.get(f'{prefix}limit', default)
+        return cls(remaining, data.get(f'{prefix}reset'),
+                   data.get(f'{prefix}quota'))
+
+    def save(self, data, prefix=''):
+        """Store the quota in the state of the project."""
+        data[f'{prefix}limit'] = self.remaining
+        data[f'{prefix}reset'] = self.reset
+        data[f'{prefix}quota'] = self.limit
+
+    def update(self, response):
+        """Correct the quota from the headers of the response."""
+        if isinstance(response, StoredResponse):
+            return  # Served from the store, no call spent
+        try:
+            self.remaining = int(response.headers['X-RateLimit-Remaining'])
+        except (KeyError, ValueError):
+            self.remaining -= 1
+        try:
+            self.reset = float(response.headers['X-RateLimit-Reset'])
+        except (KeyError, ValueError):
+            pass
+        try:
+            self.limit = int(response.headers['X-RateLimit-Limit'])
+        except (KeyError, ValueError):
+            pass
+
+    def available(self, now=None):
+        """Return the number of calls left, counting a passed reset."""
+        if now is None:
+            now = time()
+        if self.reset is not None and now >= self.reset and self.limit is not None:
+            self.remaining = self.limit
+            self.reset = None  # The next response gives the next reset
+        return self.remaining
+
+    def allows(self, reserve=RESERVE):
+        """Return True if more calls than the reserve are left."""
+        return self.available() > reserve
+
+
+def citing_estimate(citedby, indegree, cursor='*'):
+    """
+    Return the expected new records and calls to finish a refeid crawl.
+
+    Parameters
+    ----------
+    citedby : int
+        Number of citing articles according to SCOPUS.
+    indegree : int
+        Number of citing articles in the database.
+    cursor : string, optional
+        Cursor of the next page; '*' if the crawl has not started.
+        The default is '*'.
+
+    Returns
+    -------
+    expected : int
+        Citing articles not yet in the database.
+    calls : int
+        Calls needed, including the last one that returns no new cursor.
+
+    """
+    expected = max(citedby - indegree, 0)
+    if cursor == '*':
+        return expected, ceil(citedby / PAGE_SIZE) + 1
+    return expected, ceil(expected / PAGE_SIZE) + 1
+
+
+class Frontier:
+    """
+    Pending eids of the crawl queue, best expected new records per call first.
+
+    The expected records are the citedby-count of the publication minus its
+    in-degree in the citations table. Eids whose crawl has started come
+    first, so their cursors are used before they expire. Eids queued while
+    the crawl runs are added by refresh().
+
+    Parameters
+    ----------
+    mycursor : cursor
+        Cursor connected to the database.
+
+    """
+
+    def __init__(self, mycursor):
+        self.mycursor = mycursor
+        self.estimates = dict()  # eid -> (expected, calls)
+        self._heap = []
+        self._in_heap = set()
+
+    def score(self, eid, cursor='*'):
+        """Return the expected new records per call of the eid."""
+        if cursor != '*':
+            return inf
+        expected, calls = self.estimates[eid]
+        return expected / calls
+
+    def estimate(self, eids):
+        """Query the citedby-counts and in-degrees of the eids."""
+        eids = list(eids)
+        for i in range(0, len(eids), CHUNK):
+            chunk = {int(eid[7:]): eid for eid in eids[i:i + CHUNK]}
+            self.mycursor.execute(
+                'SELECT p.eid, p.citedby, COUNT(c.citing_id) FROM publications p'
+                ' LEFT JOIN citations c ON c.cited_id = p.eid WHERE p.eid IN'
+                f' ({",".join(str(e) for e in chunk)}) GROUP BY p.eid, p.citedby')
+            for eid, citedby, indegree in self.mycursor.fetchall():
+                self.estimates[chunk.pop(eid)] = citing_estimate(
+                    int(citedby or 0), int(indegree))
+            for eid in chunk.values():
+                # Not in the database yet: assume one page of new records.
+                self.estimates[eid] = (PAGE_SIZE, 2)
+
+    def refresh(self, queue):
+        """Add the pending eids of the queue that are not in the frontier."""
+        new = [eid for eid in queue if eid not in self._in_heap]
+        self.estimate([eid for eid in new if eid not in self.estimates])
+        for eid in new:
+            heapq.heappush(self._heap, (-self.score(eid, queue.cursor(eid)), eid))
+            self._in_heap.add(eid)
+
+    def _clean(self, queue, exclude):
+        """Drop eids that are no longer pending or excluded from the top."""
+        while len(self._heap) > 0:
+            eid = self._heap[0][1]
+            if queue.is_pending(eid) and eid not in exclude:
+                return
+            heapq.heappop(self._heap)
+            self._in_heap.discard(eid)
+
+    def best(self, queue, exclude=()):
+        """Return the best score of a pending eid, or -inf if there is none."""
+        self._clean(queue, exclude)
+        return -self._heap[0][0] if len(self._heap) > 0 else -inf
+
+    def pop(self, queue, exclude=()):
+        """Remove and return the best pending eid, or None if there is none."""
+        self._clean(queue, exclude)
+        if len(self._heap) == 0:
+            return None
+        eid = heapq.heappop(self._heap)[1]
+        self._in_heap.discard(eid)
+        return eid
+
+
+class StopPolicy:
+    """
+    When to stop crawling the articles citing one publication early.
+
+    Citing articles are fetched most cited first, so the later pages of a
+    well crawled publication mostly hold records already in the database,
+    and articles cited less and less. A crawl is stopped after `patience`
+    pages in a row with fewer new records than min_ratio of the page,
+    after max_pages pages, or once the citedby-count of the last citing
+    article is below citedby_floor. None disables a rule.
+
+    The rules are checked against the statistics kept by the crawl queue,
+    so a stopped eid can be resumed later with a looser policy, see
+    CrawlQueue.resume.
+
+    Parameters
+    ----------
+    min_ratio : float, optional
+        Share of new records below which a page counts as poor. The default
+        is 0.1.
+    patience : int, optional
+        Number of poor pages in a row that stop the crawl. The default is
+        None.
+    max_pages : int, optional
+        Number of pages after which the crawl stops. The default is None.
+    citedby_floor : int, optional
+        Citedby-count of the citing articles below which the crawl stops.
+        The default is None.
+
+    """
+
+    def __init__(self, min_ratio=0.1, patience=None, max_pages=None,
+                 citedby_floor=None):
+        self.min_ratio = min_ratio
+        self.patience = patience
+        self.max_pages = max_pages
+        self.citedby_floor = citedby_floor
+
+    def stop(self, stats):
+        """
+        Return the reason to stop the crawl of an eid, or None to go on.
+
+        Parameters
+        ----------
+        stats : dict
+            New records and records per crawled page ('history') and the
+            citedby-count of the last citing article ('citedby'), see
+            CrawlQueue.stats.
+
+        Returns
+        -------
+        reason : string or None
+            'pages', 'ratio' or 'citedby'.
+
+        """
+        history = stats['history']
+        if self.max_pages is not None and len(history) >= self.max_pages:
+            return 'pages'
+        if (self.patience is not None and len(history) >= self.patience
+                and all(new < self.min_ratio * records
+                        for new, records in history[-self.patience:])):
+            return 'ratio'
+        if (self.citedby_floor is not None and stats['citedby'] is not None
+                and stats['citedby'] < self.citedby_floor):
+            return 'citedby'
+        return None
+
+
+def keyword_estimate(total, labelled):
+    """
+    Return the expected new records and calls to crawl a keyword.
+
+    Parameters
+    ----------
+    total : int or None
+        Number of search results; None if not known yet.
+    labelled : int
+        Number of publications already labelled with the keyword.
+
+    Returns
+    -------
+    expected : int or None
+        Results not yet labelled with the keyword.
+    calls : int or None
+        Calls needed, including the last one that returns no new cursor.
+
+    """
+    if total is None:
+        return None, None
+    return max(total - labelled, 0), ceil(total / PAGE_SIZE) + 1
+
+
+def plan(frontier, queue, keywords, quota):
+    """
+    Report the calls needed to finish the crawl, without calling the API.
+
+    Parameters
+    ----------
+    frontier : Frontier
+        Frontier of the pending eids.
+    queue : CrawlQueue
+        Queue of publications whose citing articles need crawling.
+    keywords : dict
+        Expected new records and calls (see keyword_estimate) per keyword.
+    quota : Quota
+        Quota of the api key.
+
+    Returns
+    -------
+    report : dict
+        Expected records and calls for the keywords and the citing crawls,
+        the total, and the weeks of quota it takes.
+
+    """
+    frontier.refresh(queue)
+    citing = {'eids': len(queue), 'expected': 0, 'calls': 0}
+    for eid in queue:
+        expected, calls = frontier.estimates[eid]
+        if queue.cursor(eid) != '*':
+            expected, calls = citing_estimate(expected, 0, queue.cursor(eid))
+        citing['expected'] += expected
+        citing['calls'] += calls
+    known = [k for k in keywords if keywords[k][1] is not None]
+    report = {
+        'keywords': keywords,
+        'unknown keywords': len(keywords) - len(known),
+        'citing': citing,
+        'calls': citing['calls'] + sum(keywords[k][1] for k in known),
+        'remaining': quota.available(),
+        'reset': quota.reset}
+    report['weeks'] = (report['calls'] / quota.limit if quota.limit
+                       else None)
+    print(f"{len(known)} keywords with known totals: "
+          f"{sum(keywords[k][1] for k in known)} calls, "
+          f"{sum(keywords[k][0] for k in known)} new records expected")
+    print(f"{report['unknown keywords']} keywords without a stored first page")
+    print(f"{citing['eids']} queued eids: {citing['calls']} calls, "
+          f"{citing['expected']} new records expected")
+    print(f"{report['calls']} calls in total, {report['remaining']} left"
+          + (f", {report['weeks']:.1f} weeks of quota" if report['weeks'] else ''))
+    return report
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 15:48:03 2026
+
+Streaming parser of the search results pages of the SCOPUS API.
+
+@author: milasiunaite
+"""
+
+import codecs
+from json import JSONDecoder, JSONDecodeError, loads
+
+CHUNK_SIZE = 65536
+WHITESPACE = ' \t\r\n'
+decoder = JSONDecoder()
+
+
+class SearchPage:
+    """
+    Search results page whose entries are decoded one at a time.
+
+    Used in place of response.json()['search-results']. The fields before
+    the 'entry' array (cursor, link, ...) are parsed when the page is
+    created, so a malformed start of the response or a missing
+    'search-results' raises JSONDecodeError or KeyError right away, like
+    response.json() does. page['entry'] is then a generator that reads and
+    decodes the next entry only when it is asked for, so the page never
+    exists as one decoded tree. Fields after the array, if any, are added
+    once it has been read. A page without an 'entry' array is parsed whole.
+
+    If an iteration over page['entry'] is abandoned, e.g. by an exception
+    while an entry is processed, the next iteration starts with that entry,
+    followed by the unread ones.
+
+    Parameters
+    ----------
+    response : requests.Response or StoredResponse
+        Response of the search API.
+    chunk_size : int, optional
+        Bytes read from the response at a time. The default is CHUNK_SIZE.
+
+    """
+
+    def __init__(self, response, chunk_size=CHUNK_SIZE):
+        self._chunks = response.iter_content(chunk_size)
+        self._decode = codecs.getincrementaldecoder('utf8')().decode
+        self._buffer = ''
+        self._pos = 0
+        self._current = None  # Entry handed out last
+        self.done = False  # All entries read
+        self.fields = dict()
+        self.streaming = self._read_header()
+
+    def __getitem__(self, key):
+        if key == 'entry' and self.streaming:
+            return self._entries()
+        return self.fields[key]
+
+    def __contains__(self, key):
+        return key in self.fields or (key == 'entry' and self.streaming)
+
+    def _read(self):
+        """Append the next chunk to the buffer; return False at the end."""
+        if self._pos > 0:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += self._decode(chunk)
+                return True
+        return False
+
+    def _skip(self, pos, chars=WHITESPACE):
+        """Return the position of the first character not in chars."""
+        while pos < len(self._buffer) and self._buffer[pos] in chars:
+            pos += 1
+        return pos
+
+    def _read_header(self):
+        """Parse the fields before the entries; return True if there are any."""
+        start = 0
+        while True:
+            i = self._buffer.find('"entry"', start)
+            if i > 0 and self._buffer[i - 1] != '\\':
+                colon = self._skip(i + len('"entry"'))
+                bracket = self._skip(colon + 1)
+                if bracket < len(self._buffer):
+                    if self._buffer[colon] == ':' and self._buffer[bracket] == '[':
+                        break
+                    start = i + 1  # Not the key of the entry array
+                    continue
+            elif i == -1:
+                # Keep the end of the buffer, it may hold part of the key.
+                start = max(len(self._buffer) - len('"entry"'), 0)
+            else:
+                start = i + 1
+                continue
+            if not self._read():
+                self.fields = loads(self._buffer)['search-results']
+                self._buffer = ''
+                self.done = True
+                return False
+        # Close the objects opened before the array to parse the fields.
+        header = self._buffer[:i].rstrip()
+        if header.endswith(','):
+            header = header[:-1]
+        self.fields = loads(header + '}}')['search-results']
+        self._pos = bracket + 1
+        return True
+
+    def _entries(self):
+        if self._current is not None:
+            yield self._current
+        while not self.done:
+            self._current = self._next_entry()
+            if self._current is not None:
+                yield self._current
+        self._current = None
+
+    def _next_entry(self):
+        """Decode the next entry, or return None after the last one."""
+        while True:
+            pos = self._skip(self._pos, WHITESPACE + ',')
+            if pos < len(self._buffer):
+                if self._buffer[pos] == ']':
+                    self._pos = pos + 1
+                    self._read_trailer()
+                    return None
+                try:
+                    entry, self._pos = decoder.raw_decode(self._buffer, pos)
+                    return entry
+                except JSONDecodeError:
+                    pass  # Entry not read completely yet
+            self._pos = pos
+            if not self._read():
+                raise JSONDecodeError('Unterminated entry array',
+                                      self._buffer, self._pos)
+
+    def _read_trailer(self):
+        """Parse the fields after the entries, if any."""
+        while self._read():
+            pass
+        self.done = True
+        # What is left closes 'search-results' and the page: ', "key": ...}}'
+        tail = self._buffer[self._pos:].strip()[:-1].rstrip()
+        self._buffer = ''
+        self._pos = 0
+        if tail.startswith(','):
+            self.fields.update(loads('{' + tail[1:]))
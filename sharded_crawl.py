@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 11:02:36 2026
+
+Crawl SCOPUS with several processes, one api key each, sharing a work ledger.
+
+@author: milasiunaite
+"""
+
+import requests
+import mysql.connector
+from time import sleep
+from json import load, JSONDecodeError
+from hashlib import sha256
+from multiprocessing import Process
+import add_from_scopus
+from add_from_scopus import (SQL, get_keywords, build_matcher, new_batch,
+                             flush_batch, add_record, add_citing_record,
+                             collect_ids, search_results, keyword_groups,
+                             started_keyword, PROFILES, KEYWORD_PROFILE,
+                             CITING_PROFILE)
+from checkpoint import Checkpoint
+from crawl_queue import CrawlQueue
+from response_store import ResponseStore
+from scheduler import Quota, RESERVE
+from work_ledger import WorkLedger, LEASE
+
+KEY_HEADER = 'X-ELS-APIKey'
+POLL = 2  # Seconds between leases while the other workers hold every unit
+# Rows another worker may have written already are skipped, and labels are
+# added to the stored ones rather than replacing them.
+SHARD_SQL = {key: sql.replace('INSERT INTO', 'INSERT IGNORE INTO')
+             for key, sql in SQL.items()}
+SHARD_SQL['f'] = ('UPDATE publications SET field ='
+                  ' IF(field = "OTHER", %s, CONCAT(field, ",", %s))'
+                  ' WHERE eid = %s AND FIND_IN_SET(%s, field) = 0')
+
+
+def api_headers(file_name='headers.json'):
+    """
+    Read the request headers, one set for every api key.
+
+    The value of 'X-ELS-APIKey' in the file may be a single key or a list
+    of keys; the other headers are shared.
+
+    Parameters
+    ----------
+    file_name : string, optional
+        Name of the file. The default is 'headers.json'.
+
+    Returns
+    -------
+    headers : list
+        Dictionary of headers per api key.
+
+    """
+    data = load(open(file_name))
+    keys = data.pop(KEY_HEADER, None)
+    if not isinstance(keys, list):
+        keys = [keys]
+    headers = []
+    for key in keys:
+        head = dict(requests.utils.default_headers())
+        head.update(data)
+        if key is not None:
+            head[KEY_HEADER] = key
+        headers.append(head)
+    return headers
+
+
+def key_id(headers):
+    """Return the name of the api key kept in the ledger (not the key)."""
+    key = headers.get(KEY_HEADER) or ''
+    return sha256(key.encode('utf8')).hexdigest()[:16]
+
+
+def fetch_unit_page(unit, headers, store, quota, citing_api, stream):
+    """
+    Fetch and parse the next page of the unit.
+
+    Returns
+    -------
+    response : dict, SearchPage or None
+        Search results, or None if the request failed.
+
+    """
+    if unit['kind'] == 'keyword':
+        url = unit['url']
+    else:
+        url = citing_api.format(eid=unit['key'], cursor=unit['cursor'])
+    response = store.get(url, headers=headers, stream=stream)
+    quota.update(response)
+    if response.status_code == 429:  # The quota of the key is used up
+        quota.remaining = 0
+        return None
+    try:
+        return search_results(response, stream)
+    except (KeyError, JSONDecodeError):
+        print(response)
+        return None
+
+
+def run_worker(index, headers, path='work_ledger.sqlite',
+               citing_api=add_from_scopus.CITING_API, reserve=RESERVE,
+               lease=LEASE, stream=False):
+    """
+    Crawl units of the ledger until none are left or the quota runs out.
+
+    Every page is committed to the database before its progress is reported
+    to the ledger, so a unit taken over after a crash repeats at most one
+    page, whose rows are skipped as duplicates.
+
+    Parameters
+    ----------
+    index : int
+        Number of the worker.
+    headers : dict
+        Request headers with the api key of the worker.
+    path : string, optional
+        Path of the ledger. The default is 'work_ledger.sqlite'.
+    citing_api : string, optional
+        Url of the citing articles of an eid. The default is CITING_API.
+    reserve : int, optional
+        Number of calls of the quota to leave unused. The default is RESERVE.
+    lease : float, optional
+        Seconds until a lease expires. The default is LEASE.
+    stream : bool, optional
+        Decode the entries of the pages one at a time, see
+        add_from_scopus.search_results. The default is False.
+
+    Returns
+    -------
+    None.
+
+    """
+    name = f'worker-{index}'
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+    ledger = WorkLedger(path)
+    store = ResponseStore()
+    key = key_id(headers)
+    quota = ledger.quota(key)
+    # Not checked: the other workers are already writing to the tables.
+    all_ids = collect_ids(mycursor, check=False)
+    matcher = build_matcher({**get_keywords('added_keywords.txt'),
+                             **get_keywords()})
+    data = {'newlyadded': 0, 'indatabase': 0, 'records_checked': 0,
+            'pages': 0}
+    batch = new_batch()
+    unit = None
+    try:
+        while quota.allows(reserve):
+            if unit is None:
+                unit = ledger.lease(name, lease)
+                if unit is None:
+                    if ledger.active() == 0:
+                        break  # Everything is crawled
+                    sleep(POLL)  # Others may still queue new eids
+                    continue
+            response = fetch_unit_page(
+                unit, headers, store, quota, citing_api, stream)
+            ledger.save_quota(key, quota)
+            if response is None:  # Retried later, possibly by another worker
+                ledger.release(unit, name)
+                unit = None
+                sleep(POLL)
+                continue
+            if response['cursor']['@current'] == response['cursor']['@next']:
+                ledger.complete(unit, name)  # End of the results
+                unit = None
+                continue
+            previous = unit['cursor'], unit['url']
+            unit['cursor'] = response['cursor']['@next']
+            for link in response['link']:
+                if link['@ref'] == 'next':
+                    unit['url'] = link['@href']
+            try:
+                for ele in response['entry']:
+                    if unit['kind'] == 'keyword':
+                        all_ids, data = add_record(
+                            mycursor, all_ids, data, batch, ele, matcher,
+                            unit['label'])
+                    else:
+                        all_ids, data = add_citing_record(
+                            mycursor, all_ids, data, batch, ele, matcher,
+                            unit['label'], unit['key'])
+                    data['records_checked'] += 1
+            except KeyError:  # Skip the page, like add_from_scopus.main
+                print(response)
+                continue
+            except JSONDecodeError:  # Page cut off while streamed
+                print(response)
+                unit['cursor'], unit['url'] = previous
+                continue
+            data['pages'] += 1
+            flush_batch(mydb, mycursor, batch, SHARD_SQL, ledger, data)
+            ledger.report(name, data)
+            if not ledger.progress(unit, name, lease):
+                unit = None  # The lease expired and another worker took over
+    except KeyboardInterrupt:
+        pass  # Uncommitted rows are fetched again by the next lease
+    if unit is not None:
+        ledger.release(unit, name)
+    ledger.report(name, data)
+    ledger.close()
+    store.close()
+    all_ids['next_author'].close()
+
+
+def main(workers=None, headers=None, path='work_ledger.sqlite',
+         reserve=RESERVE, lease=LEASE, stream=False,
+         keyword_profile=KEYWORD_PROFILE, citing_profile=CITING_PROFILE):
+    """
+    Crawl the keywords in list-of-labels.txt and their citations in parallel.
+
+    Every keyword query (the keywords of one abbreviation, see
+    add_from_scopus.keyword_groups) and every queued eid is a unit of the
+    work ledger. The
+    workers are separate processes with their own api key, connection and
+    id sets, writing to the same tables. The crawl queue is copied into the
+    ledger at the start and back at the end, so add_from_scopus.main can
+    carry on. Keywords are moved to added_keywords.txt once their query is
+    crawled.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of processes. The default is None: one per api key.
+    headers : list, optional
+        Request headers per api key. The default is None: read from
+        headers.json, see api_headers.
+    path : string, optional
+        Path of the ledger. The default is 'work_ledger.sqlite'.
+    reserve : int, optional
+        Number of calls of the quota of every key to leave unused. The
+        default is RESERVE.
+    lease : float, optional
+        Seconds until a lease expires. The default is LEASE.
+    stream : bool, optional
+        Decode the entries of the pages one at a time. The default is False.
+    keyword_profile : string, optional
+        Request profile of the keyword queries, see
+        add_from_scopus.PROFILES. The default is KEYWORD_PROFILE.
+    citing_profile : string, optional
+        Request profile of the citing articles. The default is
+        CITING_PROFILE.
+
+    Returns
+    -------
+    stats : dict
+        Counters per worker, see WorkLedger.workers.
+
+    """
+    if headers is None:
+        headers = api_headers()
+    if workers is None:
+        workers = len(headers)
+    if workers > len(headers):
+        raise ValueError(f'{workers} workers need as many api keys,'
+                         f' {len(headers)} given')
+    db_data = load(open('mydb_setup.json'))
+    mydb = mysql.connector.connect(**db_data)
+    mycursor = mydb.cursor()
+    data = Checkpoint()
+    # Bring the id files up to date once, before the workers map them.
+    collect_ids(mycursor)
+    ledger = WorkLedger(path)
+    keywords_abbr = get_keywords()
+    groups = keyword_groups(keywords_abbr,
+                            started=started_keyword(keywords_abbr, data))
+    for query, (kw, _) in groups.items():
+        url = (add_from_scopus.KEYWORD_API.format(keyword=query)
+               + PROFILES[keyword_profile])
+        if data['api'] != '' and query == data.get('query'):
+            url = data['api']  # Started by add_from_scopus.main
+        ledger.add('keyword', query, kw, url)
+    data['api'] = ''
+    data['query'] = ''
+    data['cursor'] = '*'
+    queue = CrawlQueue()
+    for eid in data.pop('eids', []):
+        queue.push(eid)
+    queue.commit()
+    ledger.import_queue(queue)
+    key = key_id(headers[0])
+    ledger.save_quota(key, ledger.quota(key, Quota.from_data(data)))
+    processes = [Process(target=run_worker, args=(
+        i, headers[i], path,
+        add_from_scopus.CITING_API + PROFILES[citing_profile], reserve, lease,
+        stream))
+        for i in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:  # Also received by the workers
+        for process in processes:
+            process.join()
+    stats = ledger.workers()
+    quota = ledger.quota(key, Quota.from_data(data))
+    quota.save(data)
+    data['newlyadded'] = sum(s['newlyadded'] for s in stats.values())
+    data['indatabase'] = sum(s['indatabase'] for s in stats.values())
+    data.save()
+    ledger.export_queue(queue)
+    queue.close()
+    done = [keyword for query, _, _, _ in ledger.units('keyword', 'done')
+            if query in groups for keyword in groups[query][1]]
+    if len(done) > 0:
+        f = open('added_keywords.txt', 'a')
+        for keyword in done:
+            f.write(f'\n{keyword} : {keywords_abbr.pop(keyword)}')
+        f.close()
+        f = open('list-of-labels.txt', 'w')
+        for keyword in keywords_abbr:
+            f.write(f'{keyword} : {keywords_abbr[keyword]}\n')
+        f.close()
+    for name, counters in stats.items():
+        print(f"{name}: {counters['pages']} pages, {counters['newlyadded']}"
+              f" new and {counters['indatabase']} known records")
+    print(', '.join(f'{n} {kind} units {status}'
+                    for (kind, status), n in sorted(ledger.counts().items())))
+    ledger.close()
+    return stats
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Thu Oct 22 09:47:12 2026
+
+Work ledger shared by the processes of the sharded crawl.
+
+@author: milasiunaite
+"""
+
+import sqlite3
+from time import time
+from scheduler import Quota
+
+LEASE = 300  # Seconds a worker may hold a unit without reporting progress
+WEEKLY_QUOTA = 20000  # Calls per week of a new api key of the search API
+
+
+class WorkLedger:
+    """
+    Units of crawl work (keywords and refeid queries) in an SQLite file.
+
+    A unit is leased to one worker at a time. The worker reports the cursor
+    of the next page after every page it has committed to the database,
+    which also renews the lease. If a worker stops without releasing its
+    unit, the lease expires and another worker continues the unit from the
+    last reported page. Started units are handed out first, then keywords,
+    then refeid units in the order they were added.
+
+    The ledger also keeps the quota of every api key and the counters of
+    every worker, so they survive the processes. push() and commit() have
+    the signature of CrawlQueue, so a ledger can stand in for the queue in
+    add_from_scopus.flush_batch.
+
+    Parameters
+    ----------
+    path : string, optional
+        Path of the SQLite file. The default is 'work_ledger.sqlite'.
+
+    """
+
+    def __init__(self, path='work_ledger.sqlite'):
+        # Autocommit, so a lease is taken in one explicit transaction.
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS units ('
+                          'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                          'kind TEXT NOT NULL, '
+                          'key TEXT NOT NULL, '
+                          'label TEXT NOT NULL DEFAULT "", '
+                          'url TEXT NOT NULL DEFAULT "", '
+                          'cursor TEXT NOT NULL DEFAULT "*", '
+                          'status TEXT NOT NULL DEFAULT "pending", '
+                          'owner TEXT, '
+                          'lease_until REAL, '
+                          'pages INTEGER NOT NULL DEFAULT 0, '
+                          'UNIQUE (kind, key))')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS keys ('
+                          'key TEXT PRIMARY KEY, remaining INTEGER, '
+                          'reset REAL, quota INTEGER)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS workers ('
+                          'name TEXT PRIMARY KEY, '
+                          'newlyadded INTEGER, indatabase INTEGER, '
+                          'records_checked INTEGER, pages INTEGER, '
+                          'updated_at REAL)')
+        self._pushed = []
+
+    def add(self, kind, key, label='', url='', status='pending'):
+        """
+        Add a unit unless one of the same kind and key exists.
+
+        Parameters
+        ----------
+        kind : string
+            'keyword' or 'citing'.
+        key : string
+            Keyword, or eid whose citing articles are crawled.
+        label : string, optional
+            Abbreviation of the keyword. The default is ''.
+        url : string, optional
+            Url of the first page of a keyword. The default is ''.
+        status : string, optional
+            'pending', or 'done' for units crawled before. The default is
+            'pending'.
+
+        Returns
+        -------
+        bool
+            True if the unit was added.
+
+        """
+        cur = self.conn.execute(
+            'INSERT OR IGNORE INTO units (kind, key, label, url, status)'
+            ' VALUES (?, ?, ?, ?, ?)', (kind, key, label, url, status))
+        return cur.rowcount == 1
+
+    def push(self, eid):
+        """Queue a refeid unit for the eid; written by commit()."""
+        self._pushed.append(eid)
+
+    def commit(self, staged=False):
+        """Write the pushed eids. staged is accepted for CrawlQueue parity."""
+        if len(self._pushed) == 0:
+            return
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO units (kind, key) VALUES ("citing", ?)',
+                [(eid,) for eid in self._pushed])
+        self._pushed = []
+
+    def lease(self, owner, duration=LEASE):
+        """
+        Lease the next unit that is pending or whose lease has expired.
+
+        Parameters
+        ----------
+        owner : string
+            Name of the worker.
+        duration : float, optional
+            Seconds until the lease expires. The default is LEASE.
+
+        Returns
+        -------
+        unit : dict or None
+            Columns of the leased unit, or None if there is none.
+
+        """
+        now = time()
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            row = self.conn.execute(
+                'SELECT id, kind, key, label, url, cursor FROM units'
+                ' WHERE status = "pending"'
+                ' OR (status = "leased" AND lease_until < ?)'
+                ' ORDER BY cursor = "*", kind != "keyword", id LIMIT 1',
+                (now,)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                'UPDATE units SET status = "leased", owner = ?, lease_until = ?'
+                ' WHERE id = ?', (owner, now + duration, row[0]))
+        return dict(zip(('id', 'kind', 'key', 'label', 'url', 'cursor'), row))
+
+    def progress(self, unit, owner, duration=LEASE):
+        """
+        Store the cursor and url of the next page and renew the lease.
+
+        Returns False if the lease was lost to another worker, which then
+        continues the unit.
+        """
+        cur = self.conn.execute(
+            'UPDATE units SET cursor = ?, url = ?, pages = pages + 1,'
+            ' lease_until = ? WHERE id = ? AND owner = ? AND status = "leased"',
+            (unit['cursor'], unit['url'], time() + duration, unit['id'], owner))
+        return cur.rowcount == 1
+
+    def complete(self, unit, owner):
+        """Mark the unit as done; return False if the lease was lost."""
+        cur = self.conn.execute(
+            'UPDATE units SET status = "done", lease_until = NULL'
+            ' WHERE id = ? AND owner = ? AND status = "leased"',
+            (unit['id'], owner))
+        return cur.rowcount == 1
+
+    def release(self, unit, owner):
+        """Hand the unit back, e.g. when the quota of the worker runs out."""
+        self.conn.execute(
+            'UPDATE units SET status = "pending", owner = NULL,'
+            ' lease_until = NULL WHERE id = ? AND owner = ? AND status = "leased"',
+            (unit['id'], owner))
+
+    def active(self):
+        """Return the number of units that are pending or leased."""
+        return self.conn.execute(
+            'SELECT COUNT(*) FROM units WHERE status != "done"').fetchone()[0]
+
+    def counts(self):
+        """Return the number of units per kind and status."""
+        rows = self.conn.execute(
+            'SELECT kind, status, COUNT(*) FROM units GROUP BY kind, status')
+        return {(kind, status): n for kind, status, n in rows}
+
+    def units(self, kind, status=None):
+        """Return the key, label, cursor and status of the units of a kind."""
+        query = 'SELECT key, label, cursor, status FROM units WHERE kind = ?'
+        params = (kind,)
+        if status is not None:
+            query += ' AND status = ?'
+            params += (status,)
+        return self.conn.execute(query + ' ORDER BY id', params).fetchall()
+
+    def import_queue(self, queue):
+        """Add the eids of the crawl queue, keeping their cursors."""
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO units (kind, key, status)'
+                ' VALUES ("citing", ?, "done")', [(eid,) for eid in queue.done()])
+            for eid in queue:
+                self.conn.execute(
+                    'INSERT OR IGNORE INTO units (kind, key, cursor)'
+                    ' VALUES ("citing", ?, ?)', (eid, queue.cursor(eid)))
+
+    def export_queue(self, queue):
+        """Write the refeid units and their cursors to the crawl queue."""
+        for eid, _, cursor, status in self.units('citing'):
+            queue.push(eid)
+            if not queue.is_pending(eid):
+                continue
+            if status == 'done':
+                queue.ack(eid)
+            elif cursor != queue.cursor(eid):
+                queue.move(eid, cursor)
+        queue.commit()
+
+    def quota(self, key, default=None):
+        """Return the saved quota of the api key, or the default."""
+        row = self.conn.execute('SELECT remaining, reset, quota FROM keys'
+                                ' WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default if default is not None else Quota(WEEKLY_QUOTA)
+        return Quota(*row)
+
+    def save_quota(self, key, quota):
+        """Save the quota of the api key."""
+        self.conn.execute('INSERT OR REPLACE INTO keys VALUES (?, ?, ?, ?)',
+                          (key, quota.remaining, quota.reset, quota.limit))
+
+    def report(self, owner, data):
+        """Save the counters of the worker."""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, ?)',
+            (owner, data['newlyadded'], data['indatabase'],
+             data['records_checked'], data['pages'], time()))
+
+    def workers(self):
+        """Return the counters of every worker, by name."""
+        rows = self.conn.execute(
+            'SELECT name, newlyadded, indatabase, records_checked, pages'
+            ' FROM workers ORDER BY name')
+        columns = ('newlyadded', 'indatabase', 'records_checked', 'pages')
+        return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+    def close(self):
+        """Write the pushed eids and close the file."""
+        self.commit()
+        self.conn.close()